@@ -9,6 +9,13 @@ REFRESH_DAYS = int(os.getenv("REFRESH_TOKEN_DAYS", "30"))
 # Usa secretos distintos; si no están en env, genera aleatorios (dev)
 JWT_SECRET = os.getenv("JWT_SECRET", secrets.token_urlsafe(32))
 JWT_REFRESH_SECRET = os.getenv("JWT_REFRESH_SECRET", secrets.token_urlsafe(32))
+# Enlaces de suscripción .ics: sin caducidad (los guardan las apps de calendario),
+# así que el secreto tiene que sobrevivir a reinicios y ser el mismo en todas las
+# réplicas: obligatorio. Rotarlo revoca todos los enlaces; por usuario, con la
+# versión "ver" (crud.revocar_feed_calendario).
+JWT_CALENDAR_SECRET = os.getenv("JWT_CALENDAR_SECRET")
+if not JWT_CALENDAR_SECRET:
+    raise RuntimeError("Falta JWT_CALENDAR_SECRET: define un secreto fijo para los enlaces .ics")
 
 def create_access_token(subject: str, minutes: int = ACCESS_MIN) -> str:
     now = datetime.now(timezone.utc)
@@ -27,3 +34,13 @@ def decode_access(token: str) -> dict:
 
 def decode_refresh(token: str) -> dict:
     return jwt.decode(token, JWT_REFRESH_SECRET, algorithms=[ALGO])
+
+def create_calendar_token(user_id: int, version: int = 0) -> str:
+    payload = {"sub": str(user_id), "type": "calendar", "ver": version}
+    return jwt.encode(payload, JWT_CALENDAR_SECRET, algorithm=ALGO)
+
+def decode_calendar(token: str) -> dict:
+    payload = jwt.decode(token, JWT_CALENDAR_SECRET, algorithms=[ALGO])
+    if payload.get("type") != "calendar":
+        raise jwt.InvalidTokenError("tipo de token incorrecto")
+    return payload
@@ -0,0 +1,38 @@
+# backend/app/cache_http.py
+"""
+GET condicional (If-None-Match → 304) común a los routers que sirven
+contenido versionado con ETag fuerte: exportaciones y calendario.
+"""
+from typing import Callable, Dict, Optional
+
+from fastapi import Request, Response
+
+
+def coincide_etag(request: Request, etag: str) -> bool:
+    valor = request.headers.get("if-none-match", "")
+    if valor.strip() == "*":
+        return True
+    return any(e.strip().removeprefix("W/") == etag for e in valor.split(","))
+
+
+def no_modificado(request: Request, clave: str, cabeceras: Dict[str, str]) -> Optional[Response]:
+    """304 con `cabeceras` si el cliente ya tiene el ETag "clave"; si no, None."""
+    if coincide_etag(request, f'"{clave}"'):
+        return Response(status_code=304, headers=cabeceras)
+    return None
+
+
+def condicional(request: Request, clave: str, cabeceras: Dict[str, str],
+                construir: Callable[[], Response]) -> Response:
+    """
+    304 si el cliente ya tiene esta versión; si no, construir(), que solo se
+    llama entonces. `cabeceras` (ETag, Cache-Control...) van en ambas
+    respuestas, sin pisar las que ya traiga la construida.
+    """
+    respuesta = no_modificado(request, clave, cabeceras)
+    if respuesta is not None:
+        return respuesta
+    respuesta = construir()
+    for nombre, valor in cabeceras.items():
+        respuesta.headers.setdefault(nombre, valor)
+    return respuesta
@@ -0,0 +1,445 @@
+# backend/app/calendario.py
+"""
+Motor de festivos por ubicación, compilado en memoria.
+
+`calendar_marks` (tabla de los importadores ICS/Nager/ES y de POST
+/calendar/company) cambia solo al importar o al dar de alta marcas de
+empresa, pero se consulta en cada vista de mes, cada cómputo de laborables y
+cada feed. Aquí se carga entera una vez y se compila:
+
+- Por ámbito: (scope, código) -> fechas ordenadas (`array` de ordinales) y
+  nombres en paralelo. scope: national | region | province | local | company.
+- Por ubicación (región, provincia, localidad): la unión ya deduplicada de los
+  ámbitos que le aplican, menos los días que la empresa marca como laborables
+  (mark = 'workday'). Se construye la primera vez que se pide y se reutiliza
+  para todos los usuarios de esa ubicación.
+- Ubicación de cada usuario: su fila más reciente de user_locations, con
+  regions.code y localities.ine_code. La provincia son los dos primeros dígitos
+  del código INE del municipio. Sin ubicación: solo nacionales y empresa.
+
+Un rango se responde con dos bisecciones sobre el array de la ubicación. Los
+días laborables de un rango (lunes a viernes menos festivos) no recorren días:
+los de lunes a viernes salen de la aritmética de semanas (`dias_semana`) y a
+eso se restan los festivos que caen entre semana, contados también bisecando.
+
+Invalidación: `invalidar()` tras escribir marcas desde la API; además, cada
+CALENDARIO_TTL_SEG se compara una huella barata de calendar_marks y
+user_locations (nº de filas + suma de xmin, que cambia con cualquier
+INSERT/UPDATE/DELETE) y solo se recompila si ha cambiado, lo que cubre los
+importadores, que corren como procesos aparte.
+
+Versión HTTP (ETag): la huella del calendario compilado + la ubicación del
+usuario + el rango; el feed añade la versión de las ausencias del usuario en
+el rango (`version_ausencias`). Mientras nada cambie, las vistas de mes se
+revalidan sin consultar la base de datos.
+
+Matriz de equipo (`matriz_equipo`): usuarios × días de un rango en RLE; las
+filas idénticas (misma ubicación, sin ausencias) se comparten.
+
+Feed .ics (`renderizar_ics`): mismos eventos que /calendar/events, con los
+días consecutivos de un mismo evento unidos en un VEVENT de día completo.
+"""
+import hashlib
+import os
+import string
+import threading
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+from icalendar import Calendar, Event
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+CALENDARIO_TTL_SEG = float(os.getenv("CALENDARIO_TTL_SEG", "60"))
+# Marcas de empresa aplicables: las globales (company_id NULL) y las de COMPANY_ID
+COMPANY_ID = os.getenv("COMPANY_ID") or None
+
+# Precedencia al deduplicar un mismo día: gana el nombre del ámbito más concreto
+AMBITOS = ("company", "local", "province", "region", "national")
+
+Ubicacion = Tuple[Optional[str], Optional[str], Optional[str]]  # (región, provincia, localidad)
+SIN_UBICACION: Ubicacion = (None, None, None)
+
+
+def _dbg(msg: str):
+    print(f"[CALENDARIO] {msg}")
+
+
+def dias_semana(desde: date, hasta: date) -> Tuple[int, int]:
+    """(días de lunes a viernes, días de fin de semana) entre desde y hasta, inclusive."""
+    n = (hasta - desde).days + 1
+    if n <= 0:
+        return 0, 0
+    semanas, resto = divmod(n, 7)
+    s = desde.weekday()  # día de la semana con el que empieza el resto
+    laborables = 5 * semanas + min(resto, max(0, 5 - s)) + max(0, resto - (7 - s))
+    return laborables, n - laborables
+
+
+class FestivosUbicacion:
+    """
+    Festivos efectivos de una ubicación: ordinales ordenados y sin repetir, y
+    aparte los que caen de lunes a viernes (los que restan días laborables).
+    """
+
+    __slots__ = ("fechas", "nombres", "ambitos", "entre_semana")
+
+    def __init__(self, fechas: array, nombres: List[str], ambitos: List[str]):
+        self.fechas = fechas
+        self.nombres = nombres
+        self.ambitos = ambitos
+        # date.fromordinal(o).weekday() == (o - 1) % 7
+        self.entre_semana = array("i", (o for o in fechas if (o - 1) % 7 < 5))
+
+    def rango(self, desde: date, hasta: date) -> range:
+        """Índices de los festivos entre desde y hasta (inclusive)."""
+        return range(bisect_left(self.fechas, desde.toordinal()),
+                     bisect_right(self.fechas, hasta.toordinal()))
+
+    def contar(self, desde: date, hasta: date) -> int:
+        return len(self.rango(desde, hasta))
+
+    def contar_entre_semana(self, desde: date, hasta: date) -> int:
+        return (bisect_right(self.entre_semana, hasta.toordinal())
+                - bisect_left(self.entre_semana, desde.toordinal()))
+
+    def dias_laborables(self, desde: date, hasta: date) -> Dict[str, int]:
+        """Laborables (L-V sin festivos), fines de semana y festivos del rango."""
+        lv, fines = dias_semana(desde, hasta)
+        return {
+            "laborables": lv - self.contar_entre_semana(desde, hasta),
+            "fines_de_semana": fines,
+            "festivos": self.contar(desde, hasta),
+        }
+
+
+class CalendarioCompilado:
+    def __init__(self, marcas: List[Dict], ubicaciones: Dict[int, Ubicacion], huella):
+        self.huella = huella
+        self.ubicaciones = ubicaciones
+        # (scope, código) -> {ordinal: nombre}
+        self._ambitos: Dict[Tuple[str, Optional[str]], Dict[int, str]] = {}
+        laborables = set()
+        for m in marcas:
+            scope = m["scope"]
+            if scope == "company":
+                if m["company_id"] is not None and str(m["company_id"]) != COMPANY_ID:
+                    continue
+                if m["mark"] == "workday":
+                    laborables.add(m["date"].toordinal())
+                    continue
+                codigo = None
+            elif m["mark"] != "holiday":
+                continue
+            else:
+                codigo = {
+                    "national": None,
+                    "region": m["region_code"],
+                    "province": m["province_code"],
+                    "local": m["locality_code"],
+                }.get(scope)
+            self._ambitos.setdefault((scope, codigo), {}).setdefault(m["date"].toordinal(), m["name"])
+        self._laborables_empresa = laborables
+        self._por_ubicacion: Dict[Ubicacion, FestivosUbicacion] = {}
+        self._lock = threading.Lock()
+
+    def ubicacion(self, user_id: int) -> Ubicacion:
+        return self.ubicaciones.get(user_id, SIN_UBICACION)
+
+    def de_ubicacion(self, ub: Ubicacion) -> FestivosUbicacion:
+        fu = self._por_ubicacion.get(ub)
+        if fu is None:
+            with self._lock:
+                fu = self._por_ubicacion.get(ub)
+                if fu is None:
+                    fu = self._por_ubicacion[ub] = self._compilar(ub)
+        return fu
+
+    def de_usuario(self, user_id: int) -> FestivosUbicacion:
+        return self.de_ubicacion(self.ubicacion(user_id))
+
+    def _compilar(self, ub: Ubicacion) -> FestivosUbicacion:
+        region, provincia, localidad = ub
+        codigos = {"company": None, "national": None,
+                   "region": region, "province": provincia, "local": localidad}
+        dias: Dict[int, Tuple[str, str]] = {}
+        for scope in AMBITOS:
+            codigo = codigos[scope]
+            if scope in ("region", "province", "local") and not codigo:
+                continue
+            for ordinal, nombre in self._ambitos.get((scope, codigo), {}).items():
+                if ordinal not in self._laborables_empresa:
+                    dias.setdefault(ordinal, (nombre, scope))
+        orden = sorted(dias)
+        return FestivosUbicacion(
+            array("i", orden),
+            [dias[o][0] for o in orden],
+            [dias[o][1] for o in orden],
+        )
+
+    def dias_laborables(self, user_id: int, desde: date, hasta: date) -> Dict[str, int]:
+        return self.de_usuario(user_id).dias_laborables(desde, hasta)
+
+    def festivos(self, user_id: int, desde: date, hasta: date) -> List[Dict]:
+        fu = self.de_usuario(user_id)
+        return [
+            {
+                "date": date.fromordinal(fu.fechas[i]).isoformat(),
+                "name": fu.nombres[i],
+                "scope": fu.ambitos[i],
+                "mark": "holiday",
+            }
+            for i in fu.rango(desde, hasta)
+        ]
+
+
+# ---------------- Carga desde BD ----------------
+_SQL_HUELLA = text("""
+    SELECT (SELECT count(*) FROM calendar_marks),
+           (SELECT coalesce(sum(xmin::text::bigint), 0) FROM calendar_marks),
+           (SELECT count(*) FROM user_locations),
+           (SELECT coalesce(sum(xmin::text::bigint), 0) FROM user_locations)
+""")
+
+_SQL_MARCAS = text("""
+    SELECT scope::text AS scope, mark::text AS mark, date, name,
+           region_code, province_code, locality_code, company_id
+    FROM calendar_marks
+""")
+
+# Ubicación vigente: la fila más reciente de cada usuario
+_SQL_UBICACIONES = text("""
+    SELECT DISTINCT ON (ul.user_id)
+           ul.user_id, r.code AS region_code, l.ine_code
+    FROM user_locations ul
+    LEFT JOIN regions r ON r.id = ul.region_id
+    LEFT JOIN localities l ON l.id = ul.locality_id
+    ORDER BY ul.user_id, ul.created_at DESC, ul.id DESC
+""")
+
+
+def _huella(db: Session):
+    return tuple(db.execute(_SQL_HUELLA).one())
+
+
+def _cargar(db: Session, huella) -> CalendarioCompilado:
+    t0 = time.perf_counter()
+    marcas = [dict(m) for m in db.execute(_SQL_MARCAS).mappings()]
+    ubicaciones: Dict[int, Ubicacion] = {}
+    for r in db.execute(_SQL_UBICACIONES).mappings():
+        ine = (r["ine_code"] or "").strip() or None
+        ubicaciones[r["user_id"]] = (r["region_code"], ine[:2] if ine else None, ine)
+    cal = CalendarioCompilado(marcas, ubicaciones, huella)
+    _dbg(f"compilado: {len(marcas)} marcas, {len(ubicaciones)} ubicaciones "
+         f"en {(time.perf_counter() - t0) * 1000:.0f} ms")
+    return cal
+
+
+def compilar(db: Session) -> CalendarioCompilado:
+    """
+    Compila un calendario nuevo con lo que ve la sesión `db` (incluidos datos
+    aún sin confirmar), sin tocar el compartido de obtener(). Para scripts y tests.
+    """
+    return _cargar(db, _huella(db))
+
+
+_calendario: Optional[CalendarioCompilado] = None
+_comprobado_en = 0.0
+_lock = threading.Lock()
+
+
+def invalidar() -> None:
+    """Descarta el calendario compilado; la próxima consulta lo recarga."""
+    global _calendario
+    with _lock:
+        _calendario = None
+
+
+def obtener(db: Session) -> CalendarioCompilado:
+    """Calendario vigente; comprueba la huella como mucho cada CALENDARIO_TTL_SEG."""
+    global _calendario, _comprobado_en
+    cal = _calendario
+    ahora = time.monotonic()
+    if cal is not None and ahora - _comprobado_en < CALENDARIO_TTL_SEG:
+        return cal
+    with _lock:
+        if _calendario is not None and time.monotonic() - _comprobado_en < CALENDARIO_TTL_SEG:
+            return _calendario
+        huella = _huella(db)
+        if _calendario is None or _calendario.huella != huella:
+            _calendario = _cargar(db, huella)
+        _comprobado_en = time.monotonic()
+        return _calendario
+
+
+def etag(cal: CalendarioCompilado, user_id: int, *partes) -> str:
+    """ETag fuerte de una respuesta de calendario del usuario."""
+    h = hashlib.sha256(repr((cal.huella, cal.ubicacion(user_id)) + partes).encode("utf-8"))
+    return h.hexdigest()[:32]
+
+
+# ---------------- Ausencias para el feed ----------------
+_SQL_VERSION_AUSENCIAS = text("""
+    SELECT count(*), max(updated_at), coalesce(sum(id), 0)
+    FROM ausencias
+    WHERE usuario_email = :email AND fecha_inicio <= :hasta AND fecha_fin >= :desde
+""")
+
+
+def version_ausencias(db: Session, email: str, desde: date, hasta: date):
+    """Cambia al crear, modificar o borrar una ausencia del usuario que toque el rango."""
+    return tuple(db.execute(_SQL_VERSION_AUSENCIAS,
+                            {"email": email, "desde": desde, "hasta": hasta}).one())
+
+
+# Ausencia.tipo -> CalendarEvent.type
+TIPO_EVENTO_AUSENCIA = {"VACACIONES": "VACACIONES", "CITA_MEDICA": "CITA_MEDICA"}
+
+
+def eventos_ausencias(ausencias, desde: date, hasta: date) -> List[Dict]:
+    """Un evento por día de cada ausencia, recortado al rango pedido."""
+    eventos = []
+    for a in ausencias:
+        d = max(a.fecha_inicio, desde)
+        fin = min(a.fecha_fin, hasta)
+        titulo = a.subtipo or a.tipo.replace("_", " ").capitalize()
+        tipo = TIPO_EVENTO_AUSENCIA.get(a.tipo, "AUSENCIA")
+        while d <= fin:
+            eventos.append({"fecha": d, "titulo": titulo, "type": tipo, "estado": a.estado})
+            d += timedelta(days=1)
+    return eventos
+
+
+# ---------------- Feed iCalendar ----------------
+def renderizar_ics(eventos: List[Dict], user_id: int, nombre: str) -> bytes:
+    """VCALENDAR con un VEVENT de día completo por tramo de días consecutivos."""
+    cal = Calendar()
+    cal.add("prodid", "-//Campel//Calendario laboral//ES")
+    cal.add("version", "2.0")
+    cal.add("calscale", "GREGORIAN")
+    cal.add("x-wr-calname", nombre)
+    cal.add("x-wr-timezone", "Europe/Madrid")
+
+    # (titulo, type) -> último tramo abierto [inicio, fin]
+    tramos: List[List] = []
+    abiertos: Dict[Tuple[str, str], List] = {}
+    for e in sorted(eventos, key=lambda e: e["fecha"]):
+        clave = (e["titulo"], e["type"])
+        t = abiertos.get(clave)
+        if t and t[1] + timedelta(days=1) == e["fecha"]:
+            t[1] = e["fecha"]
+        else:
+            t = abiertos[clave] = [e["fecha"], e["fecha"], e["titulo"], e["type"]]
+            tramos.append(t)
+
+    sello = datetime.now(timezone.utc)
+    for inicio, fin, titulo, tipo in tramos:
+        ev = Event()
+        uid = hashlib.sha1(f"{user_id}|{tipo}|{inicio}|{titulo}".encode("utf-8")).hexdigest()
+        ev.add("uid", f"{uid}@campel")
+        ev.add("summary", titulo)
+        ev.add("dtstart", inicio)
+        ev.add("dtend", fin + timedelta(days=1))  # DTEND de día completo es exclusivo
+        ev.add("dtstamp", sello)
+        ev.add("transp", "TRANSPARENT")
+        ev.add("categories", [tipo])
+        cal.add_component(ev)
+    return cal.to_ical()
+
+
+# ---------------- Matriz de equipo ----------------
+# Celdas fijas; las ausencias toman letras minúsculas según aparecen
+CELDA_LABORABLE, CELDA_FIN_SEMANA, CELDA_FESTIVO = "L", "W", "F"
+_LETRAS_AUSENCIA = string.ascii_lowercase + "ABCDEGHIJKMNOPQRSTUVXYZ"  # tipo × parcial × estado
+_PRIORIDAD_ESTADO = {"APROBADA": 0, "PENDIENTE": 1}
+
+
+def _rle(celdas: List[str]) -> str:
+    """['L','L','W'] -> 'L2W1'."""
+    partes, actual, n = [], None, 0
+    for c in celdas:
+        if c == actual:
+            n += 1
+            continue
+        if actual is not None:
+            partes.append(f"{actual}{n}")
+        actual, n = c, 1
+    if actual is not None:
+        partes.append(f"{actual}{n}")
+    return "".join(partes)
+
+
+def matriz_equipo(cal: CalendarioCompilado, usuarios, ausencias, desde: date, hasta: date) -> Dict:
+    """
+    usuarios: [(id, email)]; ausencias: filas de Ausencia no rechazadas del rango.
+    Cada día es una letra de `leyenda`; por celda manda la ausencia (aprobada
+    antes que pendiente, día completo antes que parcial), luego festivo y
+    luego fin de semana. Cada usuario apunta a un patrón RLE de `patrones`.
+    """
+    n_dias = (hasta - desde).days + 1
+    base_ord = desde.toordinal()
+    leyenda: Dict[str, Dict] = {
+        CELDA_LABORABLE: {"tipo": "LABORABLE"},
+        CELDA_FIN_SEMANA: {"tipo": "FIN_DE_SEMANA"},
+        CELDA_FESTIVO: {"tipo": "FESTIVO"},
+    }
+    letra_ausencia: Dict[Tuple, str] = {}
+
+    # Fila base: fines de semana (común a todos)
+    base = [CELDA_FIN_SEMANA if (base_ord + k - 1) % 7 >= 5 else CELDA_LABORABLE for k in range(n_dias)]
+
+    # Ausencias por email, la de más prioridad primero
+    por_email: Dict[str, List] = {}
+    for a in sorted(ausencias, key=lambda a: (_PRIORIDAD_ESTADO.get(a.estado, 9), bool(a.parcial))):
+        por_email.setdefault(a.usuario_email, []).append(a)
+
+    filas_por_ubicacion: Dict[Ubicacion, List[str]] = {}
+    patrones: List[str] = []
+    idx_patron: Dict[str, int] = {}
+    salida_usuarios = []
+    for uid, email in usuarios:
+        ub = cal.ubicacion(uid)
+        fila = filas_por_ubicacion.get(ub)
+        if fila is None:
+            fila = list(base)
+            fu = cal.de_ubicacion(ub)
+            for i in fu.rango(desde, hasta):
+                fila[fu.fechas[i] - base_ord] = CELDA_FESTIVO
+            filas_por_ubicacion[ub] = fila
+
+        propias = por_email.get(email)
+        if propias:
+            fila = list(fila)
+            marcados = set()
+            for a in propias:
+                clave = (a.tipo, bool(a.parcial), a.estado)
+                letra = letra_ausencia.get(clave)
+                if letra is None:
+                    letra = _LETRAS_AUSENCIA[len(letra_ausencia)]
+                    letra_ausencia[clave] = letra
+                    leyenda[letra] = {"tipo": a.tipo, "parcial": bool(a.parcial), "estado": a.estado}
+                ini = max(a.fecha_inicio.toordinal(), base_ord) - base_ord
+                fin = min(a.fecha_fin.toordinal(), base_ord + n_dias - 1) - base_ord
+                for k in range(ini, fin + 1):
+                    if k not in marcados:
+                        fila[k] = letra
+                        marcados.add(k)
+
+        rle = _rle(fila)
+        p = idx_patron.get(rle)
+        if p is None:
+            p = idx_patron[rle] = len(patrones)
+            patrones.append(rle)
+        salida_usuarios.append({"id": uid, "email": email, "p": p})
+
+    return {
+        "desde": desde.isoformat(),
+        "hasta": hasta.isoformat(),
+        "dias": n_dias,
+        "leyenda": leyenda,
+        "patrones": patrones,
+        "usuarios": salida_usuarios,
+    }
@@ -1,15 +1,16 @@
 from __future__ import annotations
 
 import re
+import base64
 from datetime import datetime, timedelta, date, time as _time
 from typing import Optional, List, Dict
 
 import pytz
-from sqlalchemy import and_, or_, text, func
+from sqlalchemy import and_, or_, text, func, literal, insert, update
 from sqlalchemy.exc import SQLAlchemyError
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, aliased
 
-from app import models
+from app import models, kpis, calendario
 from app.utils import generar_hash_fichaje, log_evento
 from app.config import HORAS_JORNADA_COMPLETA
 from app.schemas_solicitudes import SolicitudManualCreate, SolicitudFiltro
@@ -104,6 +105,11 @@ def obtener_usuarios(db: Session):
     return db.query(models.User).all()
 
 
+def listar_usuarios_resumen(db: Session):
+    """Solo las columnas públicas (id, email, role): sin cargar hashes ni relaciones."""
+    return db.query(models.User.id, models.User.email, models.User.role).all()
+
+
 # ======================== Fichajes ========================
 def _ausencias_aprobadas_en_instante(db: Session, email: str, t: datetime):
     d = _ensure_aware(t, TZ_MADRID).date()
@@ -183,6 +189,7 @@ def _autocerrar_turno_con_solicitud_salida(db: Session, usuario: models.User, ul
     )
     db.add(fich)
     log_evento(db, usuario, "fichaje", f"salida (asistido: {validez})")
+    kpis.ajustar(db, kpis.USUARIOS_EN_TURNO, -1)
     db.commit()
     db.refresh(fich)
     return fich
@@ -255,6 +262,7 @@ def crear_fichaje(db: Session, tipo: str, usuario: models.User):
     )
     db.add(fichaje)
     log_evento(db, usuario, "fichaje", tipo_norm)
+    kpis.ajustar(db, kpis.USUARIOS_EN_TURNO, 1 if tipo_norm == "entrada" else -1)
     db.commit()
     db.refresh(fichaje)
     return fichaje
@@ -311,70 +319,93 @@ def crear_solicitud_manual(db: Session, data: SolicitudManualCreate, usuario: mo
     )
     db.add(solicitud)
     log_evento(db, usuario, "solicitud manual", f"{data.tipo} {data.fecha} {data.hora}")
+    kpis.ajustar(db, kpis.SOLICITUDES_PENDIENTES, 1)
     db.commit()
     db.refresh(solicitud)
     return solicitud
 
 
+def _columna_opcional(model, nombre: str, label: Optional[str] = None):
+    """Columna del modelo si existe en este esquema; si no, NULL literal con el mismo nombre."""
+    col = getattr(model, nombre, None)
+    return (col if col is not None else literal(None)).label(label or nombre)
+
+
 def listar_solicitudes_avanzado(
     db: Session,
     filtro: Optional[SolicitudFiltro] = None,
     solo_pendientes: bool = False,
 ):
-    q = db.query(models.SolicitudManual).join(models.User)
+    # Proyección explícita: solicitante y gestor llegan en la misma fila (sin lazy-load por item)
+    Gestor = aliased(models.User)
+    S = models.SolicitudManual
+    q = (
+        db.query(
+            S.id, S.fecha, S.hora, S.tipo, S.motivo, S.estado, S.timestamp,
+            S.gestionado_por_id,
+            models.User.email.label("usuario_email"),
+            Gestor.email.label("gestionado_por_email"),
+            _columna_opcional(S, "gestionado_en"),
+            _columna_opcional(S, "motivo_rechazo"),
+            _columna_opcional(S, "ip_origen"),
+        )
+        .join(models.User, S.user_id == models.User.id)
+        .outerjoin(Gestor, S.gestionado_por_id == Gestor.id)
+    )
 
     if filtro:
         if filtro.estado:
-            q = q.filter(models.SolicitudManual.estado == filtro.estado.value)
+            q = q.filter(S.estado == filtro.estado.value)
         if filtro.usuario:
             q = q.filter(models.User.email == str(filtro.usuario))
         if filtro.tipo:
-            q = q.filter(models.SolicitudManual.tipo == filtro.tipo)
+            q = q.filter(S.tipo == filtro.tipo)
         if filtro.desde:
-            q = q.filter(models.SolicitudManual.timestamp >= filtro.desde)
+            q = q.filter(S.timestamp >= filtro.desde)
         if filtro.hasta:
-            q = q.filter(models.SolicitudManual.timestamp <= filtro.hasta)
+            q = q.filter(S.timestamp <= filtro.hasta)
         if solo_pendientes:
-            q = q.filter(models.SolicitudManual.estado == "pendiente")
+            q = q.filter(S.estado == "pendiente")
 
         order_map = {
-            "timestamp": models.SolicitudManual.timestamp,
-            "fecha": models.SolicitudManual.timestamp,
+            "timestamp": S.timestamp,
+            "fecha": S.timestamp,
             "usuario": models.User.email,
-            "estado": models.SolicitudManual.estado,
+            "estado": S.estado,
         }
-        col = order_map.get(filtro.order_by, models.SolicitudManual.timestamp)
+        col = order_map.get(filtro.order_by, S.timestamp)
         q = q.order_by(col.desc() if filtro.order_dir.value == "desc" else col.asc())
 
-        total = q.count()
+        total = q.order_by(None).count()
         page = max(1, int(filtro.page))
         per_page = max(1, min(200, int(filtro.per_page)))
         q = q.offset((page - 1) * per_page).limit(per_page)
+        rows = q.all()
     else:
         if solo_pendientes:
-            q = q.filter(models.SolicitudManual.estado == "pendiente")
-        q = q.order_by(models.SolicitudManual.timestamp.desc())
-        total = q.count()
+            q = q.filter(S.estado == "pendiente")
+        rows = q.order_by(S.timestamp.desc()).all()
+        total = len(rows)
         page, per_page = 1, total or 1
 
-    items = []
-    for s in q.all():
-        gp = getattr(s, "gestionado_por", None)
-        items.append({
-            "id": s.id,
-            "fecha": s.fecha,
-            "hora": s.hora,
-            "tipo": s.tipo,
-            "motivo": s.motivo,
-            "estado": s.estado,
-            "timestamp": _safe_iso(s.timestamp),
-            "usuario_email": getattr(s.usuario, "email", "desconocido"),
-            "gestionado_por_id": getattr(s, "gestionado_por_id", None),
-            "gestionado_por_email": getattr(gp, "email", None) if gp else None,
-            "gestionado_en": _safe_iso(getattr(s, "gestionado_en", None)),
-            "motivo_rechazo": getattr(s, "motivo_rechazo", None),
-            "ip_origen": getattr(s, "ip_origen", None),
-        })
+    items = [
+        {
+            "id": r.id,
+            "fecha": r.fecha,
+            "hora": r.hora,
+            "tipo": r.tipo,
+            "motivo": r.motivo,
+            "estado": r.estado,
+            "timestamp": _safe_iso(r.timestamp),
+            "usuario_email": r.usuario_email or "desconocido",
+            "gestionado_por_id": r.gestionado_por_id,
+            "gestionado_por_email": r.gestionado_por_email,
+            "gestionado_en": _safe_iso(r.gestionado_en),
+            "motivo_rechazo": r.motivo_rechazo,
+            "ip_origen": r.ip_origen,
+        }
+        for r in rows
+    ]
 
     return {"items": items, "total": total, "page": page, "per_page": per_page}
 
@@ -391,6 +422,7 @@ def aprobar_solicitud(db: Session, solicitud_id: int, admin: models.User, ip: Op
         raise ValueError("La solicitud ya fue gestionada")
 
     ts = _parse_fecha_hora(s.fecha, s.hora, TZ_MADRID)
+    en_turno_antes = kpis.en_turno(db, [s.user_id])
 
     fich = (
         db.query(models.Fichaje)
@@ -457,6 +489,9 @@ def aprobar_solicitud(db: Session, solicitud_id: int, admin: models.User, ip: Op
 
     log_evento(db, s.usuario, "fichaje manual aprobado",
                f"{ts.strftime('%d/%m/%Y %H:%M:%S')}|{s.motivo}")
+    kpis.ajustar(db, kpis.SOLICITUDES_PENDIENTES, -1)
+    db.flush()
+    kpis.ajustar(db, kpis.USUARIOS_EN_TURNO, kpis.en_turno(db, [s.user_id]) - en_turno_antes)
 
     db.commit()
     db.refresh(s)
@@ -479,6 +514,7 @@ def rechazar_solicitud(db: Session, solicitud_id: int, admin: models.User, motiv
         )
         .first()
     )
+    en_turno_antes = kpis.en_turno(db, [s.user_id])
     if fich:
         fich.validez = "invalidado"
         db.add(fich)
@@ -494,34 +530,302 @@ def rechazar_solicitud(db: Session, solicitud_id: int, admin: models.User, motiv
         s.ip_origen = ip
 
     log_evento(db, s.usuario, "fichaje manual rechazado", s.motivo)
+    kpis.ajustar(db, kpis.SOLICITUDES_PENDIENTES, -1)
+    db.flush()
+    kpis.ajustar(db, kpis.USUARIOS_EN_TURNO, kpis.en_turno(db, [s.user_id]) - en_turno_antes)
 
     db.commit()
     db.refresh(s)
     return s
 
 
-# ======================== Logs (para UI) ========================
-def obtener_logs(db: Session):
-    fichajes = (
-        db.query(models.Fichaje)
-        .join(models.User)
-        .order_by(models.Fichaje.timestamp.asc())
+def resolver_solicitudes_lote(
+    db: Session,
+    ids: List[int],
+    aprobar: bool,
+    admin: models.User,
+    motivo_rechazo: Optional[str] = None,
+    ip: Optional[str] = None,
+) -> List[Dict]:
+    """
+    Aprueba o rechaza varias solicitudes con consultas por conjunto y un único commit.
+    Mismas reglas que aprobar_solicitud/rechazar_solicitud; los fallos son por item
+    (no abortan el lote). Devuelve un resultado por id, en el orden recibido.
+    """
+    S, F = models.SolicitudManual, models.Fichaje
+    ids = list(dict.fromkeys(int(i) for i in ids))
+    resultados: Dict[int, Dict] = {i: {"id": i, "ok": False, "estado": None, "error": None} for i in ids}
+    if not ids:
+        return []
+
+    filas = (
+        db.query(S.id, S.user_id, S.fecha, S.hora, S.tipo, S.motivo, S.estado,
+                 models.User.email.label("usuario_email"))
+        .join(models.User, S.user_id == models.User.id)
+        .filter(S.id.in_(ids))
         .all()
     )
-
-    resultado = []
-    for f in fichajes:
-        if not f.usuario:
+    por_id = {f.id: f for f in filas}
+
+    # 1) Validación individual (existencia, estado, fecha/hora)
+    validas = []
+    for sid in ids:
+        f = por_id.get(sid)
+        if not f:
+            resultados[sid]["error"] = "Solicitud no encontrada"
             continue
-        resultado.append({
-            "usuario_email": f.usuario.email,
-            "tipo": f.tipo,
-            "timestamp": _safe_iso(f.timestamp),
-            "is_manual": bool(getattr(f, "is_manual", False)),
-            "validez": (getattr(f, "validez", "valido") or "valido"),
-            "motivo": (getattr(f, "motivo", "") or "").strip() if getattr(f, "is_manual", False) else ""
-        })
-    return resultado
+        if f.estado != "pendiente":
+            resultados[sid]["error"] = "La solicitud ya fue gestionada"
+            continue
+        try:
+            ts = _parse_fecha_hora(f.fecha, f.hora, TZ_MADRID)
+        except ValueError as e:
+            resultados[sid]["error"] = str(e)
+            continue
+        validas.append((f, ts, (f.tipo or "").lower()))
+
+    if not validas:
+        return [resultados[i] for i in ids]
+
+    # 2) Reclamar con UPDATE condicionado: si otro admin resolvió alguna a la vez,
+    #    no vuelve en RETURNING y se informa sin tocar fichajes ni auditoría.
+    ahora_utc = datetime.now(pytz.UTC)
+    estado = "aprobada" if aprobar else "rechazada"
+    valores = {"estado": estado, "gestionado_por_id": admin.id if admin else None}
+    if hasattr(S, "gestionado_en"):
+        valores["gestionado_en"] = ahora_utc
+    if hasattr(S, "ip_origen"):
+        valores["ip_origen"] = ip
+    if not aprobar and hasattr(S, "motivo_rechazo"):
+        valores["motivo_rechazo"] = (motivo_rechazo or "").strip() or None
+    reclamadas = set(db.execute(
+        update(S)
+        .where(S.id.in_([f.id for f, _, _ in validas]), S.estado == "pendiente")
+        .values(**valores)
+        .returning(S.id)
+        .execution_options(synchronize_session=False)
+    ).scalars())
+    for f, _, _ in validas:
+        if f.id not in reclamadas:
+            resultados[f.id]["error"] = "La solicitud ya fue gestionada"
+    validas = [v for v in validas if v[0].id in reclamadas]
+
+    resueltas: List[int] = []
+    logs: List[Dict] = []
+    uids = {f.user_id for f, _, _ in validas}
+    en_turno_antes = kpis.en_turno(db, uids)
+
+    if aprobar and validas:
+
+        # Fichajes ya existentes que casan por solicitud_id o por instante exacto
+        existentes = (
+            db.query(F.id, F.user_id, F.tipo, F.timestamp, F.solicitud_id)
+            .filter(
+                F.user_id.in_(uids),
+                or_(F.solicitud_id.in_([f.id for f, _, _ in validas]),
+                    F.timestamp.in_([ts for _, ts, _ in validas])),
+            )
+            .order_by(F.id.asc())
+            .all()
+        )
+        # Primera entrada de cada usuario: basta para saber si hay entrada previa a un instante
+        primera_entrada = dict(
+            db.query(F.user_id, func.min(F.timestamp))
+            .filter(F.user_id.in_(uids), F.tipo == "entrada")
+            .group_by(F.user_id)
+            .all()
+        )
+        primera_entrada = {uid: _ensure_aware(t) for uid, t in primera_entrada.items()}
+
+        actualizar, insertar = [], {}
+        for f, ts, tipo in sorted(validas, key=lambda v: v[1]):
+            fich = next(
+                (e for e in existentes
+                 if e.user_id == f.user_id and e.tipo == tipo
+                 and (e.solicitud_id == f.id or _ensure_aware(e.timestamp) == ts)),
+                None,
+            )
+            instante = _ensure_aware(fich.timestamp) if fich else ts
+            if tipo == "salida":
+                pe = primera_entrada.get(f.user_id)
+                if pe is None or pe > instante:
+                    resultados[f.id]["error"] = "❌ No hay una entrada previa válida para esa salida."
+                    continue
+            elif tipo == "entrada":
+                pe = primera_entrada.get(f.user_id)
+                if pe is None or instante < pe:
+                    primera_entrada[f.user_id] = instante
+
+            if fich:
+                actualizar.append({"id": fich.id, "validez": "valido", "solicitud_id": f.id})
+            elif (f.user_id, tipo, ts) in insertar:
+                # Mismo usuario, tipo e instante que otra del lote: un solo fichaje,
+                # enlazado a la última (como haría aprobar_solicitud una tras otra)
+                insertar[(f.user_id, tipo, ts)]["solicitud_id"] = f.id
+            else:
+                insertar[(f.user_id, tipo, ts)] = {
+                    "tipo": tipo,
+                    "timestamp": ts,
+                    "hash": generar_hash_fichaje(f.usuario_email, tipo, ts.isoformat()),
+                    "user_id": f.user_id,
+                    "is_manual": True,
+                    "motivo": f.motivo,
+                    "validez": "valido",
+                    "solicitud_id": f.id,
+                }
+            resueltas.append(f.id)
+            logs.append({
+                "accion": "fichaje manual aprobado",
+                "detalle": f"{ts.strftime('%d/%m/%Y %H:%M:%S')}|{f.motivo}",
+                "user_id": f.user_id,
+                "timestamp": ahora_utc,
+            })
+
+        if actualizar:
+            db.execute(update(F), actualizar)
+        if insertar:
+            db.execute(insert(F), list(insertar.values()))
+
+        # Reclamadas que no pasaron la validación de salida: vuelven a pendiente
+        fallidas = reclamadas - set(resueltas)
+        if fallidas:
+            db.execute(
+                update(S)
+                .where(S.id.in_(fallidas))
+                .values(estado="pendiente", gestionado_por_id=None,
+                        **{k: None for k in ("gestionado_en", "ip_origen") if hasattr(S, k)})
+                .execution_options(synchronize_session=False)
+            )
+
+    elif validas:
+        resueltas = [f.id for f, _, _ in validas]
+        db.execute(
+            update(F)
+            .where(F.solicitud_id.in_(resueltas))
+            .values(validez="invalidado")
+            .execution_options(synchronize_session=False)
+        )
+        logs = [
+            {"accion": "fichaje manual rechazado", "detalle": f.motivo,
+             "user_id": f.user_id, "timestamp": ahora_utc}
+            for f, _, _ in validas
+        ]
+
+    if logs:
+        db.execute(insert(LogAuditoria), logs)
+    kpis.ajustar(db, kpis.SOLICITUDES_PENDIENTES, -len(resueltas))
+    kpis.ajustar(db, kpis.USUARIOS_EN_TURNO, kpis.en_turno(db, uids) - en_turno_antes)
+    db.commit()
+    for sid in resueltas:
+        resultados[sid].update(ok=True, estado=estado)
+
+    return [resultados[i] for i in ids]
+
+
+# ======================== Logs (para UI) ========================
+def _consulta_logs(
+    db: Session,
+    usuarios: Optional[List[str]] = None,
+    desde: Optional[date] = None,
+    hasta: Optional[date] = None,
+    por_usuario: bool = False,
+):
+    """
+    Proyección de fichajes + email con filtros opcionales.
+    Orden estable: (timestamp, id), o (email, timestamp, id) si `por_usuario`.
+    `desde`/`hasta` son días naturales en Europe/Madrid, ambos inclusive.
+    """
+    F = models.Fichaje
+    q = (
+        db.query(
+            F.id,
+            models.User.email.label("usuario_email"),
+            F.tipo, F.timestamp, F.is_manual, F.validez, F.motivo,
+        )
+        .join(models.User, F.user_id == models.User.id)
+    )
+    if usuarios:
+        q = q.filter(models.User.email.in_(usuarios))
+    if desde:
+        q = q.filter(F.timestamp >= _ensure_aware(datetime.combine(desde, _time.min)))
+    if hasta:
+        q = q.filter(F.timestamp < _ensure_aware(datetime.combine(hasta + timedelta(days=1), _time.min)))
+    orden = [F.timestamp.asc(), F.id.asc()]
+    if por_usuario:
+        orden.insert(0, models.User.email.asc())
+    return q.order_by(*orden)
+
+
+def _fila_log(r, tipado: bool = False) -> Dict:
+    return {
+        "usuario_email": r.usuario_email,
+        "tipo": r.tipo,
+        "timestamp": _ensure_aware(r.timestamp) if tipado else _safe_iso(r.timestamp),
+        "is_manual": bool(r.is_manual),
+        "validez": r.validez or "valido",
+        "motivo": (r.motivo or "").strip() if r.is_manual else "",
+    }
+
+
+def _codificar_cursor(ts: datetime, fid: int) -> str:
+    raw = f"{_safe_iso(ts)}|{fid}".encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def _decodificar_cursor(cursor: str):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode("utf-8")
+        ts_txt, fid = raw.rsplit("|", 1)
+        return datetime.fromisoformat(ts_txt), int(fid)
+    except Exception:
+        raise ValueError("Cursor inválido")
+
+
+def obtener_logs_pagina(
+    db: Session,
+    usuarios: Optional[List[str]] = None,
+    desde: Optional[date] = None,
+    hasta: Optional[date] = None,
+    cursor: Optional[str] = None,
+    limite: int = 500,
+):
+    """Paginación por cursor (keyset sobre timestamp, id): coste constante por página."""
+    F = models.Fichaje
+    q = _consulta_logs(db, usuarios, desde, hasta)
+    if cursor:
+        c_ts, c_id = _decodificar_cursor(cursor)
+        q = q.filter(or_(F.timestamp > c_ts, and_(F.timestamp == c_ts, F.id > c_id)))
+    rows = q.limit(limite + 1).all()
+    siguiente = None
+    if len(rows) > limite:
+        rows = rows[:limite]
+        siguiente = _codificar_cursor(rows[-1].timestamp, rows[-1].id)
+    return {"items": [_fila_log(r) for r in rows], "next_cursor": siguiente}
+
+
+def iterar_logs(
+    db: Session,
+    usuarios: Optional[List[str]] = None,
+    desde: Optional[date] = None,
+    hasta: Optional[date] = None,
+    por_usuario: bool = False,
+    tipado: bool = False,
+    lote: int = 1000,
+):
+    """Recorre los fichajes con cursor de servidor (yield_per): memoria constante."""
+    for r in _consulta_logs(db, usuarios, desde, hasta, por_usuario).yield_per(lote):
+        yield _fila_log(r, tipado)
+
+
+def contar_logs(
+    db: Session,
+    usuarios: Optional[List[str]] = None,
+    desde: Optional[date] = None,
+    hasta: Optional[date] = None,
+) -> int:
+    """Nº de fichajes que devolvería iterar_logs con los mismos filtros."""
+    sub = _consulta_logs(db, usuarios, desde, hasta).order_by(None).subquery()
+    return int(db.query(func.count()).select_from(sub).scalar() or 0)
 
 
 # ======================== Resúmenes robustos ========================
@@ -654,3 +958,54 @@ def resumen_semana_usuario(db: Session, usuario: models.User):
             "objetivo_dia_horas": objetivo_dia_horas,
         }
     }
+
+
+# ======================== Calendario ========================
+def obtener_festivos_por_usuario_en_rango(db: Session, user_id: int, start: date, end: date) -> List[Dict]:
+    """
+    Festivos aplicables al usuario (nacionales + su región/provincia/localidad
+    + empresa), deduplicados por día y ordenados. Se resuelven en memoria
+    contra el calendario compilado (app.calendario).
+    """
+    return calendario.obtener(db).festivos(user_id, start, end)
+
+
+def obtener_eventos_calendario(db: Session, user_id: int, start: date, end: date) -> List[Dict]:
+    """Feed unificado: festivos del usuario + sus ausencias (no rechazadas), un evento por día."""
+    eventos = [
+        {"fecha": date.fromisoformat(f["date"]), "titulo": f["name"], "type": "FESTIVO", "estado": None}
+        for f in obtener_festivos_por_usuario_en_rango(db, user_id, start, end)
+    ]
+    usuario = obtener_usuario_por_id(db, user_id)
+    if usuario:
+        ausencias = (
+            db.query(Ausencia)
+            .filter(
+                Ausencia.usuario_email == usuario.email,
+                Ausencia.estado != "RECHAZADA",
+                Ausencia.fecha_inicio <= end,
+                Ausencia.fecha_fin >= start,
+            )
+            .all()
+        )
+        eventos.extend(calendario.eventos_ausencias(ausencias, start, end))
+    eventos.sort(key=lambda e: (e["fecha"], e["type"] != "FESTIVO"))
+    return eventos
+
+
+def version_feed_calendario(db: Session, user_id: int) -> int:
+    """Versión vigente de los enlaces .ics del usuario (0 si nunca se revocaron)."""
+    fila = db.get(models.CalendarFeedToken, user_id)
+    return fila.version if fila else 0
+
+
+def revocar_feed_calendario(db: Session, user_id: int) -> int:
+    """Invalida todos los enlaces .ics emitidos al usuario; devuelve la versión nueva."""
+    fila = db.get(models.CalendarFeedToken, user_id)
+    if fila is None:
+        fila = models.CalendarFeedToken(user_id=user_id, version=0)
+        db.add(fila)
+    fila.version = (fila.version or 0) + 1
+    fila.revocado_en = datetime.now(pytz.UTC)
+    db.commit()
+    return fila.version
@@ -0,0 +1,338 @@
+# backend/app/export_jobs.py
+"""
+Exportaciones en segundo plano (tabla export_jobs + artefactos en disco).
+
+- `crear_o_reutilizar()` registra el trabajo y lo encola en un pool de hilos;
+  el worker renderiza con el mismo pipeline que /api/logs/exportar
+  (crud.iterar_logs -> dataset -> exportador.volcar) a EXPORT_DIR.
+- La clave del trabajo es el sha256 de formato + filtros normalizados: una
+  petición idéntica reutiliza el trabajo en curso o el artefacto vigente.
+- Los artefactos caducan a las EXPORT_TTL_HORAS (EXPORT_TTL_ABIERTO_MIN si el
+  rango incluye hoy, porque aún pueden llegar fichajes); `purgar_expirados()`
+  borra fichero y fila.
+- Mientras un trabajo está EN_CURSO, un latido refresca `actualizado_en` cada
+  EXPORT_JOB_LATIDO_SEG (también durante un renderizado largo en el pool de
+  procesos, que no da progreso). Solo se da por huérfano, y se vuelve a
+  encolar al arrancar, el EN_CURSO sin latido en EXPORT_JOB_TIMEOUT_MIN
+  (proceso reiniciado a mitad).
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+
+from app import crud, models
+from app.database import SessionLocal
+from app.exportadores import pool
+from app.exportadores.dataset import datos_export, iterar_por_usuario
+from app.exportadores.exportador_factory import formatos, obtener_exportador, requiere_proceso
+
+EXPORT_DIR = os.getenv("EXPORT_DIR", os.path.join(tempfile.gettempdir(), "campel_exports"))
+EXPORT_WORKERS = int(os.getenv("EXPORT_WORKERS", "2"))
+EXPORT_TTL_HORAS = int(os.getenv("EXPORT_TTL_HORAS", "24"))
+EXPORT_TTL_ABIERTO_MIN = int(os.getenv("EXPORT_TTL_ABIERTO_MIN", "10"))
+EXPORT_JOB_TIMEOUT_MIN = int(os.getenv("EXPORT_JOB_TIMEOUT_MIN", "30"))
+# Muy por debajo del timeout: un latido perdido no convierte el trabajo en huérfano
+EXPORT_JOB_LATIDO_SEG = int(os.getenv("EXPORT_JOB_LATIDO_SEG", "60"))
+
+PENDIENTE, EN_CURSO, LISTO, ERROR = "PENDIENTE", "EN_CURSO", "LISTO", "ERROR"
+
+# Filas leídas entre dos actualizaciones de progreso
+PASO_PROGRESO = 2000
+
+_J = models.ExportJob
+_pool = ThreadPoolExecutor(max_workers=EXPORT_WORKERS, thread_name_prefix="export")
+_lock = threading.Lock()
+
+
+def _dbg(msg: str):
+    print(f"[EXPORTJOBS] {msg}")
+
+
+def _ahora() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _utc(dt: Optional[datetime]) -> Optional[datetime]:
+    # SQLite devuelve naive; lo guardado siempre es UTC
+    if dt is None:
+        return None
+    return dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)
+
+
+def clave_filtros(formato: str, usuarios: Optional[List[str]], desde: date, hasta: date) -> str:
+    norm = {
+        "formato": formato,
+        "usuarios": sorted(set(usuarios or [])),
+        "desde": desde.isoformat(),
+        "hasta": hasta.isoformat(),
+    }
+    return hashlib.sha256(json.dumps(norm, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def _huerfano(job: models.ExportJob) -> bool:
+    ultimo = _utc(job.actualizado_en or job.created_at)
+    return bool(ultimo) and ultimo < _ahora() - timedelta(minutes=EXPORT_JOB_TIMEOUT_MIN)
+
+
+def _vigente(job: models.ExportJob) -> bool:
+    if job.estado == PENDIENTE:
+        return True
+    if job.estado == EN_CURSO:
+        return not _huerfano(job)
+    if job.estado == LISTO:
+        return (
+            bool(job.expira_en) and _utc(job.expira_en) > _ahora()
+            and bool(job.ruta_artefacto) and os.path.exists(job.ruta_artefacto)
+        )
+    return False
+
+
+def nombre_descarga(job: models.ExportJob) -> str:
+    return obtener_exportador(job.formato, []).nombre_archivo()
+
+
+def tipo_mime(job: models.ExportJob) -> str:
+    return obtener_exportador(job.formato, []).tipo_mime()
+
+
+def serializar(job: models.ExportJob) -> Dict:
+    iso = lambda dt: _utc(dt).isoformat() if dt else None
+    return {
+        "id": job.id,
+        "formato": job.formato,
+        "filtros": json.loads(job.filtros),
+        "estado": job.estado,
+        "progreso": job.progreso,
+        "filas_total": job.filas_total,
+        "filas_procesadas": job.filas_procesadas,
+        "tamano": job.tamano,
+        "error": job.error,
+        "created_at": iso(job.created_at),
+        "finished_at": iso(job.finished_at),
+        "expira_en": iso(job.expira_en),
+        "descarga": f"/api/logs/exportaciones/{job.id}/descarga" if job.estado == LISTO else None,
+    }
+
+
+# ---------------- Alta / reutilización ----------------
+def crear_o_reutilizar(
+    db: Session,
+    formato: str,
+    usuarios: Optional[List[str]],
+    desde: date,
+    hasta: date,
+    solicitante: str,
+) -> Tuple[models.ExportJob, bool]:
+    """Devuelve (trabajo, reutilizado). Solo encola si no hay uno vigente con la misma clave."""
+    if formato not in formatos():
+        raise ValueError(f"Formato '{formato}' no soportado")
+    clave = clave_filtros(formato, usuarios, desde, hasta)
+
+    with _lock:
+        purgar_expirados(db)
+        candidatos = (
+            db.query(_J)
+            .filter(_J.clave == clave, _J.estado.in_((PENDIENTE, EN_CURSO, LISTO)))
+            .order_by(_J.created_at.desc())
+            .all()
+        )
+        for job in candidatos:
+            if _vigente(job):
+                return job, True
+
+        job = _J(
+            id=uuid.uuid4().hex,
+            clave=clave,
+            formato=formato,
+            filtros=json.dumps({
+                "usuarios": sorted(set(usuarios or [])),
+                "desde": desde.isoformat(),
+                "hasta": hasta.isoformat(),
+            }),
+            estado=PENDIENTE,
+            progreso=0,
+            filas_procesadas=0,
+            creado_por=solicitante,
+        )
+        db.add(job)
+        db.commit()
+        db.refresh(job)
+
+    _pool.submit(_ejecutar, job.id)
+    return job, False
+
+
+# ---------------- Worker ----------------
+def _reclamar(db: Session, job_id: str) -> bool:
+    """PENDIENTE -> EN_CURSO de forma atómica (evita dobles ejecuciones entre procesos)."""
+    res = db.execute(
+        update(_J)
+        .where(_J.id == job_id, _J.estado == PENDIENTE)
+        .values(estado=EN_CURSO, actualizado_en=_ahora())
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+    return res.rowcount == 1
+
+
+@contextmanager
+def _latido(job_id: str):
+    """Refresca actualizado_en del trabajo EN_CURSO en un hilo aparte hasta salir del bloque."""
+    parar = threading.Event()
+
+    def _latir():
+        while not parar.wait(EXPORT_JOB_LATIDO_SEG):
+            db = SessionLocal()
+            try:
+                db.execute(
+                    update(_J)
+                    .where(_J.id == job_id, _J.estado == EN_CURSO)
+                    .values(actualizado_en=_ahora())
+                    .execution_options(synchronize_session=False)
+                )
+                db.commit()
+            except Exception as e:
+                _dbg(f"latido {job_id}: {e!r}")
+            finally:
+                db.close()
+
+    hilo = threading.Thread(target=_latir, name=f"export-latido-{job_id[:8]}", daemon=True)
+    hilo.start()
+    try:
+        yield
+    finally:
+        parar.set()
+        hilo.join()
+
+
+def _con_progreso(filas, db: Session, job: models.ExportJob):
+    n = 0
+    for f in filas:
+        n += 1
+        if n % PASO_PROGRESO == 0:
+            job.filas_procesadas = n
+            if job.filas_total:
+                # El 5 % final queda para el renderizado del fichero
+                job.progreso = min(95, n * 95 // job.filas_total)
+            db.commit()
+        yield f
+    job.filas_procesadas = n
+    job.progreso = 95
+    db.commit()
+
+
+def _caducidad(hasta: date) -> datetime:
+    if hasta >= date.today():
+        return _ahora() + timedelta(minutes=EXPORT_TTL_ABIERTO_MIN)
+    return _ahora() + timedelta(hours=EXPORT_TTL_HORAS)
+
+
+def _ejecutar(job_id: str) -> None:
+    db = SessionLocal()
+    lectura = SessionLocal()  # el cursor de yield_per no comparte sesión con los commits de progreso
+    try:
+        if not _reclamar(db, job_id):
+            return
+        with _latido(job_id):
+            job = db.get(_J, job_id)
+            filtros = json.loads(job.filtros)
+            usuarios = filtros["usuarios"] or None
+            desde = date.fromisoformat(filtros["desde"])
+            hasta = date.fromisoformat(filtros["hasta"])
+
+            job.filas_total = crud.contar_logs(lectura, usuarios, desde, hasta)
+            db.commit()
+
+            filas = crud.iterar_logs(lectura, usuarios, desde, hasta, por_usuario=True, tipado=True)
+            filas = _con_progreso(filas, db, job)
+
+            os.makedirs(EXPORT_DIR, exist_ok=True)
+            destino = os.path.join(EXPORT_DIR, f"{job.id}.{job.formato}")
+            parcial = destino + ".part"
+            if requiere_proceso(job.formato):
+                # El trabajo ya esperó su turno aquí: sin contrapresión, pero dentro del cupo de procesos
+                pool.renderizar(job.formato, datos_export(filas), destino=parcial, forzar=True)
+            else:
+                # Formatos ligeros: un usuario cada vez, directo al fichero
+                with open(parcial, "wb") as f:
+                    obtener_exportador(job.formato, iterar_por_usuario(filas)).volcar(f)
+            os.replace(parcial, destino)
+
+            job.estado = LISTO
+            job.progreso = 100
+            job.ruta_artefacto = destino
+            job.tamano = os.path.getsize(destino)
+            job.finished_at = _ahora()
+            job.expira_en = _caducidad(hasta)
+            db.commit()
+        _dbg(f"{job.id} listo ({job.formato}, {job.tamano} bytes)")
+    except Exception as e:
+        traceback.print_exc()
+        db.rollback()
+        job = db.get(_J, job_id)
+        if job:
+            job.estado = ERROR
+            job.error = str(e)[:500]
+            job.finished_at = _ahora()
+            job.expira_en = _ahora() + timedelta(hours=EXPORT_TTL_HORAS)
+            db.commit()
+    finally:
+        lectura.close()
+        db.close()
+
+
+# ---------------- Mantenimiento ----------------
+def _borrar_artefacto(ruta: Optional[str]) -> None:
+    for p in (ruta, f"{ruta}.part" if ruta else None):
+        if p and os.path.exists(p):
+            try:
+                os.remove(p)
+            except OSError as e:
+                _dbg(f"no se pudo borrar {p}: {e!r}")
+
+
+def purgar_expirados(db: Session) -> int:
+    """Borra trabajos terminados cuya caducidad ya pasó (fila + fichero)."""
+    vencidos = (
+        db.query(_J)
+        .filter(_J.estado.in_((LISTO, ERROR)), _J.expira_en < _ahora())
+        .all()
+    )
+    for job in vencidos:
+        _borrar_artefacto(job.ruta_artefacto)
+        db.delete(job)
+    if vencidos:
+        db.commit()
+    return len(vencidos)
+
+
+def reanudar_pendientes() -> int:
+    """Arranque: purga lo caducado y vuelve a encolar lo que quedó a medias."""
+    db = SessionLocal()
+    try:
+        purgar_expirados(db)
+        reencolar = []
+        for job in db.query(_J).filter(_J.estado.in_((PENDIENTE, EN_CURSO))).all():
+            if job.estado == EN_CURSO:
+                if not _huerfano(job):
+                    continue  # lo está renderizando otro proceso
+                _borrar_artefacto(os.path.join(EXPORT_DIR, f"{job.id}.{job.formato}"))
+                job.estado = PENDIENTE
+            reencolar.append(job.id)
+        db.commit()
+        for job_id in reencolar:
+            _pool.submit(_ejecutar, job_id)
+        return len(reencolar)
+    finally:
+        db.close()
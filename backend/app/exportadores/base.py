@@ -1,12 +1,63 @@
 # backend/app/exportadores/base.py
 
 from abc import ABC, abstractmethod
+from typing import Dict, Type
+
+# Clases de coste: las "ligeras" se generan en el hilo de la petición (o en
+# streaming); las "cpu" van al pool de procesos y pasan por la caché.
+COSTE_LIGERO = "ligero"
+COSTE_CPU = "cpu"
+
+# formato -> clase exportadora (se rellena con @registrar)
+REGISTRO: Dict[str, Type["ExportadorBase"]] = {}
+
+
+def registrar(cls: Type["ExportadorBase"]) -> Type["ExportadorBase"]:
+    """Decorador: da de alta el exportador con el formato que declara."""
+    formato = cls.FORMATO.lower()
+    if formato in REGISTRO and REGISTRO[formato] is not cls:
+        raise ValueError(f"Formato ya registrado: {formato}")
+    REGISTRO[formato] = cls
+    return cls
+
 
 class ExportadorBase(ABC):
+    """
+    Contrato común: se construye con los datos (un DatasetFichajes o lo que
+    acepte dataset.como_dataset) y se declara en la clase:
+
+    - FORMATO: valor de ?formato= (clave del registro)
+    - MIME: tipo MIME de la respuesta (también para negociar con Accept)
+    - STREAMING: si `exportar()` envía por bloques a medida que genera
+    - COSTE: COSTE_LIGERO o COSTE_CPU
+    """
+    FORMATO: str = ""
+    MIME: str = "application/octet-stream"
+    STREAMING: bool = False
+    COSTE: str = COSTE_LIGERO
+
+    def __init__(self, datos):
+        self.datos = datos
+
+    @classmethod
+    def calentar(cls) -> None:
+        """
+        Prepara los recursos compartidos del formato (estilos, imágenes...).
+        Lo llama el pool al arrancar cada proceso hijo; por defecto no hace nada.
+        """
+        pass
+
     @abstractmethod
-    def exportar(self, datos):
+    def volcar(self, destino) -> None:
+        """
+        Escribe el fichero completo en `destino` (fichero binario).
         """
-        Genera la respuesta exportada a partir de los datos proporcionados.
+        pass
+
+    @abstractmethod
+    def exportar(self):
+        """
+        Genera la respuesta exportada a partir de los datos del constructor.
         Debe devolver un objeto Response.
         """
         pass
@@ -18,9 +69,8 @@ class ExportadorBase(ABC):
         """
         pass
 
-    @abstractmethod
     def tipo_mime(self) -> str:
         """
         Devuelve el tipo MIME correspondiente al archivo exportado.
         """
-        pass
+        return self.MIME
@@ -0,0 +1,156 @@
+# backend/app/exportadores/cache.py
+"""
+Caché de exportaciones renderizadas, direccionada por contenido.
+
+La clave es el sha256 de (formato, versión de plantilla, dataset): las
+columnas de dataset.DatasetFichajes se hashean directamente como bytes.
+el mismo mes pedido dos veces produce la misma clave aunque cambien el orden
+de los parámetros o quién lo pida, y cualquier fichaje nuevo o corregido la
+cambia. La clave se usa también como ETag.
+
+Dos niveles acotados:
+- Memoria: LRU por bytes (EXPORT_CACHE_MEM_MB).
+- Disco: EXPORT_CACHE_DIR, limitado a EXPORT_CACHE_DISK_MB; se expulsan los
+  ficheros usados hace más tiempo (mtime se actualiza en cada acierto).
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from datetime import date, datetime
+from typing import Dict, Optional
+
+EXPORT_CACHE_DIR = os.getenv("EXPORT_CACHE_DIR", os.path.join(tempfile.gettempdir(), "campel_export_cache"))
+EXPORT_CACHE_MEM_MB = int(os.getenv("EXPORT_CACHE_MEM_MB", "64"))
+EXPORT_CACHE_DISK_MB = int(os.getenv("EXPORT_CACHE_DISK_MB", "512"))
+
+_lock = threading.Lock()
+_memoria: "OrderedDict[str, bytes]" = OrderedDict()
+_bytes_memoria = 0
+_stats = {"aciertos_memoria": 0, "aciertos_disco": 0, "fallos": 0}
+
+
+def _dbg(msg: str):
+    print(f"[EXPORTCACHE] {msg}")
+
+
+def _json_default(v):
+    if isinstance(v, (datetime, date)):
+        return v.isoformat()
+    return str(v)
+
+
+def version_plantilla(exportador) -> str:
+    # Incluye el nombre de empresa porque el PDF lo imprime
+    return f"{getattr(exportador, 'VERSION_PLANTILLA', '0')}:{os.getenv('COMPANY_NAME', 'Campel')}"
+
+
+def clave(formato: str, version: str, datos) -> str:
+    """sha256 incremental: no serializa el dataset entero de una vez."""
+    h = hashlib.sha256(f"{formato}\x00{version}\x00".encode("utf-8"))
+    if hasattr(datos, "actualizar_huella"):
+        datos.actualizar_huella(h)
+        return h.hexdigest()
+    for item in datos:
+        h.update(json.dumps(item, sort_keys=True, separators=(",", ":"),
+                            ensure_ascii=False, default=_json_default).encode("utf-8"))
+        h.update(b"\n")
+    return h.hexdigest()
+
+
+def _ruta(k: str) -> str:
+    return os.path.join(EXPORT_CACHE_DIR, k[:2], k)
+
+
+# ---------------- Memoria ----------------
+def _guardar_memoria(k: str, contenido: bytes) -> None:
+    global _bytes_memoria
+    limite = EXPORT_CACHE_MEM_MB * 1024 * 1024
+    if len(contenido) > limite:
+        return
+    if k in _memoria:
+        _memoria.move_to_end(k)
+        return
+    _memoria[k] = contenido
+    _bytes_memoria += len(contenido)
+    while _bytes_memoria > limite:
+        _, viejo = _memoria.popitem(last=False)
+        _bytes_memoria -= len(viejo)
+
+
+# ---------------- Disco ----------------
+def _recortar_disco() -> None:
+    limite = EXPORT_CACHE_DISK_MB * 1024 * 1024
+    ficheros = []
+    total = 0
+    for raiz, _, nombres in os.walk(EXPORT_CACHE_DIR):
+        for n in nombres:
+            p = os.path.join(raiz, n)
+            try:
+                st = os.stat(p)
+            except OSError:
+                continue
+            ficheros.append((st.st_mtime, st.st_size, p))
+            total += st.st_size
+    if total <= limite:
+        return
+    for _, tam, p in sorted(ficheros):
+        try:
+            os.remove(p)
+            total -= tam
+        except OSError:
+            pass
+        if total <= limite:
+            break
+
+
+# ---------------- API ----------------
+def obtener(k: str, disco: bool = True) -> Optional[bytes]:
+    """`disco=False`: solo el nivel de memoria."""
+    with _lock:
+        contenido = _memoria.get(k)
+        if contenido is not None:
+            _memoria.move_to_end(k)
+            _stats["aciertos_memoria"] += 1
+            return contenido
+        if not disco:
+            _stats["fallos"] += 1
+            return None
+    ruta = _ruta(k)
+    try:
+        with open(ruta, "rb") as f:
+            contenido = f.read()
+        os.utime(ruta)  # marca de uso para la expulsión
+    except OSError:
+        with _lock:
+            _stats["fallos"] += 1
+        return None
+    with _lock:
+        _stats["aciertos_disco"] += 1
+        _guardar_memoria(k, contenido)
+    return contenido
+
+
+def guardar(k: str, contenido: bytes, disco: bool = True) -> None:
+    """`disco=False`: solo el nivel de memoria, sin escribir en EXPORT_CACHE_DIR."""
+    with _lock:
+        _guardar_memoria(k, contenido)
+    if not disco:
+        return
+    ruta = _ruta(k)
+    try:
+        os.makedirs(os.path.dirname(ruta), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(ruta))
+        with os.fdopen(fd, "wb") as f:
+            f.write(contenido)
+        os.replace(tmp, ruta)
+        _recortar_disco()
+    except OSError as e:
+        _dbg(f"no se pudo escribir {ruta}: {e!r}")
+
+
+def estadisticas() -> Dict:
+    with _lock:
+        return {**_stats, "entradas_memoria": len(_memoria), "bytes_memoria": _bytes_memoria}
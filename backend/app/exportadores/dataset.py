@@ -0,0 +1,342 @@
+# backend/app/exportadores/dataset.py
+"""
+Dataset intermedio, tipado y en columnas, que consumen todos los exportadores.
+
+Se construye una sola vez por exportación: las fechas y horas se parsean aquí
+y los exportadores solo formatean en el borde (hora, fecha, duración), sin
+volver a interpretar textos de presentación. Así los totales salen de
+segundos exactos y coinciden entre formatos.
+
+Columnas (`array` compactos, baratos de enviar al pool de procesos y de
+meter en la huella de la caché):
+- Fichajes sueltos (JSON/XML): f_usuario, f_ts (epoch), f_tipo, f_manual, f_motivo.
+- Días por (usuario, fecha): d_usuario, d_fecha (ordinal), d_total (segundos)
+  y d_ini, desplazamientos en los intervalos (el día d ocupa d_ini[d]..d_ini[d+1]).
+- Intervalos entrada→salida: i_entrada, i_salida, i_manual (bits) y los
+  índices de motivo de entrada y salida.
+Usuarios y motivos se guardan una vez en listas; las columnas llevan índices.
+
+Entradas:
+- `desde_fichajes`: filas de crud.iterar_logs(por_usuario=True, tipado=True),
+  ya ordenadas por (usuario, timestamp). Reproduce la agrupación del panel
+  (LogsTab.agruparLogsConIntervalos); los invalidados no computan, salvo en
+  los fichajes sueltos que manda el panel, que se exportan tal cual llegan.
+- `desde_agrupados`: días ya agrupados por el panel (POST /exportar_logs).
+
+Los formatos ligeros (CSV/JSON/XML) no necesitan el rango entero: reciben
+`iterar_por_usuario`, un dataset pequeño por usuario construido sobre la marcha
+desde el cursor. Solo PDF/XLSX (pool + caché) usan `datos_export`, completo.
+"""
+from array import array
+from datetime import date, datetime, time
+from itertools import chain, groupby
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import pytz
+
+TZ_MADRID = pytz.timezone("Europe/Madrid")
+
+TIPO_ENTRADA, TIPO_SALIDA = 0, 1
+TIPOS = ("entrada", "salida")
+MANUAL_ENTRADA, MANUAL_SALIDA = 1, 2
+
+
+# ====== Formato en el borde ======
+def fmt_duracion(segundos: int) -> str:
+    return f"{segundos // 3600}h {(segundos // 60) % 60}m"
+
+
+def fmt_fecha(ordinal: int) -> str:
+    return date.fromordinal(ordinal).strftime("%d/%m/%Y")
+
+
+def hora_local(ts: int) -> datetime:
+    return datetime.fromtimestamp(ts, TZ_MADRID)
+
+
+def hhmm(ts: int) -> str:
+    return hora_local(ts).strftime("%H:%M")
+
+
+def hhmmss(ts: int) -> str:
+    return hora_local(ts).strftime("%H:%M:%S")
+
+
+def _a_madrid(v) -> Optional[datetime]:
+    if isinstance(v, str):
+        v = datetime.fromisoformat(v)
+    if v is None:
+        return None
+    return TZ_MADRID.localize(v) if v.tzinfo is None else v.astimezone(TZ_MADRID)
+
+
+class DatasetFichajes:
+    def __init__(self):
+        self.usuarios: List[str] = []
+        self.motivos: List[str] = [""]
+        self._idx_usuario: Dict[str, int] = {}
+        self._idx_motivo: Dict[str, int] = {"": 0}
+
+        self.f_usuario = array("i")
+        self.f_ts = array("q")
+        self.f_tipo = array("b")
+        self.f_manual = array("b")
+        self.f_motivo = array("i")
+
+        self.d_usuario = array("i")
+        self.d_fecha = array("i")
+        self.d_ini = array("i", [0])
+        self.d_total = array("q")
+
+        self.i_entrada = array("q")
+        self.i_salida = array("q")
+        self.i_manual = array("b")
+        self.i_motivo_entrada = array("i")
+        self.i_motivo_salida = array("i")
+
+    # ---------------- Consulta ----------------
+    @property
+    def n_dias(self) -> int:
+        return len(self.d_usuario)
+
+    @property
+    def n_fichajes(self) -> int:
+        return len(self.f_ts)
+
+    def __bool__(self) -> bool:
+        return bool(self.d_usuario or self.f_ts)
+
+    def intervalos(self, d: int) -> range:
+        return range(self.d_ini[d], self.d_ini[d + 1])
+
+    def duracion(self, i: int) -> int:
+        return self.i_salida[i] - self.i_entrada[i]
+
+    def dias_ordenados(self) -> List[int]:
+        """Índices de día por (usuario sin mayúsculas, fecha)."""
+        return sorted(range(self.n_dias),
+                      key=lambda d: (self.usuarios[self.d_usuario[d]].lower(), self.d_fecha[d]))
+
+    def por_usuario(self) -> Iterator[Tuple[str, "DatasetFichajes"]]:
+        """(email, dataset solo con ese usuario), en el orden de dias_ordenados."""
+        dias: Dict[int, List[int]] = {}
+        fichajes: Dict[int, List[int]] = {}
+        for d in self.dias_ordenados():
+            dias.setdefault(self.d_usuario[d], []).append(d)
+        for f in range(self.n_fichajes):
+            fichajes.setdefault(self.f_usuario[f], []).append(f)
+
+        for u, sus_dias in dias.items():
+            ds = DatasetFichajes()
+            ds.usuarios = [self.usuarios[u]]
+            ds.motivos = self.motivos  # compartida: solo se lee
+            for f in fichajes.get(u, ()):
+                ds._fichaje(0, self.f_ts[f], self.f_tipo[f], self.f_manual[f], self.f_motivo[f])
+            for d in sus_dias:
+                for i in self.intervalos(d):
+                    ds._intervalo(self.i_entrada[i], self.i_salida[i], self.i_manual[i],
+                                  self.i_motivo_entrada[i], self.i_motivo_salida[i])
+                ds._cerrar_dia(0, self.d_fecha[d], self.d_total[d])
+            yield self.usuarios[u], ds
+
+    def actualizar_huella(self, h) -> None:
+        """Vuelca en el hash `h` todo lo que puede acabar en una exportación."""
+        for textos in (self.usuarios, self.motivos):
+            h.update("\x00".join(textos).encode("utf-8"))
+            h.update(b"\x01")
+        for col in (self.f_usuario, self.f_ts, self.f_tipo, self.f_manual, self.f_motivo,
+                    self.d_usuario, self.d_fecha, self.d_ini, self.d_total,
+                    self.i_entrada, self.i_salida, self.i_manual,
+                    self.i_motivo_entrada, self.i_motivo_salida):
+            h.update(col.tobytes())
+            h.update(b"\x01")
+
+    # Los índices inversos se reconstruyen al deserializar (pool de procesos)
+    def __getstate__(self):
+        estado = dict(self.__dict__)
+        del estado["_idx_usuario"], estado["_idx_motivo"]
+        return estado
+
+    def __setstate__(self, estado):
+        self.__dict__.update(estado)
+        self._idx_usuario = {u: i for i, u in enumerate(self.usuarios)}
+        self._idx_motivo = {m: i for i, m in enumerate(self.motivos)}
+
+    # ---------------- Construcción ----------------
+    def _usuario(self, email: str) -> int:
+        i = self._idx_usuario.get(email)
+        if i is None:
+            i = self._idx_usuario[email] = len(self.usuarios)
+            self.usuarios.append(email)
+        return i
+
+    def _motivo(self, texto: Optional[str]) -> int:
+        texto = (texto or "").strip()
+        i = self._idx_motivo.get(texto)
+        if i is None:
+            i = self._idx_motivo[texto] = len(self.motivos)
+            self.motivos.append(texto)
+        return i
+
+    def _fichaje(self, u: int, ts: int, tipo: int, manual: bool, motivo: int) -> None:
+        self.f_usuario.append(u)
+        self.f_ts.append(ts)
+        self.f_tipo.append(tipo)
+        self.f_manual.append(1 if manual else 0)
+        self.f_motivo.append(motivo)
+
+    def _intervalo(self, entrada: int, salida: int, marcas: int, mot_e: int, mot_s: int) -> int:
+        self.i_entrada.append(entrada)
+        self.i_salida.append(salida)
+        self.i_manual.append(marcas)
+        self.i_motivo_entrada.append(mot_e)
+        self.i_motivo_salida.append(mot_s)
+        return salida - entrada
+
+    def _cerrar_dia(self, u: int, ordinal: int, total: int) -> None:
+        self.d_usuario.append(u)
+        self.d_fecha.append(ordinal)
+        self.d_total.append(total)
+        self.d_ini.append(len(self.i_entrada))
+
+    @classmethod
+    def desde_fichajes(cls, filas: Iterable[Dict], ordenado: bool = True,
+                       con_invalidados: bool = False) -> "DatasetFichajes":
+        """
+        filas: dicts de crud._fila_log (timestamp datetime o ISO). Sin `ordenado`
+        se ordenan aquí por (usuario, timestamp). Con `con_invalidados` no se
+        descarta ninguna fila por su validez.
+        """
+        ds = cls()
+        if not ordenado:
+            filas = sorted(
+                (dict(f, timestamp=_a_madrid(f.get("timestamp"))) for f in filas if f.get("timestamp")),
+                key=lambda f: (f.get("usuario_email") or "", f["timestamp"]),
+            )
+
+        clave_actual = None
+        total = 0
+        entrada = None  # (ts, manual, motivo)
+        for f in filas:
+            if not con_invalidados and (f.get("validez") or "valido") == "invalidado":
+                continue
+            ts_local = _a_madrid(f.get("timestamp"))
+            if ts_local is None:
+                continue
+            u = ds._usuario(f.get("usuario_email") or "")
+            clave = (u, ts_local.date().toordinal())
+            if clave != clave_actual:
+                if clave_actual is not None:
+                    ds._cerrar_dia(*clave_actual, total)
+                clave_actual, total, entrada = clave, 0, None
+
+            tipo_txt = (f.get("tipo") or "").lower()
+            if tipo_txt not in TIPOS:
+                continue
+            tipo = TIPOS.index(tipo_txt)
+            ts = int(ts_local.timestamp())
+            manual = bool(f.get("is_manual"))
+            motivo = ds._motivo(f.get("motivo") if manual else "")
+            ds._fichaje(u, ts, tipo, manual, motivo)
+
+            if tipo == TIPO_ENTRADA:
+                entrada = (ts, manual, motivo)
+            elif entrada:
+                marcas = (MANUAL_ENTRADA if entrada[1] else 0) | (MANUAL_SALIDA if manual else 0)
+                total += ds._intervalo(entrada[0], ts, marcas, entrada[2], motivo)
+                entrada = None
+        if clave_actual is not None:
+            ds._cerrar_dia(*clave_actual, total)
+        return ds
+
+    @classmethod
+    def desde_agrupados(cls, dias: Iterable[Dict]) -> "DatasetFichajes":
+        """Días del panel: fecha dd/mm/aaaa y horas HH:MM (con o sin 📝)."""
+        ds = cls()
+
+        def epoch(dia: date, txt: str) -> Optional[int]:
+            try:
+                h, m = txt.replace("📝", "").strip().split(":")[:2]
+                return int(TZ_MADRID.localize(datetime.combine(dia, time(int(h), int(m)))).timestamp())
+            except Exception:
+                return None
+
+        for g in dias:
+            try:
+                d, m, y = (g.get("fecha") or "").strip().replace("-", "/").split("/")
+                dia = date(int(y), int(m), int(d))
+            except Exception:
+                continue
+            u = ds._usuario(g.get("usuario") or "")
+            total = 0
+            for it in g.get("intervalos") or []:
+                ent = epoch(dia, it.get("entrada") or "")
+                sal = epoch(dia, it.get("salida") or "")
+                if ent is None or sal is None:
+                    continue
+                sal = max(sal, ent)
+                man_e, man_s = bool(it.get("manualEntrada")), bool(it.get("manualSalida"))
+                mot_e = ds._motivo(it.get("motivoEntrada") if man_e else "")
+                mot_s = ds._motivo(it.get("motivoSalida") if man_s else "")
+                ds._fichaje(u, ent, TIPO_ENTRADA, man_e, mot_e)
+                ds._fichaje(u, sal, TIPO_SALIDA, man_s, mot_s)
+                marcas = (MANUAL_ENTRADA if man_e else 0) | (MANUAL_SALIDA if man_s else 0)
+                total += ds._intervalo(ent, sal, marcas, mot_e, mot_s)
+            ds._cerrar_dia(u, dia.toordinal(), total)
+        return ds
+
+
+def como_dataset(datos) -> DatasetFichajes:
+    """
+    Normaliza la entrada de un exportador: un DatasetFichajes se usa tal cual;
+    una lista o iterador de días agrupados (con "intervalos") o de fichajes
+    sueltos se convierte aquí, una sola vez.
+    """
+    if isinstance(datos, DatasetFichajes):
+        return datos
+    it = iter(datos or [])
+    primero = next(it, None)
+    if primero is None:
+        return DatasetFichajes()
+    it = chain([primero], it)
+    if "intervalos" in primero:
+        return DatasetFichajes.desde_agrupados(it)
+    # Fichajes sueltos del panel: como antes, se exporta lo que haya enviado
+    return DatasetFichajes.desde_fichajes(it, ordenado=False, con_invalidados=True)
+
+
+def como_datasets(datos) -> Iterator[DatasetFichajes]:
+    """
+    Igual que como_dataset, pero admite también un iterable de DatasetFichajes
+    (uno por usuario, p. ej. iterar_por_usuario) y los entrega de uno en uno
+    sin juntarlos: así los formatos en streaming no retienen todo el rango.
+    """
+    if isinstance(datos, DatasetFichajes):
+        yield datos
+        return
+    it = iter(datos or [])
+    primero = next(it, None)
+    if primero is None:
+        return
+    if isinstance(primero, DatasetFichajes):
+        yield primero
+        yield from it
+        return
+    yield como_dataset(chain([primero], it))
+
+
+def iterar_por_usuario(filas: Iterable[Dict]) -> Iterator[DatasetFichajes]:
+    """
+    Un DatasetFichajes por usuario a partir de filas ya ordenadas por
+    (usuario, timestamp), p. ej. crud.iterar_logs(por_usuario=True): solo hay
+    un usuario en memoria a la vez. Para los formatos en streaming.
+    """
+    for _, suyas in groupby(filas, key=lambda f: f.get("usuario_email") or ""):
+        ds = DatasetFichajes.desde_fichajes(suyas, ordenado=True)
+        if ds:
+            yield ds
+
+
+def datos_export(filas: Iterable[Dict]) -> DatasetFichajes:
+    """Dataset completo del rango, para los formatos que van al pool (PDF/XLSX)."""
+    return DatasetFichajes.desde_fichajes(filas, ordenado=True)
@@ -1,63 +1,80 @@
 import csv
 from io import StringIO
-from fastapi.responses import Response
-from .base import ExportadorBase
+from fastapi.responses import StreamingResponse
+from .base import COSTE_LIGERO, ExportadorBase, registrar
+from .dataset import MANUAL_ENTRADA, MANUAL_SALIDA, como_datasets, fmt_duracion, fmt_fecha, hhmm
 
+@registrar
 class ExportadorCSV(ExportadorBase):
-    def __init__(self, logs):
-        self.logs = logs
-
-    def exportar(self):
-        if not self.logs:
-            contenido = "# NO HAY DATOS PARA EXPORTAR\n"
-            return Response(
-                content=contenido,
-                media_type=self.tipo_mime(),
-                headers={"Content-Disposition": f"attachment; filename={self.nombre_archivo()}"}
-            )
+    """
+    CSV por secciones (usuario/día) a partir del DatasetFichajes, de un
+    iterable de datasets por usuario (dataset.iterar_por_usuario) o de lo que
+    acepte dataset.como_dataset. El contenido se genera por bloques ya
+    codificados (BOM primero), sin retener más de un usuario a la vez.
+    """
+    FORMATO = "csv"
+    MIME = "text/csv"
+    STREAMING = True
+    COSTE = COSTE_LIGERO
+    FILAS_POR_BLOQUE = 500
 
+    def iterar(self):
         output = StringIO()
         writer = csv.writer(output, delimiter=';', quoting=csv.QUOTE_MINIMAL, lineterminator='\n')
+        filas = 0
+        hay_datos = False
+
+        # Un dataset cada vez (uno por usuario si llega de iterar_por_usuario)
+        for ds in como_datasets(self.datos):
+            motivos = ds.motivos
+            for d in range(ds.n_dias):
+                if not hay_datos:
+                    yield "\ufeff".encode("utf-8")  # BOM (utf-8-sig) para Excel
+                    hay_datos = True
+
+                writer.writerow([f"USUARIO: {ds.usuarios[ds.d_usuario[d]]}"])
+                writer.writerow([f"FECHA: {fmt_fecha(ds.d_fecha[d])}"])
+                writer.writerow([])
+                writer.writerow(["ENTRADA", "SALIDA", "DURACIÓN", "ENTRADA MANUAL", "SALIDA MANUAL", "MOTIVO ENTRADA", "MOTIVO SALIDA"])
+
+                intervalos = ds.intervalos(d)
+                for i in intervalos:
+                    marcas = ds.i_manual[i]
+                    writer.writerow([
+                        hhmm(ds.i_entrada[i]), hhmm(ds.i_salida[i]), fmt_duracion(ds.duracion(i)),
+                        "SI" if marcas & MANUAL_ENTRADA else "",
+                        "SI" if marcas & MANUAL_SALIDA else "",
+                        motivos[ds.i_motivo_entrada[i]], motivos[ds.i_motivo_salida[i]],
+                    ])
+
+                writer.writerow([])
+                writer.writerow(["", "", "", "TOTAL JORNADA DEL DÍA:", fmt_duracion(ds.d_total[d])])
+                writer.writerow(["="*80])
+                writer.writerow([])
+
+                filas += len(intervalos) + 8
+                if filas >= self.FILAS_POR_BLOQUE:
+                    yield output.getvalue().encode("utf-8")
+                    output.seek(0)
+                    output.truncate(0)
+                    filas = 0
 
-        for fila in self.logs:
-            usuario = fila.get("usuario", "")
-            fecha = fila.get("fecha", "")
-            intervalos = fila.get("intervalos", [])
-            total_dia = fila.get("total", "")
-
-            writer.writerow([f"USUARIO: {usuario}"])
-            writer.writerow([f"FECHA: {fecha}"])
-            writer.writerow([])
-            writer.writerow(["ENTRADA", "SALIDA", "DURACIÓN", "ENTRADA MANUAL", "SALIDA MANUAL", "MOTIVO ENTRADA", "MOTIVO SALIDA"])
-
-            for i in intervalos:
-                entrada = i.get("entrada", "")
-                salida = i.get("salida", "")
-                duracion = i.get("duracion", "")
-                manual_entrada = "SI" if i.get("manualEntrada") else ""
-                manual_salida = "SI" if i.get("manualSalida") else ""
-                motivo_entrada = i.get("motivoEntrada", "").strip()
-                motivo_salida = i.get("motivoSalida", "").strip()
-
-                writer.writerow([entrada, salida, duracion, manual_entrada, manual_salida, motivo_entrada, motivo_salida])
-
-            writer.writerow([])
-            writer.writerow(["", "", "", "TOTAL JORNADA DEL DÍA:", total_dia])
-            writer.writerow(["="*80])
-            writer.writerow([])
-
-        contenido = output.getvalue().encode("utf-8-sig")
-
-        return Response(
-            content=contenido,
+        if not hay_datos:
+            yield "# NO HAY DATOS PARA EXPORTAR\n".encode("utf-8")
+        elif output.tell():
+            yield output.getvalue().encode("utf-8")
+
+    def volcar(self, destino) -> None:
+        """Escribe el CSV completo en `destino` (fichero binario)."""
+        for bloque in self.iterar():
+            destino.write(bloque)
+
+    def exportar(self):
+        return StreamingResponse(
+            self.iterar(),
             media_type=self.tipo_mime(),
             headers={"Content-Disposition": f"attachment; filename={self.nombre_archivo()}"}
         )
 
     def nombre_archivo(self) -> str:
         return "logs_auditoria.csv"
-
-    def tipo_mime(self) -> str:
-        return "text/csv"
-
-
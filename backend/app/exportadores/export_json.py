@@ -1,92 +1,85 @@
 import json
-from fastapi.responses import Response
-from datetime import datetime
-from collections import defaultdict
-from .base import ExportadorBase
+from fastapi.responses import StreamingResponse
+from .base import COSTE_LIGERO, ExportadorBase, registrar
+from .dataset import MANUAL_ENTRADA, MANUAL_SALIDA, como_datasets, fmt_fecha, hhmmss
 
+@registrar
 class ExportadorJSON(ExportadorBase):
     """
     Exportador profesional de logs en JSON agrupado por usuario y fecha.
     Incluye intervalos, duración, símbolos de fichajes manuales (📝) y motivos.
-    """
-    def __init__(self, datos):
-        self.datos = datos
-
-    def exportar(self):
-        agrupados = defaultdict(lambda: defaultdict(list))
-
-        # Agrupar por usuario y día
-        for log in self.datos:
-            log = dict(log)
-            usuario = log.get("usuario_email")
-            tipo = log.get("tipo")
-            timestamp = log.get("timestamp")
-            is_manual = log.get("is_manual", False)
-            motivo = log.get("motivo", "")
 
-            if isinstance(timestamp, str):
-                timestamp = datetime.fromisoformat(timestamp)
-
-            fecha = timestamp.strftime("%d/%m/%Y")
-            agrupados[usuario][fecha].append({
-                "tipo": tipo,
-                "timestamp": timestamp,
-                "is_manual": is_manual,
-                "motivo": motivo.strip()
-            })
-
-        salida_final = []
-
-        for usuario, fechas in agrupados.items():
-            for fecha, fichajes in fechas.items():
-                fichajes.sort(key=lambda x: x["timestamp"])
+    Lee los días ya agrupados del DatasetFichajes, de un iterable de datasets
+    por usuario (dataset.iterar_por_usuario, sobre fichajes ya ordenados) o de
+    lo que acepte dataset.como_dataset, y escribe el array de forma
+    incremental, un objeto usuario-día cada vez. `compacto=True` omite la
+    indentación.
+    """
+    FORMATO = "json"
+    MIME = "application/json"
+    STREAMING = True
+    COSTE = COSTE_LIGERO
+    TAM_BLOQUE = 64 * 1024
+
+    def __init__(self, datos, compacto: bool = False):
+        super().__init__(datos)
+        self.compacto = compacto
+
+    def _dias(self):
+        # Un dataset cada vez (uno por usuario si llega de iterar_por_usuario)
+        for ds in como_datasets(self.datos):
+            motivos = ds.motivos
+            for d in range(ds.n_dias):
                 intervalos = []
-                total_ms = 0
-                entrada = None
-                entrada_manual = False
-                motivo_entrada = ""
-
-                for f in fichajes:
-                    tipo = f["tipo"]
-                    ts = f["timestamp"]
-                    is_manual = f["is_manual"]
-                    motivo = f["motivo"]
-
-                    if tipo == "entrada":
-                        entrada = ts
-                        entrada_manual = is_manual
-                        motivo_entrada = motivo
-                    elif tipo == "salida" and entrada:
-                        dur_ms = int((ts - entrada).total_seconds() * 1000)
-                        total_ms += dur_ms
-                        intervalo = {
-                            "entrada": entrada.strftime("%H:%M:%S") + (" 📝" if entrada_manual else ""),
-                            "salida": ts.strftime("%H:%M:%S") + (" 📝" if is_manual else ""),
-                            "duracion": self._formato_duracion(dur_ms)
-                        }
-                        if entrada_manual and motivo_entrada:
-                            intervalo["motivo_entrada"] = motivo_entrada
-                        if is_manual and motivo:
-                            intervalo["motivo_salida"] = motivo
-
-                        intervalos.append(intervalo)
-                        entrada = None
-                        motivo_entrada = ""
-
-                resumen = {
-                    "usuario": usuario,
-                    "fecha": fecha,
+                for i in ds.intervalos(d):
+                    marcas = ds.i_manual[i]
+                    intervalo = {
+                        "entrada": hhmmss(ds.i_entrada[i]) + (" 📝" if marcas & MANUAL_ENTRADA else ""),
+                        "salida": hhmmss(ds.i_salida[i]) + (" 📝" if marcas & MANUAL_SALIDA else ""),
+                        "duracion": self._formato_duracion(ds.duracion(i)),
+                    }
+                    if motivos[ds.i_motivo_entrada[i]]:
+                        intervalo["motivo_entrada"] = motivos[ds.i_motivo_entrada[i]]
+                    if motivos[ds.i_motivo_salida[i]]:
+                        intervalo["motivo_salida"] = motivos[ds.i_motivo_salida[i]]
+                    intervalos.append(intervalo)
+
+                yield {
+                    "usuario": ds.usuarios[ds.d_usuario[d]],
+                    "fecha": fmt_fecha(ds.d_fecha[d]),
                     "intervalos": intervalos,
-                    "total": self._formato_duracion(total_ms)
+                    "total": self._formato_duracion(ds.d_total[d])
                 }
 
-                salida_final.append(resumen)
+    def iterar(self):
+        """Bloques UTF-8 del array JSON; mismo texto que json.dumps(lista, indent=2)."""
+        if self.compacto:
+            apertura, separador, cierre = "[", ",", "]"
+            volcar = lambda d: json.dumps(d, ensure_ascii=False, separators=(",", ":"))
+        else:
+            apertura, separador, cierre = "[\n  ", ",\n  ", "\n]"
+            volcar = lambda d: json.dumps(d, indent=2, ensure_ascii=False).replace("\n", "\n  ")
+
+        partes, tam, primero = [], 0, True
+        for dia in self._dias():
+            trozo = (apertura if primero else separador) + volcar(dia)
+            primero = False
+            partes.append(trozo)
+            tam += len(trozo)
+            if tam >= self.TAM_BLOQUE:
+                yield "".join(partes).encode("utf-8")
+                partes, tam = [], 0
+        partes.append("[]" if primero else cierre)
+        yield "".join(partes).encode("utf-8")
+
+    def volcar(self, destino) -> None:
+        """Escribe el JSON en `destino` (fichero binario)."""
+        for bloque in self.iterar():
+            destino.write(bloque)
 
-        # Generar JSON con indentado y UTF-8
-        contenido = json.dumps(salida_final, indent=2, ensure_ascii=False)
-
-        return Response(
-            content=contenido,
+    def exportar(self):
+        return StreamingResponse(
+            self.iterar(),
             media_type=self.tipo_mime(),
             headers={"Content-Disposition": f"attachment; filename={self.nombre_archivo()}"}
         )
@@ -94,10 +87,6 @@ class ExportadorJSON(ExportadorBase):
     def nombre_archivo(self) -> str:
         return "logs_auditoria.json"
 
-    def tipo_mime(self) -> str:
-        return "application/json"
-
-    def _formato_duracion(self, ms: int) -> str:
-        h = ms // 3600000
-        m = (ms % 3600000) // 60000
+    def _formato_duracion(self, segundos: int) -> str:
+        h, m = segundos // 3600, (segundos % 3600) // 60
         return f"{h}h {m}min" if h else f"{m}min"
@@ -1,137 +1,185 @@
-from openpyxl import Workbook
-from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
-from io import BytesIO
+import pickle
+import tempfile
 from datetime import datetime
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font, Alignment, PatternFill, Border, Side, NamedStyle
+from openpyxl.utils import get_column_letter
 from fastapi.responses import StreamingResponse
-
-
-class ExportadorXLSX:
-    def __init__(self, agrupados):
-        self.agrupados = agrupados
-
-    def exportar(self):
-        def calcular_segundos(entrada_str, salida_str):
-            try:
-                e = datetime.strptime(entrada_str.replace("📝", "").strip(), "%H:%M")
-                s = datetime.strptime(salida_str.replace("📝", "").strip(), "%H:%M")
-                dur = (s - e).total_seconds()
-                return max(0, int(dur))
-            except:
-                return 0
-
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Fichajes"
-
-        # Estilos
-        encabezado_font = Font(bold=True, color="FFFFFF")
-        encabezado_fill = PatternFill(start_color="4F81BD", end_color="4F81BD", fill_type="solid")
-        borde = Border(left=Side(style="thin"), right=Side(style="thin"),
-                       top=Side(style="thin"), bottom=Side(style="thin"))
-        alineado = Alignment(horizontal="center", vertical="center")
-        bold = Font(bold=True)
-        fill_dia = PatternFill(start_color="D9D9D9", end_color="D9D9D9", fill_type="solid")
-        fill_usuario = PatternFill(start_color="BDD7EE", end_color="BDD7EE", fill_type="solid")
-
-        columnas = ["Usuario", "Fecha", "Hora de Entrada", "Hora de Salida", "Duración"]
-        ws.append(columnas)
-        for col in range(1, len(columnas) + 1):
-            c = ws.cell(row=1, column=col)
-            c.font = encabezado_font
-            c.fill = encabezado_fill
-            c.border = borde
-            c.alignment = alineado
+from .base import COSTE_CPU, ExportadorBase, registrar
+from .dataset import MANUAL_ENTRADA, MANUAL_SALIDA, como_dataset, fmt_fecha, hhmm
+
+TAM_BLOQUE = 64 * 1024
+
+
+def _estilos():
+    """Estilos con nombre: se registran una vez en el libro y las celdas solo los referencian."""
+    borde = Border(left=Side(style="thin"), right=Side(style="thin"),
+                   top=Side(style="thin"), bottom=Side(style="thin"))
+    alineado = Alignment(horizontal="center", vertical="center")
+    return [
+        NamedStyle(name="encabezado", font=Font(bold=True, color="FFFFFF"),
+                   fill=PatternFill(start_color="4F81BD", end_color="4F81BD", fill_type="solid"),
+                   border=borde, alignment=alineado),
+        NamedStyle(name="total_dia", font=Font(bold=True),
+                   fill=PatternFill(start_color="D9D9D9", end_color="D9D9D9", fill_type="solid"),
+                   border=borde, alignment=alineado),
+        NamedStyle(name="total_usuario", font=Font(bold=True),
+                   fill=PatternFill(start_color="BDD7EE", end_color="BDD7EE", fill_type="solid"),
+                   border=borde, alignment=alineado),
+        NamedStyle(name="pie", font=Font(italic=True, color="666666"),
+                   alignment=Alignment(horizontal="left")),
+    ]
+
+
+def _iterar_archivo(f):
+    try:
+        while True:
+            bloque = f.read(TAM_BLOQUE)
+            if not bloque:
+                break
+            yield bloque
+    finally:
+        f.close()
+
+
+@registrar
+class ExportadorXLSX(ExportadorBase):
+    """
+    XLSX en modo write-only (memoria constante en el nº de celdas).
+
+    En write-only los anchos de columna deben fijarse antes de escribir filas,
+    así que se hace en dos pasadas: las filas se vuelcan a un fichero temporal
+    mientras se calcula el ancho de cada columna, y después se reproducen sobre
+    la hoja. El libro final también se guarda en un temporal que se envía por
+    bloques.
+    """
+    FORMATO = "xlsx"
+    MIME = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+    STREAMING = False
+    COSTE = COSTE_CPU
+    # Subir al cambiar el diseño: invalida la caché de exportaciones
+    VERSION_PLANTILLA = "1"
+    COLUMNAS = ["Usuario", "Fecha", "Hora de Entrada", "Hora de Salida", "Duración"]
+
+    @staticmethod
+    def _fmt_total(segundos: int) -> str:
+        h, m = segundos // 3600, (segundos % 3600) // 60
+        return f"{h}h {m}min" if h else f"{m}min"
+
+    # ====== Pasada 1: filas lógicas (estilo, valores, nº de columnas con estilo) ======
+    def _filas(self):
+        ds = como_dataset(self.datos)
+        n = len(self.COLUMNAS)
+        vacia = (None, [""] * n, 0)
+        yield ("encabezado", self.COLUMNAS, n)
 
         resumen_por_usuario = {}
         motivos_por_usuario = {}
 
-        for entry in self.agrupados:
-            usuario = entry.get("usuario", "")
-            fecha = entry.get("fecha", "")
-            intervalos = entry.get("intervalos", [])
+        for d in range(ds.n_dias):
+            usuario = ds.usuarios[ds.d_usuario[d]]
+            fecha = fmt_fecha(ds.d_fecha[d])
+            intervalos = ds.intervalos(d)
 
-            total_segundos_dia = 0
+            for i in intervalos:
+                marcas = ds.i_manual[i]
+                entrada_str = hhmm(ds.i_entrada[i])
+                salida_str = hhmm(ds.i_salida[i])
 
-            for t in intervalos:
-                entrada_str = t.get("entrada", "")
-                salida_str = t.get("salida", "")
-
-                if t.get("manualEntrada"):
+                if marcas & MANUAL_ENTRADA:
                     entrada_str = f"📝 {entrada_str}"
-                    if t.get("motivoEntrada"):
-                        motivos_por_usuario.setdefault(usuario, []).append(f"{fecha} – Entrada manual: “{t['motivoEntrada']}”")
-                if t.get("manualSalida"):
+                    if ds.i_motivo_entrada[i]:
+                        motivos_por_usuario.setdefault(usuario, []).append(
+                            f"{fecha} – Entrada manual: “{ds.motivos[ds.i_motivo_entrada[i]]}”")
+                if marcas & MANUAL_SALIDA:
                     salida_str = f"📝 {salida_str}"
-                    if t.get("motivoSalida"):
-                        motivos_por_usuario.setdefault(usuario, []).append(f"{fecha} – Salida manual: “{t['motivoSalida']}”")
+                    if ds.i_motivo_salida[i]:
+                        motivos_por_usuario.setdefault(usuario, []).append(
+                            f"{fecha} – Salida manual: “{ds.motivos[ds.i_motivo_salida[i]]}”")
 
-                duracion_segundos = calcular_segundos(entrada_str, salida_str)
-                total_segundos_dia += duracion_segundos
-                duracion_str = f"{duracion_segundos // 3600}h {int((duracion_segundos % 3600) / 60)}min"
+                seg = ds.duracion(i)
+                duracion_str = f"{seg // 3600}h {(seg % 3600) // 60}min"
 
-                fila = [usuario, fecha, entrada_str, salida_str, duracion_str]
-                ws.append(fila)
+                yield (None, [usuario, fecha, entrada_str, salida_str, duracion_str], 0)
 
             if intervalos:
-                h_dia = total_segundos_dia // 3600
-                m_dia = (total_segundos_dia % 3600) // 60
-                total_dia_str = f"{h_dia}h {m_dia}min" if h_dia else f"{m_dia}min"
-
-                ws.append(["", "", "TOTAL DÍA", "", total_dia_str])
-                last_row = ws.max_row
-                for col in range(1, len(columnas) + 1):
-                    c = ws.cell(row=last_row, column=col)
-                    c.font = bold
-                    c.fill = fill_dia
-                    c.alignment = alineado
-                    c.border = borde
-                ws.append([""] * len(columnas))
-
-                resumen_por_usuario[usuario] = resumen_por_usuario.get(usuario, 0) + total_segundos_dia
+                total_dia = ds.d_total[d]
+                yield ("total_dia", ["", "", "TOTAL DÍA", "", self._fmt_total(total_dia)], n)
+                yield vacia
+
+                resumen_por_usuario[usuario] = resumen_por_usuario.get(usuario, 0) + total_dia
 
         for usuario, total_seg in resumen_por_usuario.items():
-            h = total_seg // 3600
-            m = (total_seg % 3600) // 60
-            total_str = f"{h}h {m}min" if h else f"{m}min"
-            ws.append([""] * len(columnas))
-            ws.append(["", "", f"TOTAL USUARIO {usuario}", "", total_str])
-            last_row = ws.max_row
-            for col in range(1, len(columnas) + 1):
-                c = ws.cell(row=last_row, column=col)
-                c.font = bold
-                c.fill = fill_usuario
-                c.alignment = alineado
-                c.border = borde
+            yield vacia
+            yield ("total_usuario", ["", "", f"TOTAL USUARIO {usuario}", "", self._fmt_total(total_seg)], n)
 
         # Bloque final de motivos manuales
         if motivos_por_usuario:
-            ws.append([""] * len(columnas))
-            ws.append(["📝 MOTIVOS DE FICHAJES MANUALES"])
+            yield vacia
+            yield (None, ["📝 MOTIVOS DE FICHAJES MANUALES"], 0)
             for usuario in sorted(motivos_por_usuario):
-                ws.append([f"👤 {usuario}"])
+                yield (None, [f"👤 {usuario}"], 0)
                 for motivo in motivos_por_usuario[usuario]:
-                    ws.append([f"• {motivo}"])
+                    yield (None, [f"• {motivo}"], 0)
 
         # Pie de página
-        ws.append([""] * len(columnas))
-        ws.append(["Documento generado automáticamente - No modificar manualmente"])
-        ws.append([f"Generado el {datetime.now().strftime('%d/%m/%Y a las %H:%M:%S')}"])
-        for i in range(ws.max_row - 1, ws.max_row + 1):
-            for j in range(1, 3):
-                c = ws.cell(row=i, column=j)
-                c.font = Font(italic=True, color="666666")
-                c.alignment = Alignment(horizontal="left")
-
-        for col in ws.columns:
-            max_len = max(len(str(c.value)) if c.value else 0 for c in col)
-            ws.column_dimensions[col[0].column_letter].width = max(12, max_len + 2)
-
-        output = BytesIO()
-        wb.save(output)
-        output.seek(0)
+        yield vacia
+        yield ("pie", ["Documento generado automáticamente - No modificar manualmente"], 2)
+        yield ("pie", [f"Generado el {datetime.now().strftime('%d/%m/%Y a las %H:%M:%S')}"], 2)
+
+    # ====== Pasada 2: libro write-only ======
+    def volcar(self, destino) -> None:
+        """Escribe el libro en `destino` (ruta o fichero binario)."""
+        anchos = {}
+        with tempfile.TemporaryFile() as spool:
+            for fila in self._filas():
+                for i, v in enumerate(fila[1], start=1):
+                    largo = len(str(v)) if v else 0
+                    if largo > anchos.get(i, 0):
+                        anchos[i] = largo
+                pickle.dump(fila, spool, protocol=pickle.HIGHEST_PROTOCOL)
+
+            wb = Workbook(write_only=True)
+            for estilo in _estilos():
+                wb.add_named_style(estilo)
+            ws = wb.create_sheet("Fichajes")
+            for i, largo in anchos.items():
+                ws.column_dimensions[get_column_letter(i)].width = max(12, largo + 2)
+
+            spool.seek(0)
+            while True:
+                try:
+                    estilo, valores, con_estilo = pickle.load(spool)
+                except EOFError:
+                    break
+                if not con_estilo:
+                    ws.append(valores)
+                    continue
+                celdas = []
+                for i in range(max(len(valores), con_estilo)):
+                    c = WriteOnlyCell(ws, value=valores[i] if i < len(valores) else None)
+                    if i < con_estilo:
+                        c.style = estilo
+                    celdas.append(c)
+                ws.append(celdas)
+
+            wb.save(destino)
+
+    def exportar(self):
+        salida = tempfile.TemporaryFile()
+        try:
+            self.volcar(salida)
+            salida.seek(0)
+        except Exception:
+            salida.close()
+            raise
 
         return StreamingResponse(
-            output,
-            media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-            headers={"Content-Disposition": "attachment; filename=logs.xlsx"}
+            _iterar_archivo(salida),
+            media_type=self.tipo_mime(),
+            headers={"Content-Disposition": f"attachment; filename={self.nombre_archivo()}"}
         )
+
+    def nombre_archivo(self) -> str:
+        return "logs.xlsx"
@@ -1,55 +1,95 @@
 # backend/app/exportadores/export_xml.py
-from xml.etree.ElementTree import Element, SubElement, tostring
-from xml.dom import minidom
-from fastapi.responses import Response
-from datetime import datetime
-from .base import ExportadorBase
+from io import StringIO
+from xml.sax.saxutils import XMLGenerator
+from xml.sax.xmlreader import AttributesImpl
+from fastapi.responses import StreamingResponse
+from .base import COSTE_LIGERO, ExportadorBase, registrar
+from .dataset import TIPOS, como_datasets, hora_local
 
+_SIN_ATRIBUTOS = AttributesImpl({})
+
+
+@registrar
 class ExportadorXML(ExportadorBase):
     """
     Exportador profesional de logs en formato XML.
     Cumple normativa laboral 2025-2026.
     Estructura clara y adaptable a sistemas antiguos (ERP, etc.).
-    """
-
-    def exportar(self, datos):
-        raiz = Element("logs")
-
-        for entrada in datos:
-            log = SubElement(raiz, "log")
 
-            usuario = SubElement(log, "usuario_email")
-            usuario.text = entrada.get("usuario_email", "")
-
-            tipo = entrada.get("tipo", "")
-            nodo_tipo = SubElement(log, "tipo")
-            nodo_tipo.text = tipo
+    Un <log> por fichaje suelto del DatasetFichajes, de un iterable de
+    datasets por usuario (dataset.iterar_por_usuario) o de lo que acepte
+    dataset.como_dataset, escrito de forma incremental con XMLGenerator: en
+    memoria solo hay un usuario y un bloque de salida. La salida indentada es
+    la misma que producía minidom.toprettyxml(indent="  ").
+    """
+    FORMATO = "xml"
+    MIME = "application/xml"
+    STREAMING = True
+    COSTE = COSTE_LIGERO
+    LOGS_POR_BLOQUE = 500
 
-            timestamp = entrada.get("timestamp")
-            if isinstance(timestamp, str):
-                timestamp = datetime.fromisoformat(timestamp)
+    @staticmethod
+    def _campos(ds, f):
+        """(etiqueta, texto) de cada hijo de <log> del fichaje `f`, en orden."""
+        tipo = TIPOS[ds.f_tipo[f]]
+        momento = hora_local(ds.f_ts[f])
+        manual = ds.f_manual[f]
+        hora = momento.strftime("%H:%M:%S")
+        campos = [
+            ("usuario_email", ds.usuarios[ds.f_usuario[f]]),
+            ("tipo", tipo),
+            ("fecha", momento.strftime("%d/%m/%Y")),
+            ("hora", hora + " 📝" if manual else hora),
+        ]
+        motivo = ds.motivos[ds.f_motivo[f]]
+        if manual and motivo:
+            limpio = motivo.replace("\n", " ").replace("\r", " ").strip()
+            campos.append(("motivo", f'{tipo.capitalize()} manual: "{limpio}"'))
+        return campos
 
-            fecha = SubElement(log, "fecha")
-            fecha.text = timestamp.strftime("%d/%m/%Y") if timestamp else ""
+    def iterar(self):
+        buf = StringIO()
+        xml = XMLGenerator(buf, encoding="utf-8", short_empty_elements=True)
 
-            hora = SubElement(log, "hora")
-            hora_text = timestamp.strftime("%H:%M:%S") if timestamp else ""
-            if entrada.get("is_manual"):
-                hora.text = hora_text + " 📝"
-            else:
-                hora.text = hora_text
+        def vaciar():
+            bloque = buf.getvalue().encode("utf-8")
+            buf.seek(0)
+            buf.truncate(0)
+            return bloque
 
-            if entrada.get("is_manual") and entrada.get("motivo"):
-                motivo = SubElement(log, "motivo")
-                limpio = entrada["motivo"].replace("\n", " ").replace("\r", " ").strip()
-                tipo_fmt = tipo.capitalize()
-                motivo.text = f'{tipo_fmt} manual: "{limpio}"'
+        xml.startDocument()
+        xml.startElement("logs", _SIN_ATRIBUTOS)
+        n = 0
+        # Un dataset cada vez (uno por usuario si llega de iterar_por_usuario)
+        for ds in como_datasets(self.datos):
+            for f in range(ds.n_fichajes):
+                xml.ignorableWhitespace("\n  ")
+                xml.startElement("log", _SIN_ATRIBUTOS)
+                for etiqueta, texto in self._campos(ds, f):
+                    xml.ignorableWhitespace("\n    ")
+                    xml.startElement(etiqueta, _SIN_ATRIBUTOS)
+                    xml.characters(texto)
+                    xml.endElement(etiqueta)
+                xml.ignorableWhitespace("\n  ")
+                xml.endElement("log")
+                n += 1
+                if n % self.LOGS_POR_BLOQUE == 0:
+                    yield vaciar()
+        if n:
+            xml.ignorableWhitespace("\n")
+        xml.endElement("logs")
+        xml.ignorableWhitespace("\n")
+        xml.endDocument()
+        yield vaciar()
 
-        # Prettify XML
-        xml_bytes = minidom.parseString(tostring(raiz)).toprettyxml(indent="  ", encoding="utf-8")
+    def volcar(self, destino) -> None:
+        """Escribe el XML en `destino` (fichero binario)."""
+        for bloque in self.iterar():
+            destino.write(bloque)
 
-        return Response(
-            content=xml_bytes,
+    def exportar(self):
+        return StreamingResponse(
+            self.iterar(),
             media_type=self.tipo_mime(),
             headers={
                 "Content-Disposition": f"attachment; filename={self.nombre_archivo()}"
@@ -58,7 +98,3 @@ class ExportadorXML(ExportadorBase):
 
     def nombre_archivo(self) -> str:
         return "logs_auditoria.xml"
-
-    def tipo_mime(self) -> str:
-        return "application/xml"
-
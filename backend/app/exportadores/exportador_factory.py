@@ -1,21 +1,78 @@
-from app.exportadores.export_csv import ExportadorCSV
-from app.exportadores.export_pdf import ExportadorPDF
-from app.exportadores.export_json import ExportadorJSON
-from app.exportadores.export_xlsx import ExportadorXLSX
-from app.exportadores.export_xml import ExportadorXML
-
-def obtener_exportador(formato: str, logs: list):
-    formato = formato.lower()
-
-    if formato == "csv":
-        return ExportadorCSV(logs)
-    elif formato == "pdf":
-        return ExportadorPDF(logs)
-    elif formato == "json":
-        return ExportadorJSON(logs)
-    elif formato == "xlsx":
-        return ExportadorXLSX(logs)
-    elif formato == "xml":
-        return ExportadorXML(logs)
-    else:
+# backend/app/exportadores/exportador_factory.py
+"""
+Punto único de acceso al registro de exportadores (base.REGISTRO).
+
+Importar este módulo da de alta los formatos incluidos; un exportador nuevo
+solo necesita heredar de ExportadorBase, declarar FORMATO/MIME/STREAMING/COSTE
+y decorarse con @registrar.
+"""
+from typing import List, Optional, Type
+
+from app.exportadores.base import COSTE_CPU, REGISTRO, ExportadorBase
+from app.exportadores import export_csv, export_json, export_pdf, export_xlsx, export_xml  # noqa: F401  (registro)
+
+FORMATO_POR_DEFECTO = "csv"
+
+
+def clase_exportador(formato: str) -> Type[ExportadorBase]:
+    try:
+        return REGISTRO[formato.lower()]
+    except KeyError:
         raise ValueError(f"Formato no soportado: {formato}")
+
+
+def obtener_exportador(formato: str, logs, **opciones) -> ExportadorBase:
+    return clase_exportador(formato)(logs, **opciones)
+
+
+def formatos() -> List[str]:
+    return sorted(REGISTRO)
+
+
+def requiere_proceso(formato: str) -> bool:
+    """Formatos caros (COSTE_CPU): pool de procesos + caché; el resto se genera en línea."""
+    return clase_exportador(formato).COSTE == COSTE_CPU
+
+
+def _preferencias(accept: str):
+    """[(q, orden, tipo)] de una cabecera Accept, de mayor a menor preferencia."""
+    prefs = []
+    for orden, parte in enumerate(accept.split(",")):
+        campos = [c.strip() for c in parte.split(";")]
+        tipo = campos[0].lower()
+        if not tipo:
+            continue
+        q = 1.0
+        for c in campos[1:]:
+            if c.startswith("q="):
+                try:
+                    q = float(c[2:])
+                except ValueError:
+                    q = 0.0
+        if q > 0:
+            prefs.append((-q, orden, tipo))
+    return [t for _, _, t in sorted(prefs)]
+
+
+def negociar(formato: Optional[str], accept: Optional[str]) -> str:
+    """
+    ?formato= manda; si no viene, el primer MIME del Accept que tenga
+    exportador registrado; `*/*` o sin Accept, FORMATO_POR_DEFECTO.
+    ValueError si no hay ninguno aceptable.
+    """
+    if formato:
+        return clase_exportador(formato).FORMATO
+    if not accept:
+        return FORMATO_POR_DEFECTO
+    por_mime = {cls.MIME: f for f, cls in REGISTRO.items()}
+    for tipo in _preferencias(accept):
+        if tipo in por_mime:
+            return por_mime[tipo]
+        if tipo == "*/*":
+            return FORMATO_POR_DEFECTO
+        if tipo.endswith("/*"):
+            prefijo = tipo[:-1]
+            for f in formatos():
+                if REGISTRO[f].MIME.startswith(prefijo):
+                    return f
+    raise ValueError(f"Ningún formato de exportación admite '{accept}'")
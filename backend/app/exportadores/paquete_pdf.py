@@ -0,0 +1,96 @@
+# backend/app/exportadores/paquete_pdf.py
+"""
+Paquete ZIP con un PDF por empleado (nóminas, requerimientos de Inspección).
+
+Los PDF se renderizan en el pool de lotes (pool.renderizar_lote) y cada uno
+entra en el ZIP en cuanto termina, así que la descarga empieza con el primer
+empleado listo. El ZIP se escribe sobre un flujo no posicionable (descriptores
+de datos tras cada fichero): nada se guarda entero en memoria salvo los PDF
+que están en curso.
+
+Al final se añade SHA256SUMS con el resumen de cada PDF (comprobable con
+`sha256sum -c SHA256SUMS`).
+"""
+import hashlib
+import re
+import time
+import zipfile
+from collections import Counter
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from app.exportadores import pool
+from app.exportadores.dataset import DatasetFichajes
+
+MANIFIESTO = "SHA256SUMS"
+
+
+def _dbg(msg: str):
+    print(f"[PAQUETEPDF] {msg}")
+
+
+class _SalidaZip:
+    """Destino de zipfile sin seek/tell: acumula lo escrito hasta que se recoge."""
+
+    def __init__(self):
+        self._partes: List[bytes] = []
+
+    def write(self, b) -> int:
+        self._partes.append(bytes(b))
+        return len(b)
+
+    def flush(self) -> None:
+        pass
+
+    def recoger(self) -> bytes:
+        bloque = b"".join(self._partes)
+        self._partes = []
+        return bloque
+
+
+def nombre_pdf(email: str) -> str:
+    return "Fichajes_" + re.sub(r"[^\w.-]+", "_", email or "sin_usuario") + ".pdf"
+
+
+def nombres_zip(emails: Iterable[str], ids: Optional[Dict[str, int]] = None) -> Dict[str, str]:
+    """
+    email -> nombre de entrada en el ZIP, sin repetidos. Al sanear, emails
+    distintos pueden dar el mismo nombre (a@b.com y a_b.com): entonces todos
+    los que chocan llevan el id de usuario (o su posición, si no hay id).
+    """
+    emails = list(emails)
+    ids = ids or {}
+    base = {e: nombre_pdf(e) for e in emails}
+    repetidos = Counter(base.values())
+    nombres: Dict[str, str] = {}
+    usados = set()
+    for n, email in enumerate(emails, 1):
+        nombre = base[email]
+        if repetidos[nombre] > 1:
+            nombre = f"{nombre[:-4]}_{ids.get(email, n)}.pdf"
+        while nombre in usados:  # el sufijo también podría chocar con otro email
+            nombre = f"{nombre[:-4]}_{n}.pdf"
+        usados.add(nombre)
+        nombres[email] = nombre
+    return nombres
+
+
+def iterar_zip(ds: DatasetFichajes, paralelo: Optional[int] = None,
+               ids: Optional[Dict[str, int]] = None) -> Iterator[bytes]:
+    """ZIP por bloques; `ids` (email -> id de usuario) desambigua nombres repetidos."""
+    salida = _SalidaZip()
+    resumenes = []
+    t0 = time.perf_counter()
+    nombres = nombres_zip(ds.usuarios, ids)
+    with zipfile.ZipFile(salida, "w", compression=zipfile.ZIP_STORED) as zf:
+        trabajos = ((nombres[email], sub) for email, sub in ds.por_usuario())
+        for nombre, contenido in pool.renderizar_lote("pdf", trabajos, paralelo):
+            # PDF ya comprimido por ReportLab: se guarda sin recomprimir
+            info = zipfile.ZipInfo(nombre, date_time=time.localtime()[:6])
+            zf.writestr(info, contenido)
+            resumenes.append((nombre, hashlib.sha256(contenido).hexdigest()))
+            yield salida.recoger()
+
+        manifiesto = "".join(f"{h}  {n}\n" for n, h in sorted(resumenes))
+        zf.writestr(zipfile.ZipInfo(MANIFIESTO, date_time=time.localtime()[:6]), manifiesto)
+    yield salida.recoger()
+    _dbg(f"{len(resumenes)} PDF en {time.perf_counter() - t0:.1f} s")
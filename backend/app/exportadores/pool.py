@@ -0,0 +1,246 @@
+# backend/app/exportadores/pool.py
+"""
+Renderizado de exportaciones en un pool de procesos acotado.
+
+ReportLab y openpyxl son Python puro y CPU-intensivo: en un hilo retienen el
+GIL y congelan el bucle de eventos del worker. Aquí el renderizado va a
+procesos hijo (contexto 'spawn', sin heredar conexiones de BD):
+
+- Concurrencia: EXPORT_PROCESOS renderizados simultáneos como máximo.
+- Contrapresión: como mucho EXPORT_COLA_MAX peticiones esperando turno; por
+  encima, `PoolSaturado` (la ruta responde 503 + Retry-After).
+- Métricas por formato: nº de renderizados, errores, rechazos y tiempos
+  (medio, p95, máximo) sobre las últimas MUESTRAS ejecuciones.
+- Lotes (un PDF por empleado): pool aparte de EXPORT_LOTE_PROCESOS procesos
+  (por defecto, todos los núcleos); cada lote ocupa un hueco de admisión.
+- Calentamiento: cada hijo prepara al arrancar los recursos compartidos de
+  los exportadores (ExportadorBase.calentar), no en su primer renderizado.
+"""
+import asyncio
+import multiprocessing
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from io import BytesIO
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+
+from app.exportadores.exportador_factory import clase_exportador, formatos, obtener_exportador
+
+EXPORT_PROCESOS = int(os.getenv("EXPORT_PROCESOS", str(min(2, os.cpu_count() or 1))))
+EXPORT_COLA_MAX = int(os.getenv("EXPORT_COLA_MAX", "4"))
+RETRY_AFTER_SEG = int(os.getenv("EXPORT_RETRY_AFTER", "10"))
+EXPORT_LOTE_PROCESOS = int(os.getenv("EXPORT_LOTE_PROCESOS", str(os.cpu_count() or 1)))
+
+# Qué formatos vienen aquí lo decide su COSTE (exportador_factory.requiere_proceso)
+MUESTRAS = 200
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lotes: Optional[ProcessPoolExecutor] = None
+_lock = threading.Lock()
+_en_vuelo = 0
+_metricas: Dict[str, Dict] = {}
+
+
+class PoolSaturado(RuntimeError):
+    pass
+
+
+def _dbg(msg: str):
+    print(f"[EXPORTPOOL] {msg}")
+
+
+def _executor() -> ProcessPoolExecutor:
+    global _pool
+    with _lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=EXPORT_PROCESOS,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_calentar,
+            )
+        return _pool
+
+
+def _executor_lotes() -> ProcessPoolExecutor:
+    global _pool_lotes
+    with _lock:
+        if _pool_lotes is None:
+            _pool_lotes = ProcessPoolExecutor(
+                max_workers=EXPORT_LOTE_PROCESOS,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_calentar,
+            )
+        return _pool_lotes
+
+
+def cerrar() -> None:
+    global _pool, _pool_lotes
+    with _lock:
+        for p in (_pool, _pool_lotes):
+            if p is not None:
+                p.shutdown(wait=False, cancel_futures=True)
+        _pool = _pool_lotes = None
+
+
+# ---------------- Proceso hijo ----------------
+def _calentar() -> None:
+    t0 = time.perf_counter()
+    for formato in formatos():
+        try:
+            clase_exportador(formato).calentar()
+        except Exception as e:
+            _dbg(f"calentar {formato} falló: {e}")
+    _dbg(f"proceso {os.getpid()} listo en {time.perf_counter() - t0:.2f} s")
+
+
+def _renderizar(formato: str, datos, destino: Optional[str]) -> Tuple[Optional[bytes], float]:
+    t0 = time.perf_counter()
+    exportador = obtener_exportador(formato, datos)
+    if destino:
+        with open(destino, "wb") as f:
+            exportador.volcar(f)
+        contenido = None
+    else:
+        buf = BytesIO()
+        exportador.volcar(buf)
+        contenido = buf.getvalue()
+    return contenido, time.perf_counter() - t0
+
+
+# ---------------- Admisión + métricas ----------------
+def _admitir(formato: str, forzar: bool) -> None:
+    global _en_vuelo
+    with _lock:
+        if not forzar and _en_vuelo >= EXPORT_PROCESOS + EXPORT_COLA_MAX:
+            _m(formato)["rechazos"] += 1
+            raise PoolSaturado(f"{_en_vuelo} exportaciones en curso o en cola")
+        _en_vuelo += 1
+
+
+def _liberar() -> None:
+    global _en_vuelo
+    with _lock:
+        _en_vuelo -= 1
+
+
+def _m(formato: str) -> Dict:
+    # Llamar con _lock adquirido
+    return _metricas.setdefault(formato, {
+        "renderizados": 0, "errores": 0, "rechazos": 0,
+        "tiempos": deque(maxlen=MUESTRAS), "max_ms": 0.0,
+    })
+
+
+def _registrar(formato: str, segundos: Optional[float]) -> None:
+    with _lock:
+        m = _m(formato)
+        if segundos is None:
+            m["errores"] += 1
+            return
+        ms = segundos * 1000
+        m["renderizados"] += 1
+        m["tiempos"].append(ms)
+        m["max_ms"] = max(m["max_ms"], ms)
+
+
+def metricas() -> Dict:
+    with _lock:
+        por_formato = {}
+        for formato, m in _metricas.items():
+            tiempos = sorted(m["tiempos"])
+            n = len(tiempos)
+            por_formato[formato] = {
+                "renderizados": m["renderizados"],
+                "errores": m["errores"],
+                "rechazos": m["rechazos"],
+                "medio_ms": round(sum(tiempos) / n, 1) if n else None,
+                "p95_ms": round(tiempos[min(n - 1, int(n * 0.95))], 1) if n else None,
+                "max_ms": round(m["max_ms"], 1) if n else None,
+            }
+        return {
+            "procesos": EXPORT_PROCESOS,
+            "procesos_lote": EXPORT_LOTE_PROCESOS,
+            "cola_max": EXPORT_COLA_MAX,
+            "en_vuelo": _en_vuelo,
+            "formatos": por_formato,
+        }
+
+
+# ---------------- API ----------------
+def renderizar(formato: str, datos, destino: Optional[str] = None, forzar: bool = False) -> Optional[bytes]:
+    """
+    Bloqueante (para rutas síncronas o hilos). Devuelve los bytes, o None si
+    se indicó `destino` (ruta de fichero). `forzar` salta la contrapresión
+    (trabajos ya encolados en export_jobs), pero respeta el nº de procesos.
+    """
+    _admitir(formato, forzar)
+    try:
+        contenido, segundos = _executor().submit(_renderizar, formato, datos, destino).result()
+    except Exception:
+        _registrar(formato, None)
+        raise
+    finally:
+        _liberar()
+    _registrar(formato, segundos)
+    return contenido
+
+
+async def renderizar_async(formato: str, datos) -> bytes:
+    """Igual que `renderizar` pero sin bloquear el bucle de eventos."""
+    _admitir(formato, False)
+    try:
+        fut = _executor().submit(_renderizar, formato, datos, None)
+        contenido, segundos = await asyncio.wrap_future(fut)
+    except Exception:
+        _registrar(formato, None)
+        raise
+    finally:
+        _liberar()
+    _registrar(formato, segundos)
+    return contenido
+
+
+def renderizar_lote(formato: str, trabajos: Iterable[Tuple[str, object]],
+                    paralelo: Optional[int] = None) -> Iterator[Tuple[str, bytes]]:
+    """
+    Renderiza cada (nombre, datos) en el pool de lotes y devuelve (nombre, bytes)
+    según van terminando, no en el orden de entrada. Como mucho `paralelo`
+    renderizados en curso: el siguiente se envía al terminar uno, así que la
+    memoria no depende del tamaño del lote. Si el consumidor abandona, se cancela lo pendiente.
+
+    La admisión (o PoolSaturado) ocurre al pedir el primer elemento, con la
+    misma contrapresión que `renderizar`.
+    """
+    paralelo = max(1, min(paralelo or EXPORT_LOTE_PROCESOS, EXPORT_LOTE_PROCESOS))
+    _admitir(formato, False)
+    pendientes = {}
+    try:
+        ex = _executor_lotes()
+        it = iter(trabajos)
+        agotado = False
+        while pendientes or not agotado:
+            while not agotado and len(pendientes) < paralelo:
+                siguiente = next(it, None)
+                if siguiente is None:
+                    agotado = True
+                    break
+                nombre, datos = siguiente
+                pendientes[ex.submit(_renderizar, formato, datos, None)] = nombre
+            if not pendientes:
+                break
+            hechos, _ = wait(pendientes, return_when=FIRST_COMPLETED)
+            for fut in hechos:
+                nombre = pendientes.pop(fut)
+                try:
+                    contenido, segundos = fut.result()
+                except Exception:
+                    _registrar(formato, None)
+                    raise
+                _registrar(formato, segundos)
+                yield nombre, contenido
+    finally:
+        for fut in pendientes:
+            fut.cancel()
+        _liberar()
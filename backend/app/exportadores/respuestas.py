@@ -0,0 +1,110 @@
+# backend/app/exportadores/respuestas.py
+"""
+Piezas HTTP comunes a las rutas que exportan (routes/logs.py y
+/api/exportar-pdf en main.py): rango permitido, 503 por pool lleno, cabeceras
+de caché/ETag y respuesta de un render ya hecho, enviada por bloques.
+"""
+import os
+from datetime import date, timedelta
+from typing import Dict, Iterator, Optional, Tuple
+
+from fastapi import HTTPException, Request, Response
+from fastapi.responses import StreamingResponse
+
+from app import cache_http
+from app.exportadores import cache as export_cache
+from app.exportadores import paquete_pdf, pool
+from app.exportadores.dataset import DatasetFichajes
+from app.exportadores.exportador_factory import clase_exportador, obtener_exportador
+
+# Límite de trabajo por exportación en servidor (días de rango)
+EXPORT_MAX_DIAS = int(os.getenv("EXPORT_MAX_DIAS", "366"))
+# Rango por defecto: los 31 días (ambos inclusive) que acaban en `hasta`
+EXPORT_DIAS_POR_DEFECTO = 31
+# Tamaño de cada bloque al enviar un fichero ya renderizado
+TAM_BLOQUE = 64 * 1024
+
+
+# ---------------- Parámetros ----------------
+def rango_export(desde: Optional[date], hasta: Optional[date]) -> Tuple[date, date]:
+    hasta = hasta or date.today()
+    desde = desde or (hasta - timedelta(days=EXPORT_DIAS_POR_DEFECTO - 1))
+    if hasta < desde:
+        raise HTTPException(status_code=400, detail="El rango de fechas es inválido (hasta < desde).")
+    if (hasta - desde).days + 1 > EXPORT_MAX_DIAS:
+        raise HTTPException(status_code=400, detail=f"❌ El rango máximo de exportación es de {EXPORT_MAX_DIAS} días")
+    return desde, hasta
+
+
+def saturado() -> HTTPException:
+    return HTTPException(
+        status_code=503,
+        detail="⏳ Hay demasiadas exportaciones en curso; inténtalo en unos segundos",
+        headers={"Retry-After": str(pool.RETRY_AFTER_SEG)},
+    )
+
+
+# ---------------- Caché y ETag ----------------
+def clave_cache(formato: str, datos: DatasetFichajes) -> str:
+    return export_cache.clave(formato, export_cache.version_plantilla(clase_exportador(formato)), datos)
+
+
+def cabeceras_cache(clave: str, estado: str) -> Dict[str, str]:
+    return {
+        "ETag": f'"{clave}"',
+        "Cache-Control": "private, no-cache",  # reutilizable, pero siempre revalidando
+        "X-Export-Cache": estado,
+        "Vary": "Accept",
+    }
+
+
+# ---------------- Respuestas ----------------
+def _bloques(contenido: bytes) -> Iterator[bytes]:
+    vista = memoryview(contenido)
+    for i in range(0, len(vista), TAM_BLOQUE):
+        yield vista[i:i + TAM_BLOQUE].tobytes()
+
+
+def respuesta_renderizada(formato: str, contenido: bytes, headers: Optional[dict] = None) -> Response:
+    """Fichero ya renderizado, enviado por bloques de TAM_BLOQUE (con su tamaño total)."""
+    exportador = obtener_exportador(formato, [])
+    return StreamingResponse(
+        _bloques(contenido),
+        media_type=exportador.tipo_mime(),
+        headers={
+            "Content-Disposition": f"attachment; filename={exportador.nombre_archivo()}",
+            "Content-Length": str(len(contenido)),
+            **(headers or {}),
+        },
+    )
+
+
+def servir_cacheado(request: Request, formato: str, clave: str, render,
+                    headers: Optional[dict] = None, disco: bool = True) -> Response:
+    """304 si el cliente ya tiene esta versión; si no, bytes de caché o render + guardar."""
+    def construir() -> Response:
+        contenido = export_cache.obtener(clave, disco=disco)
+        estado = "HIT"
+        if contenido is None:
+            contenido = render()
+            export_cache.guardar(clave, contenido, disco=disco)
+            estado = "MISS"
+        return respuesta_renderizada(formato, contenido, {**(headers or {}), **cabeceras_cache(clave, estado)})
+
+    return cache_http.condicional(request, clave, cabeceras_cache(clave, "REVALIDADO"), construir)
+
+
+def exportar_pdf_empleado(request: Request, usuario_email: str, fichajes) -> Response:
+    """
+    PDF de un empleado (/api/exportar-pdf). `fichajes`: filas de
+    crud.iterar_logs(por_usuario=True, tipado=True). Mismo informe y misma
+    clave que /logs/exportar, pero solo con la caché en memoria: nada se
+    escribe en disco. Puede lanzar pool.PoolSaturado.
+    """
+    datos = DatasetFichajes.desde_fichajes(fichajes, ordenado=True)
+    return servir_cacheado(
+        request, "pdf", clave_cache("pdf", datos),
+        lambda: pool.renderizar("pdf", datos),
+        headers={"Content-Disposition": f"attachment; filename={paquete_pdf.nombre_pdf(usuario_email)}"},
+        disco=False,
+    )
@@ -0,0 +1,153 @@
+# backend/app/kpis.py
+"""
+Contadores KPI del panel de administración (tabla kpi_contadores).
+
+- Las mutaciones de solicitudes y fichajes llaman a `ajustar()` ANTES de su
+  commit, igual que `log_evento`: el contador viaja en la misma transacción.
+- Las ausencias se contabilizan con eventos de mapper (after_insert/update/
+  delete), que se ejecutan dentro del flush y por tanto también son
+  transaccionales, sea cual sea la función que modifique la ausencia.
+- Las aprobaciones y rechazos de solicitudes pueden cambiar quién está en
+  turno (un fichaje con fecha pasada no siempre es el último): se mide
+  `en_turno()` de los usuarios afectados antes y después y se ajusta la
+  diferencia.
+- `reconciliar()` recalcula los valores exactos y corrige cualquier deriva
+  (p. ej. fichajes aprobados con fecha pasada o cambios hechos fuera de la app).
+"""
+from typing import Dict, Iterable, Optional
+
+from sqlalchemy import event, func, inspect, select, update
+from sqlalchemy.orm import Session
+
+from app import models
+from app.database import SessionLocal
+
+SOLICITUDES_PENDIENTES = "solicitudes_pendientes"
+AUSENCIAS_PENDIENTES = "ausencias_pendientes"
+USUARIOS_EN_TURNO = "usuarios_en_turno"
+CLAVES = (SOLICITUDES_PENDIENTES, AUSENCIAS_PENDIENTES, USUARIOS_EN_TURNO)
+
+_K = models.KpiContador
+
+
+def _dbg(msg: str):
+    print(f"[KPIDEBUG] {msg}")
+
+
+def _sentencia_ajuste(clave: str, delta: int):
+    return (
+        update(_K)
+        .where(_K.clave == clave)
+        .values(valor=_K.valor + delta, actualizado_en=func.now())
+        .execution_options(synchronize_session=False)
+    )
+
+
+def ajustar(db: Session, clave: str, delta: int) -> None:
+    """Suma `delta` al contador dentro de la transacción en curso (no hace commit)."""
+    if delta:
+        db.execute(_sentencia_ajuste(clave, delta))
+
+
+def leer(db: Session) -> Dict[str, int]:
+    """Solo lectura: si faltan filas (BD recién creada) devuelve el recuento exacto sin guardarlo."""
+    valores = {c: v for c, v in db.execute(select(_K.clave, _K.valor)).all()}
+    if any(c not in valores for c in CLAVES):
+        return calcular(db)
+    return {c: int(valores[c]) for c in CLAVES}
+
+
+# ---------------- Recuento exacto ----------------
+def calcular(db: Session) -> Dict[str, int]:
+    solicitudes = (
+        db.query(func.count(models.SolicitudManual.id))
+        .filter(models.SolicitudManual.estado == "pendiente")
+        .scalar()
+    )
+    ausencias = (
+        db.query(func.count(models.Ausencia.id))
+        .filter(models.Ausencia.estado == "PENDIENTE")
+        .scalar()
+    )
+    return {
+        SOLICITUDES_PENDIENTES: int(solicitudes or 0),
+        AUSENCIAS_PENDIENTES: int(ausencias or 0),
+        USUARIOS_EN_TURNO: en_turno(db),
+    }
+
+
+def en_turno(db: Session, user_ids: Optional[Iterable[int]] = None) -> int:
+    """
+    Usuarios cuyo último fichaje no invalidado es una entrada (todos, o solo
+    `user_ids`). Ve los cambios no confirmados de la sesión (autoflush o flush previo).
+    """
+    F = models.Fichaje
+    ultimo = select(F.user_id, func.max(F.timestamp).label("ts")).where(F.validez != "invalidado")
+    if user_ids is not None:
+        user_ids = list(user_ids)
+        if not user_ids:
+            return 0
+        ultimo = ultimo.where(F.user_id.in_(user_ids))
+    ultimo = ultimo.group_by(F.user_id).subquery()
+    total = (
+        db.query(func.count(func.distinct(F.user_id)))
+        .join(ultimo, (F.user_id == ultimo.c.user_id) & (F.timestamp == ultimo.c.ts))
+        .filter(F.tipo == "entrada", F.validez != "invalidado")
+        .scalar()
+    )
+    return int(total or 0)
+
+
+def reconciliar(db: Session) -> Dict[str, int]:
+    """Fija los contadores a su valor exacto y registra la deriva encontrada."""
+    exactos = calcular(db)
+    actuales = {c: v for c, v in db.execute(select(_K.clave, _K.valor)).all()}
+    for clave, valor in exactos.items():
+        if clave in actuales and actuales[clave] != valor:
+            _dbg(f"deriva {clave}: {actuales[clave]} -> {valor}")
+        db.merge(_K(clave=clave, valor=valor))
+    db.commit()
+    return exactos
+
+
+def reconciliar_en_sesion_propia() -> Dict[str, int]:
+    db = SessionLocal()
+    try:
+        return reconciliar(db)
+    finally:
+        db.close()
+
+
+# ---------------- Ausencias (eventos de mapper) ----------------
+def _es_pendiente(estado) -> bool:
+    return (estado or "").upper() == "PENDIENTE"
+
+
+@event.listens_for(models.Ausencia, "after_insert")
+def _ausencia_creada(mapper, connection, target):
+    if _es_pendiente(target.estado):
+        connection.execute(_sentencia_ajuste(AUSENCIAS_PENDIENTES, 1))
+
+
+# active_history: carga el estado anterior al asignarlo aunque la instancia esté
+# expirada tras un commit; sin él, la historia de 'estado' llega vacía al flush.
+@event.listens_for(models.Ausencia.estado, "set", active_history=True)
+def _cargar_estado_anterior(target, value, oldvalue, initiator):
+    return value
+
+
+@event.listens_for(models.Ausencia, "after_update")
+def _ausencia_actualizada(mapper, connection, target):
+    hist = inspect(target).attrs.estado.history
+    if not hist.has_changes():
+        return
+    antes = any(_es_pendiente(e) for e in hist.deleted)
+    ahora = _es_pendiente(target.estado)
+    if antes != ahora:
+        connection.execute(_sentencia_ajuste(AUSENCIAS_PENDIENTES, 1 if ahora else -1))
+
+
+@event.listens_for(models.Ausencia, "after_delete")
+def _ausencia_borrada(mapper, connection, target):
+    if _es_pendiente(target.estado):
+        connection.execute(_sentencia_ajuste(AUSENCIAS_PENDIENTES, -1))
@@ -1,26 +1,31 @@
 import os
 import re
+import asyncio
 from typing import List, Optional
-from datetime import datetime
+from datetime import date, datetime
 
 import pytz
-from fastapi import FastAPI, Depends, HTTPException, status, Header, Form, Request
+from fastapi import FastAPI, Depends, HTTPException, status, Header, Form, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import OAuth2PasswordRequestForm
 from fastapi.staticfiles import StaticFiles
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import RedirectResponse
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
 
 from app.routes import auth as auth_routes
-from app import crud, auth, utils, models
+from app import crud, auth, utils, models, kpis, export_jobs
 from app.database import engine, get_db
 from app.models import Base, User
 from app.schemas import UserOut, UsuarioUpdate, UsuarioPassword
 from app.routes import logs as logs_router
 from app.routes import calendar
-from app.schemas_solicitudes import ResolverSolicitudIn
+from app.schemas_solicitudes import ResolverSolicitudIn, ResolverSolicitudesLoteIn
 from app.routes import ausencias as ausencias_router
+from app.routes import admin as admin_router
+from app.exportadores import pool as export_pool
+from app.exportadores import respuestas as export_respuestas
 from app.auth import get_current_user
 
 # ---------------- Bootstrapping DB ----------------
@@ -36,6 +41,36 @@ def health():
 
 app.add_api_route("/api/health", health, methods=["GET"])
 
+# ---------------- Reconciliación periódica de KPIs ----------------
+KPI_RECONCILE_SECONDS = int(os.getenv("KPI_RECONCILE_SECONDS", "300"))
+
+async def _bucle_reconciliacion_kpis():
+    while True:
+        try:
+            await run_in_threadpool(kpis.reconciliar_en_sesion_propia)
+        except Exception as e:
+            print("[KPI_RECONCILE_ERR]", repr(e))
+        await asyncio.sleep(KPI_RECONCILE_SECONDS)
+
+@app.on_event("startup")
+async def _arrancar_reconciliacion_kpis():
+    if KPI_RECONCILE_SECONDS > 0:
+        app.state.kpi_task = asyncio.create_task(_bucle_reconciliacion_kpis())
+
+# ---------------- Exportaciones en segundo plano ----------------
+@app.on_event("startup")
+async def _reanudar_exportaciones():
+    try:
+        n = await run_in_threadpool(export_jobs.reanudar_pendientes)
+        if n:
+            print(f"[EXPORTJOBS] reencoladas {n} exportaciones pendientes")
+    except Exception as e:
+        print("[EXPORTJOBS_ERR]", repr(e))
+
+@app.on_event("shutdown")
+def _cerrar_pool_exportacion():
+    export_pool.cerrar()
+
 # ---------------- CORS ----------------
 STATIC_ALLOWED = [
     "https://sistema-fichajes.pages.dev",
@@ -66,7 +101,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],              # GET, POST, PUT, PATCH, DELETE, OPTIONS...
     allow_headers=["*"],              # Authorization, Content-Type, X-Requested-With...
-    expose_headers=["Content-Disposition"],
+    expose_headers=["Content-Disposition", "ETag", "Retry-After"],
     max_age=600,
 )
 
@@ -122,7 +157,7 @@ def listar_usuarios_handler(
 ):
     if current_user.role != "admin":
         raise HTTPException(status_code=403, detail="No autorizado")
-    return db.query(User).all()
+    return crud.listar_usuarios_resumen(db)
 
 def actualizar_usuario_handler(
     usuario_id: int,
@@ -274,20 +309,53 @@ def resolver_solicitud_handler(
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
 
+def resolver_solicitudes_lote_handler(
+    req: Request,
+    body: ResolverSolicitudesLoteIn,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    if current_user.role not in ("admin", "manager"):
+        raise HTTPException(status_code=403, detail="No autorizado")
+
+    ip = req.client.host if req and req.client else None
+    resultados = crud.resolver_solicitudes_lote(
+        db, body.ids, body.aprobar, admin=current_user,
+        motivo_rechazo=body.motivo_rechazo, ip=ip,
+    )
+    resueltas = sum(1 for r in resultados if r["ok"])
+    return {
+        "ok": True,
+        "resueltas": resueltas,
+        "errores": len(resultados) - resueltas,
+        "resultados": resultados,
+    }
+
 # ---- Export ----
-def exportar_handler(usuario: str, db: Session = Depends(get_db)):
+def exportar_handler(
+    request: Request,
+    usuario: str,
+    desde: Optional[date] = Query(None, description="YYYY-MM-DD (por defecto, los 31 días que acaban en `hasta`)"),
+    hasta: Optional[date] = Query(None, description="YYYY-MM-DD (por defecto, hoy)"),
+    db: Session = Depends(get_db),
+):
+    desde, hasta = export_respuestas.rango_export(desde, hasta)
     usuario = usuario.strip()
     user = crud.obtener_usuario_por_email(db, usuario)
     if not user:
         raise HTTPException(status_code=404, detail=f"Usuario '{usuario}' no encontrado")
-    fichajes = crud.obtener_fichajes_usuario(db, user)
-    return utils.exportar_pdf(user.email, fichajes)
+    fichajes = crud.iterar_logs(db, [user.email], desde, hasta, por_usuario=True, tipado=True)
+    try:
+        return export_respuestas.exportar_pdf_empleado(request, user.email, fichajes)
+    except export_pool.PoolSaturado:
+        raise export_respuestas.saturado()
 
 # ==================== MONTAJE /api ====================
 app.include_router(auth_routes.router,     prefix="/api", tags=["auth"])
 app.include_router(calendar.router,        prefix="/api", tags=["calendar"])
 app.include_router(ausencias_router.router, prefix="/api")
 app.include_router(logs_router.router,     prefix="/api/logs")
+app.include_router(admin_router.router,    prefix="/api", tags=["admin"])
 
 # Endpoints canónicos
 app.add_api_route("/api/registrar",             registrar_handler,             methods=["POST"])
@@ -302,6 +370,7 @@ app.add_api_route("/api/resumen-semana",        resumen_semana_handler,        m
 app.add_api_route("/api/solicitar-fichaje-manual", solicitar_fichaje_manual_handler, methods=["POST"])
 app.add_api_route("/api/solicitudes",           listar_solicitudes_handler,    methods=["GET"])
 app.add_api_route("/api/resolver-solicitud",    resolver_solicitud_handler,    methods=["POST"])
+app.add_api_route("/api/resolver-solicitudes",  resolver_solicitudes_lote_handler, methods=["POST"])
 app.add_api_route("/api/exportar-pdf",          exportar_handler,              methods=["GET"])
 
 # Aliases legacy
@@ -155,6 +155,48 @@ class Ausencia(Base):
     )
 
 
+# =========================
+# Contadores KPI (panel admin)
+# =========================
+
+class KpiContador(Base):
+    __tablename__ = "kpi_contadores"
+
+    clave = Column(String, primary_key=True)   # 'solicitudes_pendientes' | 'ausencias_pendientes' | 'usuarios_en_turno'
+    valor = Column(Integer, nullable=False, default=0)
+    actualizado_en = Column(DateTime(timezone=True), nullable=False,
+                            server_default=func.now(), onupdate=func.now())
+
+
+# =========================
+# Exportaciones en segundo plano
+# =========================
+
+class ExportJob(Base):
+    __tablename__ = "export_jobs"
+
+    id = Column(String, primary_key=True)                # uuid4 hex
+    clave = Column(String, nullable=False, index=True)   # sha256(formato + filtros normalizados)
+    formato = Column(String, nullable=False)             # 'csv'|'json'|'pdf'|'xlsx'|'xml'
+    filtros = Column(Text, nullable=False)               # JSON: {usuarios, desde, hasta}
+
+    # 'PENDIENTE'|'EN_CURSO'|'LISTO'|'ERROR'
+    estado = Column(String, nullable=False, default="PENDIENTE", index=True)
+    progreso = Column(Integer, nullable=False, default=0)  # 0..100
+    filas_total = Column(Integer, nullable=True)
+    filas_procesadas = Column(Integer, nullable=False, default=0)
+
+    ruta_artefacto = Column(String, nullable=True)
+    tamano = Column(Integer, nullable=True)
+    error = Column(Text, nullable=True)
+
+    creado_por = Column(String, nullable=False)
+    created_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+    actualizado_en = Column(DateTime(timezone=True), nullable=True, onupdate=func.now())
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+    expira_en = Column(DateTime(timezone=True), nullable=True, index=True)
+
+
 # =========================
 # Calendario & Localización
 # =========================
@@ -218,3 +260,17 @@ class CalendarFeedStg(Base):
     locality_id = Column(Integer, ForeignKey("localities.id", ondelete="SET NULL"), index=True, nullable=True)
     fuente = Column(String, nullable=True)
     imported_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+
+
+# =========================
+# Suscripción .ics por usuario
+# =========================
+
+class CalendarFeedToken(Base):
+    __tablename__ = "calendar_feed_tokens"
+
+    # Versión que deben llevar los enlaces .ics del usuario ("ver" del token);
+    # subirla revoca todos los enlaces emitidos hasta ahora. Sin fila = 0.
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+    revocado_en = Column(DateTime(timezone=True), nullable=True)
@@ -0,0 +1,86 @@
+# backend/app/routes/admin.py
+import calendar as _calendar
+from datetime import date
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+
+from app.database import get_db
+from app.auth import get_current_user
+from app.models import Ausencia, User
+from app import calendario, kpis
+from app.exportadores import pool
+from app.exportadores import cache as export_cache
+
+router = APIRouter(prefix="/admin", tags=["admin"])
+
+
+@router.get("/kpis")
+def leer_kpis(
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """Contadores del panel (lectura directa de kpi_contadores, sin recorrer listas)."""
+    if current_user.role not in ("admin", "manager"):
+        raise HTTPException(status_code=403, detail="No autorizado")
+    return kpis.leer(db)
+
+
+@router.post("/kpis/reconciliar")
+def reconciliar_kpis(
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="No autorizado")
+    return kpis.reconciliar(db)
+
+
+@router.get("/exportaciones/metricas")
+def metricas_exportaciones(current_user: User = Depends(get_current_user)):
+    """Tiempos de renderizado por formato, ocupación del pool y aciertos de la caché."""
+    if current_user.role not in ("admin", "manager"):
+        raise HTTPException(status_code=403, detail="No autorizado")
+    return {**pool.metricas(), "cache": export_cache.estadisticas()}
+
+
+@router.get("/calendario/equipo")
+def calendario_equipo(
+    year: int,
+    month: int,
+    usuario: Optional[List[str]] = Query(None, description="Email(s); vacío = todos"),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """
+    Quién falta en el mes: matriz usuarios × días con festivos, fines de
+    semana y ausencias (tipo, parcial, estado). Una consulta de usuarios, una
+    de ausencias y los festivos del calendario compilado; filas en RLE
+    compartidas entre usuarios iguales (ver calendario.matriz_equipo).
+    """
+    if current_user.role not in ("admin", "manager"):
+        raise HTTPException(status_code=403, detail="No autorizado")
+    if month < 1 or month > 12:
+        raise HTTPException(status_code=422, detail="El parámetro 'month' debe estar entre 1 y 12.")
+    desde = date(year, month, 1)
+    hasta = date(year, month, _calendar.monthrange(year, month)[1])
+
+    q = db.query(User.id, User.email)
+    if usuario:
+        q = q.filter(User.email.in_(usuario))
+    usuarios = q.order_by(User.email).all()
+
+    ausencias = (
+        db.query(Ausencia.usuario_email, Ausencia.tipo, Ausencia.parcial, Ausencia.estado,
+                 Ausencia.fecha_inicio, Ausencia.fecha_fin)
+        .filter(
+            Ausencia.estado != "RECHAZADA",
+            Ausencia.fecha_inicio <= hasta,
+            Ausencia.fecha_fin >= desde,
+        )
+    )
+    if usuario:
+        ausencias = ausencias.filter(Ausencia.usuario_email.in_(usuario))
+
+    return calendario.matriz_equipo(calendario.obtener(db), usuarios, ausencias.all(), desde, hasta)
@@ -1,18 +1,39 @@
 from datetime import date as _date, timedelta
 from typing import List
+from uuid import UUID
+import csv
+import io
+import json
 import os
 
-from fastapi import APIRouter, HTTPException, Query, Depends
+from fastapi import APIRouter, HTTPException, Query, Depends, Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pydantic import TypeAdapter, ValidationError
 from sqlalchemy import text
 from sqlalchemy.orm import Session
+import jwt
 
+from app.auth_tokens import create_calendar_token, decode_calendar
 from app.database import get_db
-from app import crud, schemas, models
+from app.exportadores import cache as export_cache
+from app import cache_http, calendario, crud, schemas, models
 from app.auth import get_current_user  # <- TOKEN obligatorio
 from app.models import User
 from app import crud
 router = APIRouter(prefix="/calendar", tags=["calendar"])
 
+# Tope de filas por carga masiva de marcas de empresa y filas por sentencia
+CALENDARIO_LOTE_MAX = int(os.getenv("CALENDARIO_LOTE_MAX", "5000"))
+_FILAS_POR_SENTENCIA = 1000
+# Festivos del mes: solo cambian al importar o con marcas de empresa
+CALENDARIO_MAX_AGE_SEG = int(os.getenv("CALENDARIO_MAX_AGE_SEG", "3600"))
+# Ventana del feed .ics alrededor de hoy
+ICS_DIAS_ATRAS = int(os.getenv("ICS_DIAS_ATRAS", "365"))
+ICS_DIAS_ADELANTE = int(os.getenv("ICS_DIAS_ADELANTE", "365"))
+# Subir al cambiar el formato del .ics: invalida los feeds cacheados
+VERSION_ICS = "1"
+
 
 # -------------------------
 # Utils
@@ -26,6 +47,18 @@ def _ensure_postgres():
         )
 
 
+def _respuesta_cacheable(request: Request, clave: str, cache_control: str, construir) -> Response:
+    """304 si el cliente ya tiene esta versión; si no, construir() en JSON con ETag fuerte."""
+    cabeceras = {
+        "ETag": f'"{clave}"',
+        "Cache-Control": cache_control,
+        "Vary": "Authorization",  # la respuesta es del usuario del token
+    }
+    return cache_http.condicional(
+        request, clave, cabeceras, lambda: JSONResponse(jsonable_encoder(construir()))
+    )
+
+
 def _last_day_of_month(year: int, month: int) -> _date:
     first = _date(year, month, 1)
     return (first.replace(day=28) + timedelta(days=4)).replace(day=1) - timedelta(days=1)
@@ -55,8 +88,6 @@ def working_days(
     end: _date = Query(..., description="YYYY-MM-DD"),
     db: Session = Depends(get_db),
 ):
-    
-
     """
     Cuenta días laborables entre start y end (inclusive):
     - Lunes a viernes
@@ -66,41 +97,15 @@ def working_days(
     if end < start:
         raise HTTPException(status_code=400, detail="El rango de fechas es inválido (end < start).")
 
-    # Festivos aplicables al usuario (misma lógica que el feed)
-    festivos = crud.obtener_festivos_por_usuario_en_rango(db, user_id, start, end)
-
-    # Conjunto de fechas (YYYY-MM-DD) con festivo para ese usuario
-    festivo_days = set()
-    for f in festivos or []:
-        d = f.get("date") or f.get("fecha")
-        # normaliza a string YYYY-MM-DD
-        if hasattr(d, "isoformat"):
-            festivo_days.add(d.isoformat()[:10])
-        else:
-            festivo_days.add(str(d)[:10])
-
-    holidays_total = len(festivo_days)
-
-    # Recorre el rango y cuenta laborables
-    working = 0
-    weekends = 0
-    cur = start
-    while cur <= end:
-        dow = cur.weekday()  # 0=Lunes ... 6=Domingo
-        if dow >= 5:
-            weekends += 1
-        else:
-            if cur.isoformat()[:10] not in festivo_days:
-                working += 1
-        cur += timedelta(days=1)
-
+    # Aritmética de semanas + festivos bisecados (ver app.calendario)
+    cuenta = calendario.obtener(db).dias_laborables(user_id, start, end)
     return {
         "user_id": user_id,
         "from": start.isoformat(),
         "to": end.isoformat(),
-        "working_days": working,   # ← lo que necesita tu UI
-        "weekends": weekends,
-        "holidays": holidays_total # total de fechas festivas en el rango (caigan o no en finde)
+        "working_days": cuenta["laborables"],   # ← lo que necesita tu UI
+        "weekends": cuenta["fines_de_semana"],
+        "holidays": cuenta["festivos"]          # total de fechas festivas en el rango (caigan o no en finde)
     }
 
 @router.get("/working-days")
@@ -117,41 +122,146 @@ def working_days_me(
     if end < start:
         raise HTTPException(status_code=400, detail="El rango de fechas es inválido (end < start).")
 
-    # Festivos del usuario en el rango (misma lógica que el feed)
-    festivos = crud.obtener_festivos_por_usuario_en_rango(db, current_user.id, start, end)
-
-    # Normaliza a objetos date
-    festivo_days: set[_date] = set()
-    for f in festivos or []:
-        d = f.get("date") or f.get("fecha")
-        if isinstance(d, _date):
-            festivo_days.add(d)
-        else:
-            try:
-                festivo_days.add(_date.fromisoformat(str(d)[:10]))
-            except Exception:
-                pass
-
-    laborables = 0
-    fines = 0
-    d = start
-    while d <= end:
-        if d.weekday() >= 5:
-            fines += 1
-        elif d not in festivo_days:
-            laborables += 1
-        d += timedelta(days=1)
+    cal = calendario.obtener(db)
+    cuenta = cal.dias_laborables(current_user.id, start, end)
+    festivos = cal.festivos(current_user.id, start, end)
 
     return {
         "user_id": current_user.id,
         "from": start.isoformat(),
         "to": end.isoformat(),
-        "working_days": laborables,                 # ← lo que lee el front
-        "festivos": sorted(x.isoformat() for x in festivo_days if x.weekday() < 5),
-        "fines_de_semana": fines,
+        "working_days": cuenta["laborables"],       # ← lo que lee el front
+        "festivos": [f["date"] for f in festivos if _date.fromisoformat(f["date"]).weekday() < 5],
+        "fines_de_semana": cuenta["fines_de_semana"],
     }
 
 
+@router.post("/working-days/batch")
+def working_days_batch(
+    body: schemas.DiasLaborablesLoteIn,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user),
+):
+    """
+    Días laborables de muchos (usuario, rango) en una sola llamada (nóminas,
+    planificación de ausencias). Un empleado solo puede consultar los suyos.
+    """
+    ids = {it.user_id for it in body.items}
+    if current_user.role not in ("admin", "manager") and ids != {current_user.id}:
+        raise HTTPException(status_code=403, detail="No autorizado a consultar otros usuarios.")
+    for n, it in enumerate(body.items):
+        if it.end < it.start:
+            raise HTTPException(status_code=400, detail=f"Rango de fechas inválido en items[{n}] (end < start).")
+
+    existentes = {uid for (uid,) in db.query(User.id).filter(User.id.in_(ids))}
+    faltan = sorted(ids - existentes)
+    if faltan:
+        raise HTTPException(status_code=404, detail=f"Usuarios no encontrados: {faltan}")
+
+    cal = calendario.obtener(db)
+    resultados = []
+    for it in body.items:
+        cuenta = cal.dias_laborables(it.user_id, it.start, it.end)
+        resultados.append({
+            "user_id": it.user_id,
+            "from": it.start.isoformat(),
+            "to": it.end.isoformat(),
+            "working_days": cuenta["laborables"],
+            "weekends": cuenta["fines_de_semana"],
+            "holidays": cuenta["festivos"],
+        })
+    return {"items": resultados}
+
+
+# -------------------------
+# Suscripción iCalendar (.ics) por usuario
+# (antes de /{year}/{month}, que también casaría con /feed/{token})
+# -------------------------
+@router.get("/feed-url")
+def my_calendar_feed_url(
+    request: Request,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user),
+):
+    """Enlace de suscripción para apps de calendario (no caduca; se revoca con /feed-url/revocar)."""
+    token = create_calendar_token(current_user.id, crud.version_feed_calendario(db, current_user.id))
+    return {"url": str(request.url_for("calendar_feed_ics", token=token))}
+
+
+@router.post("/feed-url/revocar")
+def revoke_my_calendar_feed_url(
+    request: Request,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user),
+):
+    """Invalida los enlaces .ics emitidos hasta ahora y devuelve uno nuevo."""
+    version = crud.revocar_feed_calendario(db, current_user.id)
+    token = create_calendar_token(current_user.id, version)
+    return {"url": str(request.url_for("calendar_feed_ics", token=token))}
+
+
+@router.post("/users/{user_id}/feed/revocar")
+def revoke_user_calendar_feed(
+    user_id: int,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user),
+):
+    """Invalida los enlaces .ics de otro usuario (p. ej. baja o enlace filtrado)."""
+    if current_user.role not in ("admin", "manager"):
+        raise HTTPException(status_code=403, detail="No autorizado")
+    if not crud.obtener_usuario_por_id(db, user_id):
+        raise HTTPException(status_code=404, detail="Usuario no encontrado")
+    crud.revocar_feed_calendario(db, user_id)
+    return {"ok": True}
+
+
+@router.get("/feed/{token}.ics", name="calendar_feed_ics")
+def calendar_feed_ics(
+    token: str,
+    request: Request,
+    db: Session = Depends(get_db),
+):
+    """
+    Festivos + ausencias aprobadas del usuario del token. Se renderiza una vez
+    por versión de datos (caché de exportaciones) y admite If-None-Match: las
+    apps que sincronizan cada pocos minutos reciben 304 hasta que algo cambie.
+    """
+    try:
+        payload = decode_calendar(token)
+        user_id = int(payload["sub"])
+        ver = int(payload.get("ver", 0))
+    except (jwt.PyJWTError, KeyError, ValueError):
+        raise HTTPException(status_code=404, detail="Calendario no encontrado")
+    usuario = crud.obtener_usuario_por_id(db, user_id)
+    # Enlace revocado: misma respuesta que uno que nunca existió
+    if not usuario or ver != crud.version_feed_calendario(db, user_id):
+        raise HTTPException(status_code=404, detail="Calendario no encontrado")
+
+    hoy = _date.today()
+    start, end = hoy - timedelta(days=ICS_DIAS_ATRAS), hoy + timedelta(days=ICS_DIAS_ADELANTE)
+    cal = calendario.obtener(db)
+    version = calendario.version_ausencias(db, usuario.email, start, end)
+    clave = calendario.etag(cal, user_id, "ics", VERSION_ICS, start, end, version)
+    cabeceras = {"ETag": f'"{clave}"', "Cache-Control": "private, no-cache"}
+
+    def construir() -> Response:
+        clave_bytes = export_cache.clave("ics", VERSION_ICS, [clave])
+        contenido = export_cache.obtener(clave_bytes)
+        if contenido is None:
+            eventos = [
+                e for e in crud.obtener_eventos_calendario(db, user_id=user_id, start=start, end=end)
+                if e["estado"] in (None, "APROBADA")
+            ]
+            nombre = f"{os.getenv('COMPANY_NAME', 'Campel')} · {usuario.email}"
+            contenido = calendario.renderizar_ics(eventos, user_id, nombre)
+            export_cache.guardar(clave_bytes, contenido)
+        return Response(
+            contenido,
+            media_type="text/calendar; charset=utf-8",
+            headers={"Content-Disposition": "inline; filename=calendario.ics"},
+        )
+
+    return cache_http.condicional(request, clave, cabeceras, construir)
 
 
 # -------------------------
@@ -161,6 +271,7 @@ def working_days_me(
 def month_marks_for_logged_user(
     year: int,
     month: int,
+    request: Request,
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_user),  # <- obliga a ir con token
 ):
@@ -169,13 +280,19 @@ def month_marks_for_logged_user(
     - nacionales
     - + su región/provincia/local (según user_locations / users.locality_code)
     - deduplicados
+    ETag de la versión del calendario: revalidar no consulta la base de datos.
     """
     if month < 1 or month > 12:
         raise HTTPException(status_code=422, detail="El parámetro 'month' debe estar entre 1 y 12.")
     start = _date(year, month, 1)
     end = _last_day_of_month(year, month)
-    items = crud.obtener_festivos_por_usuario_en_rango(db, current_user.id, start, end)
-    return {"items": items}
+    cal = calendario.obtener(db)
+    return _respuesta_cacheable(
+        request,
+        calendario.etag(cal, current_user.id, "mes", start),
+        f"private, max-age={CALENDARIO_MAX_AGE_SEG}",
+        lambda: {"items": cal.festivos(current_user.id, start, end)},
+    )
 
 
 # -------------------------
@@ -186,7 +303,7 @@ def create_company_mark(
     date: str = Query(..., pattern=r"^\d{4}-\d{2}-\d{2}$"),
     mark: str = Query(..., pattern="^(holiday|workday)$"),
     name: str = Query(..., min_length=1),
-    company_id: str | None = None,
+    company_id: UUID | None = None,
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_user),  # recomendable exigir login
 ):
@@ -206,11 +323,124 @@ def create_company_mark(
         RETURNING scope, mark, date, name, company_id;
         """
     )
-    row = db.execute(q, {"mark": mark, "date": date, "name": name, "cid": company_id}).mappings().first()
+    row = db.execute(q, {"mark": mark, "date": date, "name": name, "cid": str(company_id) if company_id else None}).mappings().first()
     db.commit()
+    calendario.invalidar()
     return dict(row) if row else {}
 
 
+# -------------------------
+# Carga masiva de marcas de empresa (JSON o CSV)
+# -------------------------
+_MARCAS_EMPRESA = TypeAdapter(List[schemas.MarcaEmpresaIn])
+
+# Las filas que ya existen con el mismo nombre no se tocan (ni imported_at):
+# RETURNING solo devuelve insertadas (xmax = 0) y actualizadas.
+_SQL_MARCAS_EMPRESA = """
+    INSERT INTO calendar_marks (scope, mark, date, name, company_id, source)
+    VALUES {valores}
+    ON CONFLICT (
+        scope, mark, date,
+        COALESCE(region_code,'-'),
+        COALESCE(province_code,'-'),
+        COALESCE(locality_code,'-'),
+        COALESCE(company_id,'00000000-0000-0000-0000-000000000000')
+    )
+    DO UPDATE SET name = EXCLUDED.name, imported_at = NOW(), source = EXCLUDED.source
+    WHERE calendar_marks.name IS DISTINCT FROM EXCLUDED.name
+    RETURNING (xmax = 0) AS insertada
+"""
+
+
+def _leer_marcas_empresa(cuerpo: bytes, content_type: str) -> List[schemas.MarcaEmpresaIn]:
+    """
+    JSON: lista de {date, mark, name, company_id?} o {"items": [...]}.
+    CSV (text/csv): cabecera date,mark,name[,company_id]; separador ',' o ';'.
+    """
+    try:
+        texto = cuerpo.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=400, detail="El cuerpo debe estar en UTF-8.")
+
+    if "csv" in content_type:
+        primera = texto.split("\n", 1)[0]
+        lector = csv.DictReader(io.StringIO(texto), delimiter=";" if ";" in primera else ",")
+        faltan = {"date", "mark", "name"} - set(lector.fieldnames or [])
+        if faltan:
+            raise HTTPException(status_code=400, detail=f"Faltan columnas en el CSV: {', '.join(sorted(faltan))}")
+        filas = [
+            {k: (v.strip() or None) if isinstance(v, str) else v for k, v in fila.items() if k}
+            for fila in lector
+        ]
+    else:
+        try:
+            filas = json.loads(texto)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="JSON no válido.")
+        if isinstance(filas, dict):
+            filas = filas.get("items")
+
+    if not isinstance(filas, list) or not filas:
+        raise HTTPException(status_code=400, detail="No hay marcas que cargar.")
+    if len(filas) > CALENDARIO_LOTE_MAX:
+        raise HTTPException(status_code=413, detail=f"Máximo {CALENDARIO_LOTE_MAX} marcas por carga.")
+    try:
+        return _MARCAS_EMPRESA.validate_python(filas)
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=jsonable_encoder(e.errors(include_url=False)))
+
+
+@router.post("/company/bulk")
+async def bulk_company_marks(
+    request: Request,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user),
+):
+    """
+    Carga de un año de cierres, puentes o sábados laborables en una sola
+    llamada. Las marcas repetidas en la carga se quedan con la última; el
+    merge es un INSERT ... ON CONFLICT por bloque de filas, todo en una
+    transacción, y la caché del calendario se invalida una vez al final.
+    """
+    if current_user.role not in ("admin", "manager"):
+        raise HTTPException(status_code=403, detail="No autorizado")
+    _ensure_postgres()
+    marcas = _leer_marcas_empresa(await request.body(), request.headers.get("content-type", ""))
+
+    # Misma clave que el ON CONFLICT: una fila no puede actualizarse dos veces en la misma sentencia
+    unicas = {(m.mark, m.date, m.company_id): m for m in marcas}
+    filas = list(unicas.values())
+
+    insertadas = actualizadas = 0
+    try:
+        for i in range(0, len(filas), _FILAS_POR_SENTENCIA):
+            bloque = filas[i:i + _FILAS_POR_SENTENCIA]
+            valores = ", ".join(
+                f"('company', CAST(:m{j} AS cal_mark), :d{j}, :n{j}, :c{j}, 'API')" for j in range(len(bloque))
+            )
+            params = {}
+            for j, m in enumerate(bloque):
+                params.update({f"m{j}": m.mark, f"d{j}": m.date, f"n{j}": m.name, f"c{j}": str(m.company_id) if m.company_id else None})
+            for (insertada,) in db.execute(text(_SQL_MARCAS_EMPRESA.format(valores=valores)), params):
+                if insertada:
+                    insertadas += 1
+                else:
+                    actualizadas += 1
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    calendario.invalidar()
+
+    return {
+        "recibidas": len(marcas),
+        "duplicadas": len(marcas) - len(filas),
+        "insertadas": insertadas,
+        "actualizadas": actualizadas,
+        "sin_cambios": len(filas) - insertadas - actualizadas,
+    }
+
+
 # -------------------------
 # Feed unificado (festivos + ausencias) del usuario logeado
 # -------------------------
@@ -220,6 +450,7 @@ def create_company_mark(
     summary="Eventos del usuario autenticado (festivos filtrados + ausencias)",
 )
 def my_calendar_events(
+    request: Request,
     start: _date = Query(..., description="YYYY-MM-DD"),
     end: _date = Query(..., description="YYYY-MM-DD"),
     db: Session = Depends(get_db),
@@ -227,7 +458,18 @@ def my_calendar_events(
 ):
     if end < start:
         raise HTTPException(status_code=400, detail="El rango de fechas es inválido (end < start).")
-    return crud.obtener_eventos_calendario(db, user_id=current_user.id, start=start, end=end)
+    # Las ausencias cambian por acciones del propio usuario: siempre revalidar
+    cal = calendario.obtener(db)
+    version = calendario.version_ausencias(db, current_user.email, start, end)
+    return _respuesta_cacheable(
+        request,
+        calendario.etag(cal, current_user.id, "eventos", start, end, version),
+        "private, no-cache",
+        lambda: [
+            schemas.CalendarEvent(**e)
+            for e in crud.obtener_eventos_calendario(db, user_id=current_user.id, start=start, end=end)
+        ],
+    )
 
 @router.get("/working-days-python")
 def working_days_me_python(
@@ -1,25 +1,242 @@
 # backend/app/routes/logs.py
+import os
+import json
+import itertools
+from datetime import date
 from fastapi import APIRouter, Depends, Query, HTTPException, Request, Response
-from typing import Literal, Any
+from fastapi.responses import StreamingResponse, FileResponse
+from fastapi.concurrency import run_in_threadpool
+from typing import Literal, Any, List, Optional
 from sqlalchemy.orm import Session
-from app.database import get_db
-from app import crud
-from app.exportadores.export_csv import ExportadorCSV
-from app.exportadores.export_json import ExportadorJSON
-from app.exportadores.export_xlsx import ExportadorXLSX
-from app.exportadores.export_pdf import ExportadorPDF
+from app.database import get_db, SessionLocal
+from app import cache_http, crud, export_jobs
+from app.auth import get_current_user
+from app.models import User, ExportJob
+from app.schemas import ExportacionIn
+from app.exportadores import pool
+from app.exportadores import cache as export_cache
+from app.exportadores import paquete_pdf, respuestas
+from app.exportadores.dataset import DatasetFichajes, como_dataset, datos_export, iterar_por_usuario
+from app.exportadores.exportador_factory import (
+    formatos, negociar, obtener_exportador, requiere_proceso
+)
 import traceback
 
 router = APIRouter()
 
+# Filas por página de GET /logs cuando no se pide `limite`
+LOGS_LIMITE_POR_DEFECTO = int(os.getenv("LOGS_LIMITE_POR_DEFECTO", "500"))
+
+def _lineas_ndjson(usuarios, desde, hasta, lote: int = 500):
+    """NDJSON en bloques de `lote` filas; sesión propia porque vive más que la petición."""
+    db = SessionLocal()
+    try:
+        buf = []
+        for fila in crud.iterar_logs(db, usuarios, desde, hasta, lote=lote):
+            buf.append(json.dumps(fila, ensure_ascii=False))
+            if len(buf) >= lote:
+                yield ("\n".join(buf) + "\n").encode("utf-8")
+                buf = []
+        if buf:
+            yield ("\n".join(buf) + "\n").encode("utf-8")
+    finally:
+        db.close()
+
+
 @router.get("")   # ← /logs   (sin barra final)
-def obtener_logs(db: Session = Depends(get_db)):
-    return crud.obtener_logs(db)
+def obtener_logs(
+    request: Request,
+    usuario: Optional[List[str]] = Query(None, description="Email(s) a incluir"),
+    desde: Optional[date] = Query(None, description="YYYY-MM-DD (inclusive)"),
+    hasta: Optional[date] = Query(None, description="YYYY-MM-DD (inclusive)"),
+    cursor: Optional[str] = Query(None),
+    limite: Optional[int] = Query(None, ge=1, le=5000),
+    formato: Literal["json", "ndjson"] = Query("json"),
+    db: Session = Depends(get_db),
+):
+    """
+    - Por páginas (keyset): {items, next_cursor}; pasar next_cursor para la
+      siguiente. Sin `limite`, LOGS_LIMITE_POR_DEFECTO filas: nunca la tabla entera.
+    - formato=ndjson (o Accept: application/x-ndjson): streaming línea a línea.
+    """
+    if desde and hasta and hasta < desde:
+        raise HTTPException(status_code=400, detail="El rango de fechas es inválido (hasta < desde).")
+
+    if formato == "ndjson" or "application/x-ndjson" in request.headers.get("accept", ""):
+        return StreamingResponse(_lineas_ndjson(usuario, desde, hasta), media_type="application/x-ndjson")
+
+    try:
+        return crud.obtener_logs_pagina(
+            db, usuario, desde, hasta, cursor=cursor, limite=limite or LOGS_LIMITE_POR_DEFECTO
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def _formato_pedido(request: Request, formato: Optional[str]) -> str:
+    """?formato= o, si falta, negociación por Accept (ver exportador_factory.negociar)."""
+    try:
+        return negociar(formato, request.headers.get("accept"))
+    except ValueError as e:
+        if formato:
+            raise HTTPException(status_code=400, detail=f"❌ Formato '{formato}' no soportado")
+        raise HTTPException(status_code=406, detail=f"{e}. Formatos: {', '.join(formatos())}")
+
+
+def _exportador(formato: str, datos, compacto: bool = False):
+    opciones = {"compacto": compacto} if formato == "json" else {}
+    return obtener_exportador(formato, datos, **opciones)
+
+
+def construir_datos_export(db: Session, usuarios, desde: date, hasta: date) -> DatasetFichajes:
+    filas = crud.iterar_logs(db, usuarios, desde, hasta, por_usuario=True, tipado=True)
+    return datos_export(filas)
+
+
+def iterar_datos_export(usuarios, desde: date, hasta: date):
+    """Datasets por usuario, perezosos y con sesión propia (para StreamingResponse)."""
+    db = SessionLocal()
+    try:
+        filas = crud.iterar_logs(db, usuarios, desde, hasta, por_usuario=True, tipado=True)
+        yield from iterar_por_usuario(filas)
+    finally:
+        db.close()
+
+
+@router.get("/exportar", response_class=Response)
+def exportar_logs_servidor(
+    request: Request,
+    formato: Optional[str] = Query(None, description="csv, json, pdf, xlsx, xml; vacío = según Accept (por defecto csv)"),
+    usuario: Optional[List[str]] = Query(None, description="Email(s); vacío = todos"),
+    desde: Optional[date] = Query(None, description="YYYY-MM-DD (por defecto, los 31 días que acaban en `hasta`)"),
+    hasta: Optional[date] = Query(None, description="YYYY-MM-DD (por defecto, hoy)"),
+    compacto: bool = Query(False, description="JSON sin indentar"),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """Exporta a partir de filtros: el dataset se construye aquí, sin ida y vuelta por el navegador."""
+    if current_user.role not in ("admin", "manager"):
+        raise HTTPException(status_code=403, detail="No autorizado")
+    formato = _formato_pedido(request, formato)
+    desde, hasta = respuestas.rango_export(desde, hasta)
+
+    try:
+        if requiere_proceso(formato):
+            # PDF/XLSX: dataset completo (se hashea para la caché y va al pool)
+            datos = construir_datos_export(db, usuario, desde, hasta)
+            return respuestas.servir_cacheado(
+                request, formato, respuestas.clave_cache(formato, datos),
+                lambda: pool.renderizar(formato, datos),
+            )
+        # CSV/JSON/XML: un usuario cada vez desde el cursor, según se envía
+        datos = iterar_datos_export(usuario, desde, hasta)
+        respuesta = _exportador(formato, datos, compacto).exportar()
+        respuesta.headers.add_vary_header("Accept")
+        return respuesta
+    except pool.PoolSaturado:
+        raise respuestas.saturado()
+    except Exception:
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail="❌ Error interno al exportar los logs")
+
+
+@router.get("/exportar/pdf_por_empleado")
+def exportar_pdf_por_empleado(
+    usuario: Optional[List[str]] = Query(None, description="Email(s); vacío = todos"),
+    desde: Optional[date] = Query(None, description="YYYY-MM-DD (por defecto, los 31 días que acaban en `hasta`)"),
+    hasta: Optional[date] = Query(None, description="YYYY-MM-DD (por defecto, hoy)"),
+    paralelo: Optional[int] = Query(None, ge=1, description="PDF simultáneos (máx. EXPORT_LOTE_PROCESOS)"),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """ZIP con un PDF por empleado, enviado según se van renderizando (incluye SHA256SUMS)."""
+    if current_user.role not in ("admin", "manager"):
+        raise HTTPException(status_code=403, detail="No autorizado")
+    desde, hasta = respuestas.rango_export(desde, hasta)
+
+    datos = construir_datos_export(db, usuario, desde, hasta)
+    if not datos.n_dias:
+        raise HTTPException(status_code=404, detail="No hay fichajes en el rango indicado")
+    # El primer trozo se pide aquí, antes de enviar cabeceras: la admisión en el
+    # pool es atómica y, si está lleno, PoolSaturado aún puede ser un 503.
+    ids = dict(db.query(User.email, User.id).filter(User.email.in_(datos.usuarios)).all())
+    trozos = paquete_pdf.iterar_zip(datos, paralelo, ids)
+    try:
+        primero = next(trozos)
+    except pool.PoolSaturado:
+        raise respuestas.saturado()
+    return StreamingResponse(
+        itertools.chain([primero], trozos),
+        media_type="application/zip",
+        headers={"Content-Disposition": f"attachment; filename=Fichajes_{desde}_{hasta}.zip"},
+    )
+
+
+# ====== Exportaciones en segundo plano ======
+def _job_o_404(db: Session, job_id: str) -> ExportJob:
+    job = db.get(ExportJob, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Exportación no encontrada")
+    return job
+
+
+@router.post("/exportaciones", status_code=202)
+def crear_exportacion(
+    payload: ExportacionIn,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """Encola la exportación (o reutiliza una idéntica vigente). Consultar el estado con GET /exportaciones/{id}."""
+    if current_user.role not in ("admin", "manager"):
+        raise HTTPException(status_code=403, detail="No autorizado")
+    desde, hasta = respuestas.rango_export(payload.desde, payload.hasta)
+    try:
+        job, reutilizado = export_jobs.crear_o_reutilizar(
+            db, payload.formato, payload.usuarios, desde, hasta, current_user.email
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {**export_jobs.serializar(job), "reutilizado": reutilizado}
+
+
+@router.get("/exportaciones/{job_id}")
+def estado_exportacion(
+    job_id: str,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    if current_user.role not in ("admin", "manager"):
+        raise HTTPException(status_code=403, detail="No autorizado")
+    return export_jobs.serializar(_job_o_404(db, job_id))
+
+
+@router.get("/exportaciones/{job_id}/descarga")
+def descargar_exportacion(
+    job_id: str,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    if current_user.role not in ("admin", "manager"):
+        raise HTTPException(status_code=403, detail="No autorizado")
+    job = _job_o_404(db, job_id)
+    if job.estado == export_jobs.ERROR:
+        raise HTTPException(status_code=500, detail=f"❌ La exportación falló: {job.error}")
+    if job.estado != export_jobs.LISTO:
+        raise HTTPException(status_code=409, detail=f"La exportación aún no está lista ({job.progreso}%)")
+    if not job.ruta_artefacto or not os.path.exists(job.ruta_artefacto):
+        raise HTTPException(status_code=410, detail="La exportación ha caducado; vuelve a solicitarla")
+    return FileResponse(
+        job.ruta_artefacto,
+        media_type=export_jobs.tipo_mime(job),
+        filename=export_jobs.nombre_descarga(job),
+    )
+
 
 @router.post("/exportar_logs", response_class=Response)
 async def exportar_logs(
     request: Request,
-    formato: Literal["csv", "json", "pdf", "xlsx"] = Query("csv"),
+    formato: Optional[str] = Query(None, description="Vacío = según Accept (por defecto csv)"),
+    compacto: bool = Query(False, description="JSON sin indentar"),
     db: Session = Depends(get_db),
 ):
     try:
@@ -27,18 +244,27 @@ async def exportar_logs(
     except Exception:
         raise HTTPException(status_code=400, detail="❌ Error al leer el cuerpo de la solicitud")
 
-    exportadores = {
-        "csv": ExportadorCSV,
-        "json": ExportadorJSON,
-        "pdf": ExportadorPDF,
-        "xlsx": ExportadorXLSX,
-    }
-    if formato not in exportadores:
-        raise HTTPException(status_code=400, detail=f"❌ Formato '{formato}' no soportado")
+    formato = _formato_pedido(request, formato)
 
     try:
-        exportador = exportadores[formato](datos)
-        return exportador.exportar()
+        # Se parsea una sola vez; el dataset es lo que se hashea y se envía al pool
+        datos = await run_in_threadpool(como_dataset, datos)
+        # Nunca renderizar en el bucle de eventos: formatos COSTE_CPU a proceso, el resto a hilo
+        if requiere_proceso(formato):
+            clave = await run_in_threadpool(respuestas.clave_cache, formato, datos)
+            no_modificado = cache_http.no_modificado(request, clave, respuestas.cabeceras_cache(clave, "REVALIDADO"))
+            if no_modificado is not None:
+                return no_modificado
+            contenido = await run_in_threadpool(export_cache.obtener, clave)
+            estado = "HIT"
+            if contenido is None:
+                contenido = await pool.renderizar_async(formato, datos)
+                await run_in_threadpool(export_cache.guardar, clave, contenido)
+                estado = "MISS"
+            return respuestas.respuesta_renderizada(formato, contenido, respuestas.cabeceras_cache(clave, estado))
+        return await run_in_threadpool(_exportador(formato, datos, compacto).exportar)
+    except pool.PoolSaturado:
+        raise respuestas.saturado()
     except Exception:
         traceback.print_exc()
         raise HTTPException(status_code=500, detail="❌ Error interno al exportar los logs")
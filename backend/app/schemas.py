@@ -1,6 +1,7 @@
-from typing import Optional, Literal
+from typing import List, Optional, Literal
+from uuid import UUID
 from datetime import date
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, Field, field_validator
 
 
 # =========================
@@ -41,3 +42,35 @@ class CalendarEvent(BaseModel):
 
     class Config:
         from_attributes = True  # permite crear desde ORM
+
+
+class DiasLaborablesConsulta(BaseModel):
+    user_id: int
+    start: date
+    end: date
+
+
+class DiasLaborablesLoteIn(BaseModel):
+    items: List[DiasLaborablesConsulta] = Field(..., min_length=1, max_length=10000)
+
+
+class MarcaEmpresaIn(BaseModel):
+    date: date
+    mark: Literal["holiday", "workday"]
+    name: str = Field(..., min_length=1)
+    company_id: Optional[UUID] = None      # vacío = marca global; si no es UUID, 422
+
+    @field_validator("company_id", mode="before")
+    @classmethod
+    def _vacio_es_global(cls, v):
+        return None if isinstance(v, str) and not v.strip() else v
+
+
+# =========================
+# Exportaciones en segundo plano
+# =========================
+class ExportacionIn(BaseModel):
+    formato: str = "pdf"                   # cualquiera del registro de exportadores
+    usuarios: Optional[List[str]] = None   # vacío = todos
+    desde: Optional[date] = None           # por defecto, los 31 días que acaban en `hasta`
+    hasta: Optional[date] = None           # por defecto, hoy
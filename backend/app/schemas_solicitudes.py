@@ -28,6 +28,12 @@ class ResolverSolicitudIn(BaseModel):
     aprobar: bool
     motivo_rechazo: Optional[str] = None  # si aprobar=False, se recomienda enviar motivo
 
+# Resolución en lote (mismo criterio para todos los ids)
+class ResolverSolicitudesLoteIn(BaseModel):
+    ids: List[int] = Field(..., min_length=1, max_length=1000)
+    aprobar: bool
+    motivo_rechazo: Optional[str] = None
+
 # --- Filtros para listar ---
 class SolicitudFiltro(BaseModel):
     estado: Optional[SolicitudEstado] = None
@@ -1,8 +1,6 @@
 import hashlib
 from datetime import datetime
 from app import models
-from fpdf import FPDF
-from fastapi.responses import FileResponse
 import os
 from collections import defaultdict
 
@@ -25,32 +23,6 @@ def log_evento(db, usuario: models.User, accion: str, detalle: str):
     )
     db.add(log)
 
-# ------------------------
-# Exportar PDF con logo
-# ------------------------
-def exportar_pdf(usuario_email: str, fichajes):
-    class PDF(FPDF):
-        def header(self):
-            self.image("static/logo.png", 10, 8, 25)
-            self.set_font("Arial", "B", 14)
-            self.cell(0, 10, "Registro de fichajes - Campel", ln=True, align="C")
-            self.ln(10)
-
-    pdf = PDF()
-    pdf.add_page()
-    pdf.set_font("Arial", size=12)
-    pdf.cell(0, 10, f"Empleado: {usuario_email}", ln=True)
-    pdf.cell(0, 10, f"Exportado: {datetime.utcnow().isoformat()}", ln=True)
-    pdf.ln(5)
-
-    for f in fichajes:
-        fecha = datetime.fromisoformat(f["timestamp"]).strftime("%Y-%m-%d %H:%M")
-        pdf.cell(0, 10, f"{fecha} - {f.tipo} (Hash: {f.hash[:10]}...)", ln=True)
-
-    filename = f"export_{usuario_email}.pdf"
-    pdf.output(filename)
-    return FileResponse(path=filename, filename=filename, media_type='application/pdf')
-
 # ------------------------
 # Resumen de fichajes por usuario
 # ------------------------
@@ -0,0 +1,178 @@
+# backend/scripts/bench_dias_laborables.py
+"""
+Contraste y benchmark de las dos implementaciones de días laborables:
+
+- SQL: public.is_working_for_user(uid, fecha) y
+  public.working_days_for_user(uid, desde, hasta)
+  (/calendar/users/{id}/is-working, /ausencias/validar).
+- Python: app.calendario (/calendar/working-days, /calendar/users/{id}/working-days,
+  /calendar/working-days/batch).
+
+Contra un Postgres local (DATABASE_URL o --dsn). Genera regiones,
+localidades, usuarios con ubicación y festivos nacionales/autonómicos/
+provinciales/locales para varios años, consulta rangos aleatorios con ambas
+implementaciones y muestra las discrepancias y los percentiles de latencia.
+Todo va en una única transacción que se deshace al final: la base de datos
+queda como estaba.
+
+Uso:
+    python scripts/bench_dias_laborables.py --usuarios 50 --consultas 2000 --anios 2024 2027
+    python scripts/bench_dias_laborables.py --existentes   # usuarios y festivos ya cargados
+
+El mismo contraste corre en pytest (tests/test_dias_laborables_sql.py) si se
+define TEST_POSTGRES_DSN.
+"""
+from __future__ import annotations
+import os, sys, argparse, random, statistics, time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, text  # noqa: E402
+from sqlalchemy.orm import Session  # noqa: E402
+
+from app import calendario  # noqa: E402
+
+REGIONES = ["ES-MD", "ES-AN", "ES-CT", "ES-GA", "ES-VC"]
+PREFIJO = "bench-laborables"
+
+SQL_MARCA = text("""
+    INSERT INTO calendar_marks (scope, mark, date, name, region_code, province_code, locality_code, source)
+    VALUES (:scope, 'holiday', :date, :name, :r, :p, :l, 'BENCH')
+    ON CONFLICT (
+        scope, mark, date,
+        COALESCE(region_code,'-'),
+        COALESCE(province_code,'-'),
+        COALESCE(locality_code,'-'),
+        COALESCE(company_id,'00000000-0000-0000-0000-000000000000')
+    ) DO NOTHING
+""")
+
+
+def generar(db: Session, usuarios: int, anios, rnd: random.Random):
+    """Datos sintéticos dentro de la transacción en curso. Devuelve los user_id."""
+    localidades = []
+    for i, codigo in enumerate(REGIONES):
+        rid = db.execute(text("INSERT INTO regions (name, code) VALUES (:n, :c) RETURNING id"),
+                         {"n": f"{PREFIJO} {codigo}", "c": codigo}).scalar()
+        for j in range(3):
+            ine = f"{90 + i:02d}{j:03d}"
+            lid = db.execute(text("""
+                INSERT INTO localities (name, ine_code, region_id) VALUES (:n, :c, :r) RETURNING id
+            """), {"n": f"{PREFIJO} {ine}", "c": ine, "r": rid}).scalar()
+            localidades.append((rid, lid, codigo, ine))
+
+    for anio in range(anios[0], anios[1] + 1):
+        dias = [date(anio, 1, 1) + timedelta(days=k) for k in range(365)]
+        for d in rnd.sample(dias, 9):
+            db.execute(SQL_MARCA, {"scope": "national", "date": d, "name": "Nacional", "r": None, "p": None, "l": None})
+        for _, _, codigo, ine in localidades:
+            for d in rnd.sample(dias, 3):
+                db.execute(SQL_MARCA, {"scope": "region", "date": d, "name": "Autonómico", "r": codigo, "p": None, "l": None})
+            for d in rnd.sample(dias, 1):
+                db.execute(SQL_MARCA, {"scope": "province", "date": d, "name": "Provincial", "r": None, "p": ine[:2], "l": None})
+            for d in rnd.sample(dias, 2):
+                db.execute(SQL_MARCA, {"scope": "local", "date": d, "name": "Local", "r": None, "p": None, "l": ine})
+
+    ids = []
+    for n in range(usuarios):
+        uid = db.execute(text("""
+            INSERT INTO users (email, hashed_password, role) VALUES (:e, 'x', 'employee') RETURNING id
+        """), {"e": f"{PREFIJO}-{n}@example.test"}).scalar()
+        # Un 10 % sin ubicación (solo nacionales); el resto, región y a veces localidad
+        if n % 10:
+            rid, lid, _, _ = rnd.choice(localidades)
+            db.execute(text("""
+                INSERT INTO user_locations (user_id, country_code, region_id, locality_id)
+                VALUES (:u, 'ES', :r, :l)
+            """), {"u": uid, "r": rid, "l": lid if n % 3 else None})
+        ids.append(uid)
+    return ids
+
+
+def percentiles(tiempos):
+    q = statistics.quantiles(tiempos, n=100)
+    return f"p50 {q[49] * 1e3:7.3f} ms | p95 {q[94] * 1e3:7.3f} ms | p99 {q[98] * 1e3:7.3f} ms"
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Contraste SQL vs Python de días laborables")
+    ap.add_argument("--dsn", default=os.getenv("DATABASE_URL"))
+    ap.add_argument("--usuarios", type=int, default=50)
+    ap.add_argument("--consultas", type=int, default=2000)
+    ap.add_argument("--anios", type=int, nargs=2, default=[2024, 2027], metavar=("DESDE", "HASTA"))
+    ap.add_argument("--existentes", action="store_true", help="No generar datos: usar los de la BD")
+    ap.add_argument("--semilla", type=int, default=7)
+    ap.add_argument("--mostrar", type=int, default=10, help="Discrepancias a listar")
+    args = ap.parse_args()
+    if not args.dsn or not args.dsn.startswith("postgres"):
+        raise SystemExit("Hace falta un DSN de PostgreSQL (--dsn o DATABASE_URL).")
+
+    rnd = random.Random(args.semilla)
+    engine = create_engine(args.dsn)
+    with engine.connect() as conn:
+        trans = conn.begin()
+        try:
+            db = Session(bind=conn)
+            if args.existentes:
+                ids = [uid for (uid,) in db.execute(text("SELECT id FROM users ORDER BY id"))]
+            else:
+                ids = generar(db, args.usuarios, args.anios, rnd)
+            db.flush()
+            if not ids:
+                raise SystemExit("No hay usuarios.")
+
+            t0 = time.perf_counter()
+            cal = calendario.compilar(db)
+            print(f"Compilación del calendario: {(time.perf_counter() - t0) * 1e3:.1f} ms")
+
+            inicio = date(args.anios[0], 1, 1)
+            total_dias = (date(args.anios[1], 12, 31) - inicio).days
+            consultas = []
+            for _ in range(args.consultas):
+                d = inicio + timedelta(days=rnd.randint(0, total_dias))
+                h = min(d + timedelta(days=rnd.choice([0, 6, 30, 90, 365, 3 * 365])),
+                        date(args.anios[1], 12, 31))
+                consultas.append((rnd.choice(ids), d, h))
+
+            sql_rango = text("SELECT public.working_days_for_user(:uid, :d, :h)")
+            sql_dia = text("SELECT public.is_working_for_user(:uid, :d)")
+            t_sql, t_py, t_sql_dia, t_py_dia = [], [], [], []
+            discrepancias = []
+            for uid, d, h in consultas:
+                t0 = time.perf_counter()
+                v_sql = int(db.execute(sql_rango, {"uid": uid, "d": d, "h": h}).scalar() or 0)
+                t_sql.append(time.perf_counter() - t0)
+
+                t0 = time.perf_counter()
+                v_py = cal.dias_laborables(uid, d, h)["laborables"]
+                t_py.append(time.perf_counter() - t0)
+                if v_sql != v_py:
+                    discrepancias.append(("rango", uid, d, h, v_sql, v_py))
+
+                t0 = time.perf_counter()
+                w_sql = bool(db.execute(sql_dia, {"uid": uid, "d": d}).scalar())
+                t_sql_dia.append(time.perf_counter() - t0)
+
+                t0 = time.perf_counter()
+                w_py = cal.dias_laborables(uid, d, d)["laborables"] == 1
+                t_py_dia.append(time.perf_counter() - t0)
+                if w_sql != w_py:
+                    discrepancias.append(("día", uid, d, d, w_sql, w_py))
+
+            print(f"Usuarios: {len(ids)} | Consultas: {len(consultas)} rangos + {len(consultas)} días")
+            print(f"SQL    working_days_for_user: {percentiles(t_sql)}")
+            print(f"Python dias_laborables:       {percentiles(t_py)}")
+            print(f"SQL    is_working_for_user:   {percentiles(t_sql_dia)}")
+            print(f"Python día suelto:            {percentiles(t_py_dia)}")
+            print(f"Discrepancias: {len(discrepancias)}")
+            for tipo, uid, d, h, v_sql, v_py in discrepancias[:args.mostrar]:
+                ub = cal.ubicacion(uid)
+                print(f"  [{tipo}] user {uid} {ub} {d}..{h}: SQL={v_sql} Python={v_py}")
+        finally:
+            trans.rollback()
+    return 1 if discrepancias else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,85 @@
+# backend/scripts/bench_pdf_paginas.py
+"""
+Mide tiempo y pico de memoria (tracemalloc) del ExportadorPDF para informes
+de muchas páginas. No toca la base de datos: genera días agrupados
+sintéticos (la forma que envía el panel) y los pasa a DatasetFichajes.
+
+Uso:
+    python scripts/bench_pdf_paginas.py --paginas 1000
+
+El pico incluye el propio PDF en memoria (BytesIO) y el dataset no, ya que
+se construye antes de empezar a medir. El nº de días por empleado para
+llegar a --paginas se calibra con dos informes pequeños (las páginas crecen
+linealmente con los días, más un fijo por empleado); la salida muestra las
+páginas reales.
+"""
+from __future__ import annotations
+import os, re, sys, argparse, time, tracemalloc
+from datetime import date, timedelta
+from io import BytesIO
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.exportadores.dataset import como_dataset  # noqa: E402
+from app.exportadores.export_pdf import ExportadorPDF  # noqa: E402
+
+def dataset(dias: int, usuarios: int):
+    """`dias` por empleado, con dos intervalos cada uno."""
+    inicio = date(2024, 1, 1)
+    datos = []
+    for u in range(usuarios):
+        for d in range(dias):
+            fecha = (inicio + timedelta(days=d)).strftime("%d/%m/%Y")
+            datos.append({
+                "usuario": f"empleado{u:03d}@campel.test",
+                "fecha": fecha,
+                "intervalos": [
+                    {"entrada": "08:00", "salida": "14:00", "duracion": "6h 0m",
+                     "manualEntrada": d % 11 == 0, "motivoEntrada": "Olvido al entrar" if d % 11 == 0 else "",
+                     "manualSalida": False, "motivoSalida": ""},
+                    {"entrada": "15:00", "salida": "17:30", "duracion": "2h 30m",
+                     "manualEntrada": False, "motivoEntrada": "",
+                     "manualSalida": False, "motivoSalida": ""},
+                ],
+                "total": "8h 30m",
+            })
+    return datos
+
+
+def contar_paginas(datos) -> int:
+    salida = BytesIO()
+    ExportadorPDF(como_dataset(datos)).volcar(salida)
+    return len(re.findall(rb"/Type /Page\b", salida.getvalue()))
+
+
+def calibrar(paginas: int, usuarios: int) -> int:
+    """Días por empleado para `paginas` páginas, por interpolación lineal entre dos muestras."""
+    d1, d2 = 5, 25
+    p1, p2 = contar_paginas(dataset(d1, usuarios)), contar_paginas(dataset(d2, usuarios))
+    por_dia = (p2 - p1) / (d2 - d1)
+    return max(1, round(d1 + (paginas - p1) / por_dia))
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark de paginación del PDF")
+    ap.add_argument("--paginas", type=int, default=1000, help="Páginas objetivo (aprox.)")
+    ap.add_argument("--usuarios", type=int, default=20)
+    args = ap.parse_args()
+
+    datos = como_dataset(dataset(calibrar(args.paginas, args.usuarios), args.usuarios))
+    salida = BytesIO()
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    ExportadorPDF(datos).volcar(salida)
+    dur = time.perf_counter() - t0
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    pdf = salida.getvalue()
+    paginas = len(re.findall(rb"/Type /Page\b", pdf))
+    print(f"Días: {datos.n_dias} | Páginas: {paginas} (objetivo {args.paginas}) | Tamaño: {len(pdf) / 1e6:.1f} MB")
+    print(f"Tiempo: {dur:.1f} s | Pico de memoria: {pico / 1e6:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+# backend/scripts/bench_pdf_plantilla.py
+"""
+Coste de preparación por exportación del ExportadorPDF: hoja de estilos,
+TableStyle, búsqueda y decodificación del logo, portada.
+
+Compara, para un informe pequeño (un empleado, pocos días):
+- "en frío": PlantillaPDF nueva en cada exportación (lo que hacía antes
+  ExportadorPDF.volcar en cada llamada);
+- "plantilla": la PlantillaPDF del proceso, construida una sola vez.
+
+Uso:
+    python scripts/bench_pdf_plantilla.py --repeticiones 20 --dias 5
+
+PDF_LOGO_MAX_PX permite comparar resoluciones del logo (p. ej. 1024).
+"""
+from __future__ import annotations
+import os, sys, argparse, statistics, time
+from io import BytesIO
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.exportadores import export_pdf  # noqa: E402
+from app.exportadores.dataset import como_dataset  # noqa: E402
+from bench_pdf_paginas import dataset  # noqa: E402
+
+
+def medir(fn, repeticiones: int):
+    tiempos = []
+    for _ in range(repeticiones):
+        t0 = time.perf_counter()
+        fn()
+        tiempos.append(time.perf_counter() - t0)
+    return statistics.median(tiempos), max(tiempos)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark de la plantilla compartida del PDF")
+    ap.add_argument("--repeticiones", type=int, default=20)
+    ap.add_argument("--dias", type=int, default=5, help="Días del informe (un empleado)")
+    args = ap.parse_args()
+
+    datos = como_dataset(dataset(args.dias, 1))
+    tamano = {}
+
+    def exportar():
+        salida = BytesIO()
+        export_pdf.ExportadorPDF(datos).volcar(salida)
+        tamano["pdf"] = len(salida.getvalue())
+
+    def en_frio():
+        export_pdf._plantilla = None
+        exportar()
+
+    # Solo preparación: lo que cada exportación pagaba antes de empezar a maquetar
+    prep_frio = medir(export_pdf.PlantillaPDF, args.repeticiones)
+    export_pdf._plantilla = None
+    prep_plantilla = medir(export_pdf.plantilla, args.repeticiones)
+
+    total_frio = medir(en_frio, args.repeticiones)
+    tam_frio = tamano["pdf"]
+    export_pdf.plantilla()
+    total_plantilla = medir(exportar, args.repeticiones)
+
+    print(f"Logo: {export_pdf.PDF_LOGO_MAX_PX}px máx. | Días: {datos.n_dias} | "
+          f"Repeticiones: {args.repeticiones} (mediana / máximo)")
+    print(f"Preparación  en frío:   {prep_frio[0] * 1e3:8.1f} ms / {prep_frio[1] * 1e3:8.1f} ms")
+    print(f"Preparación  plantilla: {prep_plantilla[0] * 1e3:8.3f} ms / {prep_plantilla[1] * 1e3:8.3f} ms")
+    print(f"Exportación  en frío:   {total_frio[0] * 1e3:8.1f} ms / {total_frio[1] * 1e3:8.1f} ms  ({tam_frio / 1e3:.0f} KB)")
+    print(f"Exportación  plantilla: {total_plantilla[0] * 1e3:8.1f} ms / {total_plantilla[1] * 1e3:8.1f} ms  ({tamano['pdf'] / 1e3:.0f} KB)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+# backend/tests/conftest.py
+"""
+Fixtures comunes: app contra un sqlite temporal con datos sembrados y un
+contador de sentencias SQL por petición (listener `before_cursor_execute`).
+"""
+import os
+import re
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+import pytest
+
+_TMP = tempfile.mkdtemp(prefix="fichajes-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_TMP, 'tests.db')}"
+os.environ["EXPORT_CACHE_DIR"] = os.path.join(_TMP, "export_cache")
+os.environ.setdefault("KPI_RECONCILE_SECONDS", "0")
+os.environ.setdefault("JWT_CALENDAR_SECRET", "secreto-de-pruebas")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.testclient import TestClient  # noqa: E402
+from sqlalchemy import event  # noqa: E402
+
+from app import models  # noqa: E402
+from app.auth import crear_token_acceso  # noqa: E402
+from app.database import SessionLocal, engine  # noqa: E402
+from app.main import app  # noqa: E402
+
+
+
+@event.listens_for(engine, "connect")
+def _funciones_postgres(dbapi_conn, _):
+    """regexp_replace de Postgres (obtener_usuario_por_email) para sqlite."""
+    def regexp_replace(valor, patron, reemplazo, flags=""):
+        if valor is None:
+            return None
+        return re.sub(patron, reemplazo, valor, count=0 if "g" in (flags or "") else 1)
+    dbapi_conn.create_function("regexp_replace", 3, regexp_replace)
+    dbapi_conn.create_function("regexp_replace", 4, regexp_replace)
+
+
+engine.dispose()  # create_all ya abrió conexiones sin la función
+
+
+ADMIN = "admin@campel.test"
+EMPLEADOS = [f"emp{i:02d}@campel.test" for i in range(10)]
+
+
+@pytest.fixture(scope="session", autouse=True)
+def datos():
+    """Varios usuarios con fichajes y solicitudes: suficientes filas para que un N+1 se note."""
+    db = SessionLocal()
+    try:
+        admin = models.User(email=ADMIN, hashed_password="x", role="admin")
+        db.add(admin)
+        usuarios = [models.User(email=e, hashed_password="x", role="employee") for e in EMPLEADOS]
+        db.add_all(usuarios)
+        db.flush()
+        base = datetime(2025, 3, 3, 8, 0)
+        for u in usuarios:
+            for d in range(5):
+                dia = base + timedelta(days=d)
+                db.add(models.Fichaje(user_id=u.id, tipo="entrada", timestamp=dia, hash="h"))
+                db.add(models.Fichaje(user_id=u.id, tipo="salida", timestamp=dia + timedelta(hours=8), hash="h"))
+            db.add(models.SolicitudManual(user_id=u.id, fecha="2025-03-10", hora="08:00", tipo="entrada",
+                                          motivo="Olvido", estado="pendiente"))
+            db.add(models.SolicitudManual(user_id=u.id, fecha="2025-03-11", hora="17:00", tipo="salida",
+                                          motivo="Olvido", estado="aprobada", gestionado_por_id=admin.id))
+        db.commit()
+    finally:
+        db.close()
+    yield
+
+
+@pytest.fixture(scope="session")
+def client():
+    # Sin `with`: no arrancan los eventos de startup (reconciliación, reanudar exportaciones)
+    return TestClient(app)
+
+
+@pytest.fixture
+def auth_admin():
+    return {"Authorization": f"Bearer {crear_token_acceso({'sub': ADMIN})}"}
+
+
+class ContadorSQL:
+    def __init__(self):
+        self.sentencias = []
+
+    @property
+    def total(self) -> int:
+        return len(self.sentencias)
+
+    def reiniciar(self):
+        self.sentencias = []
+
+
+@pytest.fixture
+def consultas():
+    """
+    Cuenta las sentencias SQL del engine mientras dura el test. TestClient
+    consume el cuerpo completo (también StreamingResponse) antes de volver,
+    así que la cuenta incluye lo que se ejecuta durante el streaming.
+    """
+    contador = ContadorSQL()
+
+    def _contar(conn, cursor, statement, parameters, context, executemany):
+        contador.sentencias.append(statement)
+
+    event.listen(engine, "before_cursor_execute", _contar)
+    try:
+        yield contador
+    finally:
+        event.remove(engine, "before_cursor_execute", _contar)
@@ -0,0 +1,36 @@
+# backend/tests/test_cache_http.py
+"""GET condicional común (exportaciones y calendario)."""
+from fastapi import Request, Response
+
+from app import cache_http
+
+
+def _peticion(if_none_match=None):
+    cabeceras = [(b"if-none-match", if_none_match.encode())] if if_none_match else []
+    return Request({"type": "http", "method": "GET", "headers": cabeceras})
+
+
+def test_condicional_304_sin_construir():
+    llamadas = []
+
+    def construir():
+        llamadas.append(1)
+        return Response(b"x")
+
+    cabeceras = {"ETag": '"abc"', "Cache-Control": "private, no-cache"}
+    r = cache_http.condicional(_peticion('"zzz", W/"abc"'), "abc", cabeceras, construir)
+    assert r.status_code == 304 and r.headers["ETag"] == '"abc"'
+    assert not llamadas
+
+    r = cache_http.condicional(_peticion('"zzz"'), "abc", cabeceras, construir)
+    assert r.status_code == 200 and llamadas == [1]
+    assert r.headers["Cache-Control"] == "private, no-cache"
+
+
+def test_condicional_respeta_cabeceras_propias():
+    r = cache_http.condicional(
+        _peticion(), "abc", {"ETag": '"abc"', "X-Export-Cache": "REVALIDADO"},
+        lambda: Response(b"x", headers={"X-Export-Cache": "MISS"}),
+    )
+    assert r.headers["X-Export-Cache"] == "MISS"
+    assert r.headers["ETag"] == '"abc"'
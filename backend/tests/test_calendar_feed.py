@@ -0,0 +1,32 @@
+# backend/tests/test_calendar_feed.py
+"""Enlaces .ics: revocación por usuario con la versión "ver" del token."""
+from urllib.parse import urlparse
+
+from app.auth import crear_token_acceso
+from app.auth_tokens import decode_calendar
+
+from conftest import EMPLEADOS
+
+
+def _auth(email):
+    return {"Authorization": f"Bearer {crear_token_acceso({'sub': email})}"}
+
+
+def _token(url):
+    return urlparse(url).path.rsplit("/", 1)[-1].removesuffix(".ics")
+
+
+def test_revocar_invalida_enlaces_anteriores(client, auth_admin):
+    h = _auth(EMPLEADOS[4])
+    viejo = client.get("/api/calendar/feed-url", headers=h).json()["url"]
+    assert decode_calendar(_token(viejo))["ver"] == 0
+
+    nuevo = client.post("/api/calendar/feed-url/revocar", headers=h).json()["url"]
+    assert decode_calendar(_token(nuevo))["ver"] == 1
+    assert client.get(urlparse(viejo).path).status_code == 404
+    assert client.get("/api/calendar/feed-url", headers=h).json()["url"] == nuevo
+
+    user_id = int(decode_calendar(_token(nuevo))["sub"])
+    assert client.post(f"/api/calendar/users/{user_id}/feed/revocar", headers=h).status_code == 403
+    assert client.post(f"/api/calendar/users/{user_id}/feed/revocar", headers=auth_admin).status_code == 200
+    assert client.get(urlparse(nuevo).path).status_code == 404
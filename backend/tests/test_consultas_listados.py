@@ -0,0 +1,46 @@
+# backend/tests/test_consultas_listados.py
+"""
+Techo de sentencias SQL por endpoint de listado. Si una carga perezosa
+(N+1) vuelve a colarse, el número de consultas crece con las filas y el
+test falla. Incluye la consulta de get_current_user cuando hay token.
+"""
+import pytest
+
+from conftest import ADMIN, EMPLEADOS
+
+TECHOS = [
+    # (ruta, params, cabeceras extra, techo)
+    ("/api/logs", {}, {}, 1),
+    ("/api/logs", {"limite": 5}, {}, 1),
+    ("/api/logs", {"formato": "ndjson"}, {}, 1),
+    ("/api/solicitudes", {}, {}, 1),
+    ("/api/fichajes", {}, {"usuario": EMPLEADOS[0]}, 2),
+]
+
+
+@pytest.mark.parametrize("ruta,params,cabeceras,techo", TECHOS)
+def test_techo_consultas(client, consultas, ruta, params, cabeceras, techo):
+    r = client.get(ruta, params=params, headers=cabeceras)
+    assert r.status_code == 200, r.text
+    assert r.content
+    assert consultas.total <= techo, "\n\n".join(consultas.sentencias)
+
+
+def test_techo_consultas_usuarios(client, consultas, auth_admin):
+    r = client.get("/api/usuarios", headers=auth_admin)
+    assert r.status_code == 200, r.text
+    assert {u["email"] for u in r.json()} >= {ADMIN, *EMPLEADOS}
+    assert consultas.total <= 2, "\n\n".join(consultas.sentencias)
+
+
+def test_logs_sin_parametros_es_una_pagina(client, monkeypatch):
+    from app.routes import logs
+
+    monkeypatch.setattr(logs, "LOGS_LIMITE_POR_DEFECTO", 7)
+    r = client.get("/api/logs")
+    assert r.status_code == 200
+    pagina = r.json()
+    assert len(pagina["items"]) == 7 and pagina["next_cursor"]
+    siguiente = client.get("/api/logs", params={"cursor": pagina["next_cursor"]}).json()
+    assert len(siguiente["items"]) == 7
+    assert siguiente["items"][0]["timestamp"] >= pagina["items"][-1]["timestamp"]
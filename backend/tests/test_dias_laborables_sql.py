@@ -0,0 +1,64 @@
+# backend/tests/test_dias_laborables_sql.py
+"""
+Contraste de días laborables: calendario compilado (app.calendario) frente al
+recorrido día a día con public.is_working_for_user y frente a
+public.working_days_for_user. Necesita un Postgres con el esquema y las
+funciones cargados (TEST_POSTGRES_DSN); los datos sintéticos de
+scripts/bench_dias_laborables.py van en una transacción que se deshace.
+"""
+import os
+import random
+from datetime import date, timedelta
+
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import Session
+
+from app import calendario
+
+DSN = os.getenv("TEST_POSTGRES_DSN")
+pytestmark = pytest.mark.skipif(
+    not (DSN or "").startswith("postgres"), reason="Sin TEST_POSTGRES_DSN (PostgreSQL)"
+)
+
+SQL_DIA = text("SELECT public.is_working_for_user(:uid, :d)")
+SQL_RANGO = text("SELECT public.working_days_for_user(:uid, :d, :h)")
+
+
+@pytest.fixture
+def db_pg():
+    engine = create_engine(DSN)
+    conn = engine.connect()
+    trans = conn.begin()
+    try:
+        yield Session(bind=conn)
+    finally:
+        trans.rollback()
+        conn.close()
+        engine.dispose()
+
+
+def test_calendario_compilado_coincide_con_sql(db_pg):
+    from scripts import bench_dias_laborables as bench
+
+    rnd = random.Random(11)
+    ids = bench.generar(db_pg, 20, (2024, 2026), rnd)
+    db_pg.flush()
+    cal = calendario.compilar(db_pg)
+
+    discrepancias = []
+    for _ in range(150):
+        uid = rnd.choice(ids)
+        desde = date(2024, 1, 1) + timedelta(days=rnd.randint(0, 3 * 365 - 60))
+        hasta = desde + timedelta(days=rnd.choice([0, 6, 30, 59]))
+
+        bucle = sum(
+            1 for k in range((hasta - desde).days + 1)
+            if db_pg.execute(SQL_DIA, {"uid": uid, "d": desde + timedelta(days=k)}).scalar()
+        )
+        rango = int(db_pg.execute(SQL_RANGO, {"uid": uid, "d": desde, "h": hasta}).scalar() or 0)
+        nuevo = cal.dias_laborables(uid, desde, hasta)["laborables"]
+        if not bucle == rango == nuevo:
+            discrepancias.append((uid, cal.ubicacion(uid), desde, hasta, bucle, rango, nuevo))
+
+    assert not discrepancias, discrepancias[:10]
@@ -0,0 +1,41 @@
+# backend/tests/test_export_jobs.py
+"""Trabajos de exportación: un renderizado más largo que el timeout no queda huérfano."""
+import time
+from datetime import date
+
+from app import export_jobs
+from app.database import SessionLocal
+
+
+def test_render_largo_sigue_vigente(monkeypatch, tmp_path):
+    monkeypatch.setattr(export_jobs, "EXPORT_DIR", str(tmp_path))
+    monkeypatch.setattr(export_jobs, "EXPORT_JOB_LATIDO_SEG", 0.2)
+    monkeypatch.setattr(export_jobs, "EXPORT_JOB_TIMEOUT_MIN", 0.02)  # 1,2 s
+
+    def render_lento(formato, datos, destino=None, forzar=False):
+        time.sleep(3)
+        with open(destino, "wb") as f:
+            f.write(b"%PDF-")
+
+    monkeypatch.setattr(export_jobs.pool, "renderizar", render_lento)
+
+    db = SessionLocal()
+    try:
+        args = ("pdf", None, date(2025, 3, 1), date(2025, 3, 31), "admin@campel.test")
+        job, reutilizado = export_jobs.crear_o_reutilizar(db, *args)
+        assert not reutilizado
+        time.sleep(2.5)  # más que el timeout, aún renderizando
+
+        db.expire_all()
+        otro, reutilizado = export_jobs.crear_o_reutilizar(db, *args)
+        assert reutilizado and otro.id == job.id
+        assert otro.estado == export_jobs.EN_CURSO
+
+        for _ in range(50):
+            db.expire_all()
+            if db.get(export_jobs.models.ExportJob, job.id).estado != export_jobs.EN_CURSO:
+                break
+            time.sleep(0.1)
+        assert db.get(export_jobs.models.ExportJob, job.id).estado == export_jobs.LISTO
+    finally:
+        db.close()
@@ -0,0 +1,33 @@
+# backend/tests/test_exportar_pdf.py
+"""/api/exportar-pdf: render en memoria, ETag revalidable, nada en disco y rango acotado."""
+import os
+
+from app.exportadores import cache as export_cache
+
+from conftest import EMPLEADOS
+
+
+MARZO = {"usuario": EMPLEADOS[1], "desde": "2025-03-01", "hasta": "2025-03-31"}
+
+
+def test_exportar_pdf_etag_y_sin_disco(client):
+    r = client.get("/api/exportar-pdf", params=MARZO)
+    assert r.status_code == 200, r.text
+    assert r.content.startswith(b"%PDF")
+    assert int(r.headers["Content-Length"]) == len(r.content)
+    etag = r.headers["ETag"]
+    clave = etag.strip('"')
+    assert not os.path.exists(export_cache._ruta(clave))
+
+    r = client.get("/api/exportar-pdf", params=MARZO, headers={"If-None-Match": etag})
+    assert r.status_code == 304
+    assert r.headers["ETag"] == etag
+
+    r = client.get("/api/exportar-pdf", params=MARZO)
+    assert r.status_code == 200
+    assert r.headers["X-Export-Cache"] == "HIT"
+
+
+def test_exportar_pdf_rango_acotado(client):
+    r = client.get("/api/exportar-pdf", params={**MARZO, "desde": "2020-01-01"})
+    assert r.status_code == 400
@@ -0,0 +1,94 @@
+# backend/tests/test_exportar_streaming.py
+"""Formatos ligeros: consumen los datasets por usuario de uno en uno."""
+import json
+from xml.dom import minidom
+from datetime import datetime, timedelta
+
+from app.exportadores.dataset import DatasetFichajes, como_dataset, iterar_por_usuario
+from app.exportadores.export_csv import ExportadorCSV
+from app.exportadores.export_json import ExportadorJSON
+from app.exportadores.export_xml import ExportadorXML
+
+from conftest import EMPLEADOS
+
+
+def _usuarios(n, dias=3):
+    """Un dataset por usuario, generado bajo demanda; `pedidos` cuenta los entregados."""
+    pedidos = []
+
+    def gen():
+        for u in range(n):
+            filas = []
+            for d in range(dias):
+                base = datetime(2025, 3, 3 + d, 8, 0)
+                filas.append({"usuario_email": f"u{u}@x.test", "tipo": "entrada", "timestamp": base})
+                filas.append({"usuario_email": f"u{u}@x.test", "tipo": "salida", "timestamp": base + timedelta(hours=8)})
+            pedidos.append(u)
+            yield DatasetFichajes.desde_fichajes(filas)
+
+    return gen(), pedidos
+
+
+def test_csv_perezoso_por_usuario(monkeypatch):
+    monkeypatch.setattr(ExportadorCSV, "FILAS_POR_BLOQUE", 10)
+    datos, pedidos = _usuarios(50)
+    trozos = ExportadorCSV(datos).iterar()
+    assert next(trozos) == "\ufeff".encode("utf-8")
+    next(trozos)
+    assert len(pedidos) == 1
+    resto = b"".join(trozos).decode("utf-8")
+    assert len(pedidos) == 50
+    assert "USUARIO: u49@x.test" in resto
+
+
+def test_csv_sin_datos():
+    datos, _ = _usuarios(0)
+    assert b"".join(ExportadorCSV(datos).iterar()) == "# NO HAY DATOS PARA EXPORTAR\n".encode("utf-8")
+
+
+def test_json_perezoso_por_usuario(monkeypatch):
+    monkeypatch.setattr(ExportadorJSON, "TAM_BLOQUE", 256)
+    datos, pedidos = _usuarios(50)
+    trozos = ExportadorJSON(datos, compacto=True).iterar()
+    primero = next(trozos)
+    assert len(pedidos) == 1
+    dias = json.loads(primero + b"".join(trozos))
+    assert len(pedidos) == 50
+    assert len(dias) == 150 and dias[-1]["usuario"] == "u49@x.test"
+    assert dias[0]["total"] == "8h 0min"
+
+
+def test_xml_perezoso_por_usuario(monkeypatch):
+    monkeypatch.setattr(ExportadorXML, "LOGS_POR_BLOQUE", 4)
+    datos, pedidos = _usuarios(50)
+    trozos = ExportadorXML(datos).iterar()
+    primero = next(trozos)
+    assert len(pedidos) == 1
+    doc = minidom.parseString(primero + b"".join(trozos))
+    assert len(pedidos) == 50
+    assert len(doc.getElementsByTagName("log")) == 50 * 3 * 2
+
+
+def test_iterar_por_usuario_un_dataset_por_email():
+    filas = [
+        {"usuario_email": u, "tipo": t, "timestamp": datetime(2025, 3, 3, h), "validez": v}
+        for u in ("a@x.test", "b@x.test")
+        for t, h, v in (("entrada", 8, "valido"), ("salida", 9, "invalidado"), ("salida", 14, "valido"))
+    ]
+    dss = list(iterar_por_usuario(iter(filas)))
+    assert [ds.usuarios for ds in dss] == [["a@x.test"], ["b@x.test"]]
+    # En el servidor los invalidados no computan...
+    assert dss[0].n_fichajes == 2 and dss[0].d_total[0] == 6 * 3600
+    # ...y los fichajes sueltos del panel se exportan tal cual llegan
+    assert como_dataset(filas).n_fichajes == 6
+
+
+def test_exportar_csv_servidor_por_usuario(client, auth_admin):
+    r = client.get("/api/logs/exportar", headers=auth_admin, params={
+        "formato": "csv", "usuario": EMPLEADOS[:3], "desde": "2025-03-01", "hasta": "2025-03-31",
+    })
+    assert r.status_code == 200, r.text
+    texto = r.content.decode("utf-8-sig")
+    for email in EMPLEADOS[:3]:
+        assert f"USUARIO: {email}" in texto
+    assert f"USUARIO: {EMPLEADOS[3]}" not in texto
@@ -0,0 +1,50 @@
+# backend/tests/test_kpis.py
+"""Contador usuarios_en_turno en las aprobaciones manuales y leer() sin escrituras."""
+from datetime import datetime
+
+from app import crud, kpis, models
+from app.database import SessionLocal
+
+
+def _en_turno_con_solicitud(db, email):
+    """Usuario con una entrada sin salida y una solicitud de salida pendiente posterior."""
+    u = models.User(email=email, hashed_password="x", role="employee")
+    db.add(u)
+    db.flush()
+    db.add(models.Fichaje(user_id=u.id, tipo="entrada", timestamp=datetime(2025, 5, 2, 8, 0), hash="h"))
+    s = models.SolicitudManual(user_id=u.id, fecha="2025-05-02", hora="15:00", tipo="salida",
+                               motivo="Olvido", estado="pendiente")
+    db.add(s)
+    db.commit()
+    return s.id
+
+
+def test_leer_no_escribe():
+    db = SessionLocal()
+    try:
+        db.query(models.KpiContador).delete()
+        db.commit()
+        assert kpis.leer(db) == kpis.calcular(db)
+        db.rollback()
+        assert db.query(models.KpiContador).count() == 0
+    finally:
+        db.close()
+
+
+def test_aprobaciones_ajustan_usuarios_en_turno():
+    db = SessionLocal()
+    try:
+        admin = db.query(models.User).filter_by(role="admin").first()
+        uno = _en_turno_con_solicitud(db, "kpi-uno@campel.test")
+        lote = [_en_turno_con_solicitud(db, f"kpi-lote{i}@campel.test") for i in range(2)]
+        kpis.reconciliar(db)
+        antes = kpis.leer(db)[kpis.USUARIOS_EN_TURNO]
+
+        crud.aprobar_solicitud(db, uno, admin=admin)
+        assert kpis.leer(db)[kpis.USUARIOS_EN_TURNO] == antes - 1
+
+        crud.resolver_solicitudes_lote(db, lote, True, admin=admin)
+        assert kpis.leer(db)[kpis.USUARIOS_EN_TURNO] == antes - 3
+        assert kpis.leer(db) == kpis.calcular(db)
+    finally:
+        db.close()
@@ -0,0 +1,26 @@
+# backend/tests/test_marcas_empresa.py
+"""Carga masiva de marcas de empresa: validación de la entrada (sin Postgres)."""
+from uuid import UUID
+
+import pytest
+from fastapi import HTTPException
+
+from app.routes.calendar import _leer_marcas_empresa
+
+EMPRESA = "6f1c2a9e-3b4d-4e5f-8a7b-9c0d1e2f3a4b"
+
+
+def test_company_id_no_uuid_es_422():
+    cuerpo = b'[{"date": "2025-12-24", "mark": "holiday", "name": "Cierre", "company_id": "acme"}]'
+    with pytest.raises(HTTPException) as e:
+        _leer_marcas_empresa(cuerpo, "application/json")
+    assert e.value.status_code == 422
+
+
+def test_company_id_vacio_es_global():
+    cuerpo = f"date;mark;name;company_id\n2025-12-24;holiday;Cierre;\n2025-12-31;holiday;Cierre;{EMPRESA}\n".encode()
+    marcas = _leer_marcas_empresa(cuerpo, "text/csv")
+    assert [m.company_id for m in marcas] == [None, UUID(EMPRESA)]
+    marcas = _leer_marcas_empresa(b'[{"date": "2025-12-24", "mark": "holiday", "name": "Cierre", "company_id": ""}]',
+                                  "application/json")
+    assert marcas[0].company_id is None
@@ -0,0 +1,38 @@
+# backend/tests/test_pdf_por_empleado.py
+"""/api/logs/exportar/pdf_por_empleado: ZIP por empleado y 503 con el pool lleno."""
+import io
+import zipfile
+
+from app.exportadores import paquete_pdf, pool
+
+from conftest import EMPLEADOS
+
+RUTA = "/api/logs/exportar/pdf_por_empleado"
+PARAMS = {"usuario": EMPLEADOS[:2], "desde": "2025-03-01", "hasta": "2025-03-31"}
+
+
+def test_zip_un_pdf_por_empleado(client, auth_admin):
+    r = client.get(RUTA, params=PARAMS, headers=auth_admin)
+    assert r.status_code == 200, r.text
+    nombres = zipfile.ZipFile(io.BytesIO(r.content)).namelist()
+    assert len([n for n in nombres if n.endswith(".pdf")]) == 2
+    assert pool.metricas()["en_vuelo"] == 0
+
+
+def test_pool_lleno_responde_503(client, auth_admin, monkeypatch):
+    monkeypatch.setattr(pool, "EXPORT_PROCESOS", 0)
+    monkeypatch.setattr(pool, "EXPORT_COLA_MAX", 0)
+    r = client.get(RUTA, params=PARAMS, headers=auth_admin)
+    assert r.status_code == 503
+    assert r.headers["Retry-After"] == str(pool.RETRY_AFTER_SEG)
+    assert pool.metricas()["en_vuelo"] == 0
+
+
+def test_nombres_zip_sin_colisiones():
+    nombres = paquete_pdf.nombres_zip(["a@b.com", "a_b.com", "c@d.com"], {"a@b.com": 7, "a_b.com": 9})
+    assert nombres == {
+        "a@b.com": "Fichajes_a_b.com_7.pdf",
+        "a_b.com": "Fichajes_a_b.com_9.pdf",
+        "c@d.com": "Fichajes_c_d.com.pdf",
+    }
+    assert len(set(paquete_pdf.nombres_zip(["x@y", "x_y", "x y"]).values())) == 3
@@ -0,0 +1,72 @@
+# backend/tests/test_solicitudes_lote.py
+"""crud.resolver_solicitudes_lote: reclamación condicionada y fichajes sin duplicar."""
+from datetime import datetime
+
+from sqlalchemy import event, update
+
+from app import crud, models
+from app.database import SessionLocal, engine
+
+
+def _usuario(db, email):
+    u = models.User(email=email, hashed_password="x", role="employee")
+    db.add(u)
+    db.flush()
+    db.add(models.Fichaje(user_id=u.id, tipo="entrada", timestamp=datetime(2025, 4, 1, 8, 0), hash="h"))
+    return u
+
+
+def _solicitud(db, u, hora="17:00", tipo="salida"):
+    s = models.SolicitudManual(user_id=u.id, fecha="2025-04-01", hora=hora, tipo=tipo,
+                               motivo="Olvido", estado="pendiente")
+    db.add(s)
+    db.flush()
+    return s.id
+
+
+def test_mismo_instante_un_solo_fichaje():
+    db = SessionLocal()
+    try:
+        admin = db.query(models.User).filter_by(role="admin").first()
+        u = _usuario(db, "lote-dup@campel.test")
+        ids = [_solicitud(db, u), _solicitud(db, u)]
+        db.commit()
+
+        res = crud.resolver_solicitudes_lote(db, ids, True, admin=admin)
+        assert [r["ok"] for r in res] == [True, True]
+        salidas = db.query(models.Fichaje).filter_by(user_id=u.id, tipo="salida").all()
+        assert len(salidas) == 1
+        assert salidas[0].solicitud_id == ids[-1]
+    finally:
+        db.close()
+
+
+def test_resuelta_por_otro_admin_no_genera_fichaje():
+    db = SessionLocal()
+    try:
+        admin = db.query(models.User).filter_by(role="admin").first()
+        u = _usuario(db, "lote-carrera@campel.test")
+        ganada, perdida = _solicitud(db, u, "16:00"), _solicitud(db, u, "17:00")
+        db.commit()
+        logs_antes = db.query(models.LogAuditoria).filter_by(user_id=u.id).count()
+
+        # Otro admin resuelve `perdida` justo después de nuestra lectura y antes del UPDATE
+        hecho = []
+
+        def _otro_admin(conn, clauseelement, *a, **kw):
+            if not hecho and getattr(clauseelement, "is_dml", False) and clauseelement.table.name == "solicitudes":
+                hecho.append(True)
+                conn.execute(update(models.SolicitudManual)
+                             .where(models.SolicitudManual.id == perdida)
+                             .values(estado="rechazada"))
+        event.listen(engine, "before_execute", _otro_admin)
+        try:
+            res = {r["id"]: r for r in crud.resolver_solicitudes_lote(db, [ganada, perdida], True, admin=admin)}
+        finally:
+            event.remove(engine, "before_execute", _otro_admin)
+        assert res[ganada]["ok"] and not res[perdida]["ok"]
+        assert res[perdida]["error"] == "La solicitud ya fue gestionada"
+        assert db.query(models.Fichaje).filter_by(solicitud_id=perdida).count() == 0
+        assert db.query(models.LogAuditoria).filter_by(user_id=u.id).count() == logs_antes + 1
+    finally:
+        db.close()
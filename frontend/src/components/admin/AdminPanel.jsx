@@ -44,7 +44,23 @@ export default function AdminPanel({ session, onLogout }) {
   // Rutas reales del backend (sin prefijo)
   const cargarSolicitudes = () => fetchData('/solicitudes', setSolicitudes);
   const cargarAusencias   = () => fetchData('/ausencias', setAusencias);
-  const cargarLogs        = () => fetchData('/logs', setLogs);
+  // /logs responde por páginas ({items, next_cursor}): se siguen hasta la última
+  const cargarLogs = async () => {
+    try {
+      const todos = [];
+      let cursor = null;
+      do {
+        const qs = new URLSearchParams({ limite: '5000' });
+        if (cursor) qs.set('cursor', cursor);
+        const pagina = await api.get(`/logs?${qs}`, token);
+        todos.push(...(pagina?.items ?? []));
+        cursor = pagina?.next_cursor;
+      } while (cursor);
+      setLogs(todos);
+    } catch (err) {
+      console.error('❌ Error cargando /logs:', err);
+    }
+  };
   const cargarUsuarios    = () => fetchData('/usuarios', setUsuarios);
 
   // --- resolver solicitud